@@ -0,0 +1,67 @@
+"""
+Parse nginx access-log lines into car detail views.
+
+Lines are handled as bytes in the nginx "combined" format. Cheap substring
+checks reject everything that isn't a car detail request before the single
+compiled regex runs, and timestamps are parsed by slicing rather than
+strptime, with the last value cached since consecutive lines usually share
+a second.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+CAR_PATH = b'"GET /api/cars/'
+
+# $remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent"
+CAR_VIEW_RE = re.compile(
+    rb'^(\S+) \S+ \S+ \[([^\]]+)\] '
+    rb'"GET /api/cars/(\d+)/?(?:\?[^ "]*)? HTTP/[\d.]+" (\d{3}) \S+ '
+    rb'"[^"]*" "([^"]*)"'
+)
+
+MONTHS = {
+    b'Jan': 1, b'Feb': 2, b'Mar': 3, b'Apr': 4, b'May': 5, b'Jun': 6,
+    b'Jul': 7, b'Aug': 8, b'Sep': 9, b'Oct': 10, b'Nov': 11, b'Dec': 12,
+}
+
+_last_time = (None, None)
+
+
+def parse_log_time(value):
+    """Parse an nginx $time_local value such as b'19/Oct/2026:13:45:01 +0000'."""
+    global _last_time
+    if value == _last_time[0]:
+        return _last_time[1]
+    offset = int(value[22:24]) * 60 + int(value[24:26])
+    if value[21:22] == b'-':
+        offset = -offset
+    parsed = datetime(
+        int(value[7:11]), MONTHS[value[3:6]], int(value[0:2]),
+        int(value[12:14]), int(value[15:17]), int(value[18:20]),
+        tzinfo=timezone(timedelta(minutes=offset)),
+    )
+    _last_time = (value, parsed)
+    return parsed
+
+
+def parse_car_view(line):
+    """
+    Return (car_id, ip_address, timestamp, user_agent) for a successful car
+    detail request, or None for any other line.
+    """
+    if CAR_PATH not in line:
+        return None
+    match = CAR_VIEW_RE.match(line)
+    if match is None or match.group(4) != b'200':
+        return None
+    try:
+        timestamp = parse_log_time(match.group(2))
+    except (KeyError, ValueError):
+        return None
+    return (
+        int(match.group(3)),
+        match.group(1).decode('ascii', 'replace'),
+        timestamp,
+        match.group(5).decode('utf-8', 'replace'),
+    )
@@ -1,7 +1,15 @@
 from django.contrib import admin
-from django.db.models import Count
+from django.db.models import Sum
 from django.utils.html import format_html
-from .models import PageView, CarView
+from . import visitors
+from .models import (
+    PageView, CarView, DailyPageViewCount, DailyCarViewCount, UserAgent, CarPopularity,
+)
+
+
+def total_count(queryset):
+    """Sum the count column of a rollup queryset."""
+    return queryset.aggregate(total=Sum('count'))['total'] or 0
 
 
 @admin.register(PageView)
@@ -22,19 +30,24 @@ class PageViewAdmin(admin.ModelAdmin):
         extra_context = extra_context or {}
         
         # Add summary statistics
-        from django.db.models import Count
         from django.utils import timezone
         from datetime import timedelta
         
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
+        today = timezone.localdate()
+        # Seven calendar days including today, matching the "last 7 days" labels
+        week_ago = today - timedelta(days=6)
         
+        # Read from the daily rollups instead of scanning the raw events
+        rollups = DailyPageViewCount.objects.all()
         stats = {
-            'total_views': PageView.objects.count(),
-            'today_views': PageView.objects.filter(timestamp__date=today).count(),
-            'week_views': PageView.objects.filter(timestamp__date__gte=week_ago).count(),
-            'page_breakdown': PageView.objects.values('page_type').annotate(
-                count=Count('id')
+            'total_views': total_count(rollups),
+            'today_views': total_count(rollups.filter(date=today)),
+            'week_views': total_count(rollups.filter(date__gte=week_ago)),
+            # HyperLogLog estimates, see hll.py for error bounds
+            'today_unique_visitors': visitors.unique_visitors(today, today)[0],
+            'week_unique_visitors': visitors.unique_visitors(week_ago, today)[0],
+            'page_breakdown': rollups.values('page_type').annotate(
+                count=Sum('count')
             ).order_by('-count')
         }
         
@@ -45,6 +58,7 @@ class PageViewAdmin(admin.ModelAdmin):
 @admin.register(CarView)
 class CarViewAdmin(admin.ModelAdmin):
     list_display = ['car_info', 'view_type', 'timestamp', 'ip_address']
+    list_select_related = ['car']
     list_filter = ['view_type', 'timestamp']
     search_fields = ['car__brand', 'car__model', 'ip_address']
     readonly_fields = ['car', 'timestamp', 'ip_address', 'user_agent', 'view_type']
@@ -64,29 +78,45 @@ class CarViewAdmin(admin.ModelAdmin):
         extra_context = extra_context or {}
         
         # Add summary statistics
-        from django.db.models import Count
         from django.utils import timezone
         from datetime import timedelta
         
-        today = timezone.now().date()
-        week_ago = today - timedelta(days=7)
+        today = timezone.localdate()
+        # Seven calendar days including today, matching the "last 7 days" labels
+        week_ago = today - timedelta(days=6)
+        
+        # Read from the daily rollups instead of scanning the raw events
+        rollups = DailyCarViewCount.objects.all()
         
-        # Most viewed cars
-        most_viewed = CarView.objects.values(
-            'car__brand', 'car__model', 'car__year', 'car_id'
-        ).annotate(
-            total_views=Count('id')
+        # Most viewed cars, read in index order from the maintained counters
+        most_viewed = CarPopularity.objects.values(
+            'car__brand', 'car__model', 'car__year', 'car_id', 'total_views'
         ).order_by('-total_views')[:10]
         
         stats = {
-            'total_car_views': CarView.objects.count(),
-            'today_car_views': CarView.objects.filter(timestamp__date=today).count(),
-            'week_car_views': CarView.objects.filter(timestamp__date__gte=week_ago).count(),
+            'total_car_views': total_count(rollups),
+            'today_car_views': total_count(rollups.filter(date=today)),
+            'week_car_views': total_count(rollups.filter(date__gte=week_ago)),
+            'week_unique_car_visitors': visitors.unique_car_visitors(week_ago, today),
             'most_viewed_cars': most_viewed,
-            'view_type_breakdown': CarView.objects.values('view_type').annotate(
-                count=Count('id')
+            'view_type_breakdown': rollups.values('view_type').annotate(
+                count=Sum('count')
             ).order_by('-count')
         }
         
         extra_context['stats'] = stats
         return super().changelist_view(request, extra_context=extra_context)
+
+
+@admin.register(UserAgent)
+class UserAgentAdmin(admin.ModelAdmin):
+    list_display = ['browser', 'browser_version', 'os', 'device_type', 'first_seen']
+    list_filter = ['device_type', 'browser', 'os']
+    search_fields = ['value']
+    readonly_fields = ['hash', 'value', 'browser', 'browser_version', 'os', 'device_type', 'first_seen']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
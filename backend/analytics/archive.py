@@ -0,0 +1,311 @@
+"""
+Compressed file archive of raw analytics events.
+
+Closed days of PageView/CarView rows are exported to one file per table and
+day, laid out as <root>/<table>/date=YYYY-MM-DD/events.<ext> so that tools
+like DuckDB or pandas can read the tree directly. Files are Parquet (zstd)
+when pyarrow is installed, otherwise gzipped CSV. Each event keeps its user
+agent string rather than the UserAgent id, so an archive stands on its own.
+
+Rows are streamed from a server-side cursor and written chunk by chunk, so
+memory stays bounded by the chunk size however large a day is. Re-exporting
+an archived day merges the archived rows with those still in the database,
+so rows already deleted are kept. Deletion removes exactly the ids in the
+archive file. Archived days can be read back to rebuild the rollups and
+visitor sketches after the raw rows are gone (see rebuild_analytics_rollups
+--from-archive).
+"""
+
+import csv
+import gzip
+import heapq
+import os
+import re
+from datetime import date, datetime
+from itertools import chain, islice
+from . import rollups, visitors
+from .models import PageView, CarView
+from .timeranges import day_bounds
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ARCHIVED_MODELS = [PageView, CarView]
+FORMATS = {'parquet': 'events.parquet', 'csv': 'events.csv.gz'}
+DAY_DIR_RE = re.compile(r'^date=(\d{4}-\d{2}-\d{2})$')
+
+# Archive column -> queryset field, per model
+COLUMNS = {
+    PageView: {
+        'id': 'id',
+        'timestamp': 'timestamp',
+        'page_type': 'page_type',
+        'ip_address': 'ip_address',
+        'user_agent': 'user_agent__value',
+    },
+    CarView: {
+        'id': 'id',
+        'timestamp': 'timestamp',
+        'car_id': 'car_id',
+        'view_type': 'view_type',
+        'ip_address': 'ip_address',
+        'user_agent': 'user_agent__value',
+    },
+}
+INTEGER_COLUMNS = {'id', 'car_id'}
+NULLABLE_COLUMNS = {'ip_address', 'user_agent'}
+
+
+def default_format():
+    return 'parquet' if pyarrow is not None else 'csv'
+
+
+def day_path(root, model, day, fmt):
+    return os.path.join(root, model._meta.db_table, f'date={day.isoformat()}', FORMATS[fmt])
+
+
+def archived_days(root, model, start_date=None, end_date=None):
+    """Return sorted (day, path) pairs for the model's archived days in range."""
+    table_dir = os.path.join(root, model._meta.db_table)
+    try:
+        names = os.listdir(table_dir)
+    except FileNotFoundError:
+        return []
+    days = []
+    for name in names:
+        match = DAY_DIR_RE.match(name)
+        if not match:
+            continue
+        day = date.fromisoformat(match.group(1))
+        if (start_date and day < start_date) or (end_date and day > end_date):
+            continue
+        for filename in FORMATS.values():
+            path = os.path.join(table_dir, name, filename)
+            if os.path.exists(path):
+                days.append((day, path))
+                break
+    return sorted(days)
+
+
+class _ParquetWriter:
+
+    TYPES = {
+        'id': 'int64',
+        'car_id': 'int64',
+        'timestamp': 'timestamp',
+        'page_type': 'string',
+        'view_type': 'string',
+        'ip_address': 'string',
+        'user_agent': 'string',
+    }
+
+    def __init__(self, path, columns):
+        types = {
+            'int64': pyarrow.int64(),
+            'string': pyarrow.string(),
+            'timestamp': pyarrow.timestamp('us', tz='UTC'),
+        }
+        self.schema = pyarrow.schema([(name, types[self.TYPES[name]]) for name in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        # Each chunk becomes one row group
+        columns = list(zip(*rows))
+        arrays = [
+            pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)
+        ]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class _CSVWriter:
+
+    def __init__(self, path, columns):
+        self.file = gzip.open(path, 'wt', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+        self.timestamp_index = columns.index('timestamp')
+
+    def write(self, rows):
+        for row in rows:
+            row = ['' if value is None else value for value in row]
+            row[self.timestamp_index] = row[self.timestamp_index].isoformat()
+            self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+WRITERS = {'parquet': _ParquetWriter, 'csv': _CSVWriter}
+
+
+def _merge_rows(archived, rows):
+    """
+    Merge two (timestamp, id)-ordered row streams, keeping one copy of rows in both.
+
+    Rows start with id, timestamp; copies of a row have the same key, so
+    they are adjacent in the merge.
+    """
+    previous = None
+    for row in heapq.merge(archived, rows, key=lambda row: (row[1], row[0])):
+        if row[0] != previous:
+            yield row
+        previous = row[0]
+
+
+def export_day(root, model, day, fmt, chunk_size=50000):
+    """
+    Write one day's events for model to the archive. Returns the rows written.
+
+    The file is written under a temporary name and renamed into place once
+    complete, so a partial export is never mistaken for an archived day.
+    If the day is already archived, its rows are merged with the database
+    rows, so events deleted after the earlier export are not lost. Days
+    without events in the database are not written.
+    """
+    if fmt == 'parquet' and pyarrow is None:
+        raise RuntimeError('Parquet archives need pyarrow installed')
+
+    start, end = day_bounds(day)
+    columns = COLUMNS[model]
+    rows = model.objects.filter(timestamp__gte=start, timestamp__lt=end).order_by(
+        'timestamp', 'id'
+    ).values_list(*columns.values())
+    # On PostgreSQL iterator() reads through a server-side cursor
+    events = rows.iterator(chunk_size=chunk_size)
+
+    first = list(islice(events, 1))
+    if not first:
+        return 0
+    events = chain(first, events)
+
+    existing = archived_days(root, model, day, day)
+    if existing:
+        (_, existing_path), = existing
+        events = _merge_rows(_read_file(existing_path, list(columns), chunk_size), events)
+    else:
+        existing_path = None
+
+    path = day_path(root, model, day, fmt)
+    partial_path = path + '.partial'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    writer = WRITERS[fmt](partial_path, list(columns))
+    written = 0
+    try:
+        chunk = list(islice(events, chunk_size))
+        while chunk:
+            writer.write(chunk)
+            written += len(chunk)
+            chunk = list(islice(events, chunk_size))
+    except BaseException:
+        writer.close()
+        os.remove(partial_path)
+        raise
+    writer.close()
+    os.replace(partial_path, path)
+    if existing_path and existing_path != path:
+        # Re-exported in the other format
+        os.remove(existing_path)
+    return written
+
+
+def delete_day(root, model, day, batch_size=50000):
+    """
+    Delete a day's archived events in short batches. Returns the rows deleted.
+
+    The ids are read back from the archive file, so only rows that were
+    actually exported are removed; events written for the day since (e.g. a
+    late log backfill) are kept.
+    """
+    start, end = day_bounds(day)
+    in_day = model.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    ids = (row[0] for row in read_events(root, model, ['id'], day, day, batch_size=batch_size))
+    deleted = 0
+    while True:
+        batch = list(islice(ids, batch_size))
+        if not batch:
+            return deleted
+        # Keep the timestamp bounds so only the day's partition is touched
+        count, _ = in_day.filter(id__in=batch).delete()
+        deleted += count
+
+
+def _read_parquet(path, columns, batch_size):
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield from zip(*(batch.column(name).to_pylist() for name in columns))
+
+
+def _read_csv(path, columns, batch_size):
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        indexes = [header.index(name) for name in columns]
+        converters = []
+        for name in columns:
+            if name == 'timestamp':
+                converters.append(datetime.fromisoformat)
+            elif name in INTEGER_COLUMNS:
+                converters.append(int)
+            elif name in NULLABLE_COLUMNS:
+                converters.append(lambda value: value or None)
+            else:
+                converters.append(str)
+        for row in reader:
+            yield tuple(convert(row[i]) for convert, i in zip(converters, indexes))
+
+
+def _read_file(path, columns, batch_size):
+    if path.endswith('.parquet'):
+        if pyarrow is None:
+            raise RuntimeError(f'{path} needs pyarrow installed to read')
+        return _read_parquet(path, columns, batch_size)
+    return _read_csv(path, columns, batch_size)
+
+
+def read_events(root, model, columns, start_date=None, end_date=None, batch_size=50000):
+    """Yield tuples of the given columns for archived events, in day order."""
+    for day, path in archived_days(root, model, start_date, end_date):
+        yield from _read_file(path, columns, batch_size)
+
+
+def rebuild_rollups(root, start_date=None, end_date=None):
+    """
+    Recompute rollups and visitor sketches from the archive.
+
+    Only the days a table has archived within the range are replaced, one
+    day at a time, so live counts for today, for days not yet exported and
+    for the other table are kept. Views of cars that have since been
+    deleted are skipped, as their rollup rows would have been deleted with
+    the car. Returns (rollup_rows, sketches).
+    """
+    from cars.models import Car
+    car_ids = set(Car.objects.values_list('id', flat=True))
+
+    def events(model, day, columns):
+        rows = read_events(root, model, columns, day, day)
+        if model is CarView:
+            rows = (row for row in rows if row[1] in car_ids)
+        return rows
+
+    rollup_rows = sketches = 0
+    for day, _ in archived_days(root, PageView, start_date, end_date):
+        rollup_rows += rollups.rebuild_from_events(
+            day, day, page_events=events(PageView, day, ['timestamp', 'page_type'])
+        )
+        sketches += visitors.rebuild_from_events(
+            day, day, page_events=events(PageView, day, ['timestamp', 'ip_address', 'user_agent'])
+        )
+    for day, _ in archived_days(root, CarView, start_date, end_date):
+        rollup_rows += rollups.rebuild_from_events(
+            day, day, car_events=events(CarView, day, ['timestamp', 'car_id', 'view_type'])
+        )
+        sketches += visitors.rebuild_from_events(
+            day, day, car_events=events(CarView, day, ['timestamp', 'car_id', 'ip_address', 'user_agent'])
+        )
+    return rollup_rows, sketches
@@ -0,0 +1,192 @@
+"""
+Write-behind buffer for analytics events.
+
+Tracking endpoints append validated, unsaved model instances to a bounded
+per-process buffer and return immediately. A background thread writes them
+with bulk_create when the buffer reaches FLUSH_SIZE or every FLUSH_INTERVAL
+seconds, so page views never hold a worker on a single-row INSERT. When the
+database falls behind and the buffer is full, new events are dropped and
+counted rather than queued without bound. Remaining events are flushed when
+the worker exits. Each flush also interns user agents (see useragents.py)
+and updates the daily rollups, visitor sketches and car popularity counters
+(see rollups.py, visitors.py and popularity.py) in the same transaction.
+"""
+
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import DatabaseError, connection, transaction
+from django.dispatch import receiver
+from . import popularity, rollups, useragents, visitors
+
+logger = logging.getLogger(__name__)
+
+
+def write_events(model, instances):
+    """
+    Insert unsaved events of one model and update everything derived from them.
+    
+    User agents, rollups, visitor sketches and popularity counters are all
+    written in the same transaction as the events. Raises DatabaseError if
+    the batch can't be written.
+    """
+    with transaction.atomic():
+        useragents.resolve_user_agents(instances)
+        model.objects.bulk_create(instances, batch_size=500)
+        rollups.record_events(model, instances)
+        visitors.record_events(model, instances)
+        popularity.record_events(model, instances)
+
+
+class EventBuffer:
+    """Bounded, thread-safe buffer of unsaved analytics model instances."""
+
+    def __init__(self, max_events=10000, flush_size=200, flush_interval=5):
+        self.max_events = max_events
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {'accepted': 0, 'dropped': 0, 'flushed': 0, 'failed': 0}
+
+    def add(self, instance):
+        """Queue an unsaved instance. Returns False if it was dropped."""
+        return self.extend([instance]) == 1
+
+    def extend(self, instances):
+        """Queue several unsaved instances. Returns how many were accepted."""
+        with self._lock:
+            room = max(0, self.max_events - len(self._events))
+            accepted = instances[:room]
+            self._events.extend(accepted)
+            self.stats['accepted'] += len(accepted)
+            self.stats['dropped'] += len(instances) - len(accepted)
+            should_flush = len(self._events) >= self.flush_size
+
+        if self.flush_interval is None:
+            # No background thread: flush inline once the size threshold is hit
+            if should_flush:
+                self.flush()
+        else:
+            self._ensure_flusher()
+            if should_flush:
+                self._wake.set()
+        return len(accepted)
+
+    def flush(self):
+        """Write all buffered events. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                events, self._events = self._events, []
+            if not events:
+                return 0
+
+            by_model = defaultdict(list)
+            for instance in events:
+                by_model[type(instance)].append(instance)
+
+            written = 0
+            for model, instances in by_model.items():
+                try:
+                    # Checking the cars queries too, so it fails the same way
+                    instances = self._without_deleted_cars(model, instances)
+                    write_events(model, instances)
+                except DatabaseError:
+                    logger.exception('Failed to write %d %s events', len(instances), model.__name__)
+                    with self._lock:
+                        self.stats['failed'] += len(instances)
+                    continue
+                written += len(instances)
+
+            with self._lock:
+                self.stats['flushed'] += written
+            return written
+
+    def snapshot(self):
+        """Return counters plus the current queue depth."""
+        with self._lock:
+            return dict(self.stats, pending=len(self._events))
+
+    def stop(self):
+        """Stop the background flusher and write whatever is left."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def _without_deleted_cars(self, model, instances):
+        """Drop car events whose car no longer exists, using one query per flush."""
+        if not any(field.name == 'car' for field in model._meta.fields):
+            return instances
+        from cars.models import Car
+        car_ids = {instance.car_id for instance in instances}
+        existing = set(Car.objects.filter(id__in=car_ids).values_list('id', flat=True))
+        kept = [instance for instance in instances if instance.car_id in existing]
+        if len(kept) != len(instances):
+            with self._lock:
+                self.stats['failed'] += len(instances) - len(kept)
+        return kept
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='analytics-flusher', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Analytics flush failed')
+            finally:
+                # This thread owns its own connection; don't hold it between flushes
+                connection.close()
+
+
+_event_buffer = None
+_event_buffer_lock = threading.Lock()
+
+
+def get_event_buffer():
+    """Return this process's event buffer, created from settings on first use."""
+    global _event_buffer
+    if _event_buffer is None:
+        with _event_buffer_lock:
+            if _event_buffer is None:
+                config = getattr(settings, 'ANALYTICS_BUFFER', {})
+                _event_buffer = EventBuffer(
+                    max_events=config.get('MAX_EVENTS', 10000),
+                    flush_size=config.get('FLUSH_SIZE', 200),
+                    flush_interval=config.get('FLUSH_INTERVAL', 5),
+                )
+    return _event_buffer
+
+
+@atexit.register
+def _flush_on_exit():
+    """Flush pending events when a worker shuts down gracefully."""
+    if _event_buffer is not None:
+        _event_buffer.stop()
+
+
+@receiver(setting_changed)
+def _reset_event_buffer(setting, **kwargs):
+    global _event_buffer
+    if setting == 'ANALYTICS_BUFFER' and _event_buffer is not None:
+        _event_buffer.stop()
+        _event_buffer = None
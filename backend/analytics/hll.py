@@ -0,0 +1,76 @@
+"""
+HyperLogLog sketches for approximate distinct counts.
+
+A sketch is a fixed array of 2**PRECISION one-byte registers. Each item is
+hashed to 64 bits: the top PRECISION bits pick a register, which keeps the
+longest run of leading zeros seen in the remaining bits. Two sketches merge
+by taking the register-wise maximum, so daily sketches can be combined for
+any date range without revisiting the raw events.
+
+With PRECISION = 12 (4096 registers, 4KB before TOAST compression, which
+shrinks sparse sketches much further) the relative standard error is
+1.04 / sqrt(4096), about 1.6%. Roughly 95% of estimates fall within 3.25%
+and 99.7% within 4.9% of the true count. Small counts use linear counting
+and are close to exact.
+"""
+
+import hashlib
+import math
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+STANDARD_ERROR = 1.04 / math.sqrt(REGISTERS)
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+_VALUE_BITS = 64 - PRECISION
+
+
+def empty():
+    """Return an empty sketch."""
+    return bytes(REGISTERS)
+
+
+def hash_item(item):
+    """64-bit hash of a string item."""
+    return int.from_bytes(hashlib.blake2b(item.encode('utf-8', 'replace'), digest_size=8).digest(), 'big')
+
+
+def add(registers, item):
+    """Add an item to a mutable sketch (a bytearray) in place."""
+    value = hash_item(item)
+    index = value >> _VALUE_BITS
+    remainder = value & ((1 << _VALUE_BITS) - 1)
+    rank = _VALUE_BITS - remainder.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def build(items):
+    """Return a sketch of the given string items."""
+    registers = bytearray(REGISTERS)
+    for item in items:
+        add(registers, item)
+    return bytes(registers)
+
+
+def merge(*sketches):
+    """Return the union of sketches."""
+    sketches = [bytes(sketch) for sketch in sketches if sketch]
+    if not sketches:
+        return empty()
+    if len(sketches) == 1:
+        return sketches[0]
+    return bytes(map(max, *sketches))
+
+
+def estimate(sketch):
+    """Estimate the number of distinct items added to sketch."""
+    if not sketch:
+        return 0
+    sketch = bytes(sketch)
+    total = sum(2.0 ** -register for register in sketch)
+    raw = _ALPHA * REGISTERS * REGISTERS / total
+    zeros = sketch.count(0)
+    if raw <= 2.5 * REGISTERS and zeros:
+        # Linear counting is far more accurate while many registers are empty
+        return round(REGISTERS * math.log(REGISTERS / zeros))
+    return round(raw)
@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from analytics import archive
+
+
+class Command(BaseCommand):
+    """
+    Export closed days of raw analytics events to compressed archive files.
+
+    Intended to run daily from cron; with no dates it exports yesterday.
+    Days already archived are skipped unless --overwrite is given, which
+    merges the archived rows with those still in the database, e.g. to add
+    rows backfilled after the day was exported. With --delete, the rows in
+    each day's file are removed once it is safely written.
+    """
+
+    help = 'Export PageView/CarView rows for closed days to Parquet (or gzipped CSV) files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to export (YYYY-MM-DD, default: --end)')
+        parser.add_argument('--end', help='Last day to export (YYYY-MM-DD, default: yesterday)')
+        parser.add_argument(
+            '--output-dir',
+            default=getattr(settings, 'ANALYTICS_ARCHIVE_DIR', 'archive'),
+            help='Archive root directory',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(archive.FORMATS),
+            default=archive.default_format(),
+            help='File format (default: parquet if pyarrow is installed, else csv)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=50000,
+            help='Rows fetched and written at a time (default: 50000)',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete exported rows from the database',
+        )
+        parser.add_argument(
+            '--overwrite',
+            action='store_true',
+            help='Re-export days that are already archived, keeping their archived rows',
+        )
+
+    def handle(self, *args, **options):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        try:
+            end = date.fromisoformat(options['end']) if options['end'] else yesterday
+            start = date.fromisoformat(options['start']) if options['start'] else end
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+        if end > yesterday:
+            raise CommandError('Only closed days can be exported; --end must be before today')
+        if start > end:
+            raise CommandError('--start must not be after --end')
+        if options['format'] == 'parquet' and archive.pyarrow is None:
+            raise CommandError('Parquet export needs pyarrow installed; use --format csv')
+
+        root = options['output_dir']
+        exported = deleted = skipped = 0
+        day = start
+        while day <= end:
+            for model in archive.ARCHIVED_MODELS:
+                table = model._meta.db_table
+                if not options['overwrite'] and archive.archived_days(root, model, day, day):
+                    skipped += 1
+                    continue
+                rows = archive.export_day(
+                    root, model, day, options['format'], chunk_size=options['chunk_size']
+                )
+                if not rows:
+                    continue
+                exported += rows
+                message = f'{day} {table}: {rows} row(s)'
+                if options['delete']:
+                    count = archive.delete_day(root, model, day, batch_size=options['chunk_size'])
+                    deleted += count
+                    message += f', {count} deleted'
+                self.stdout.write(message)
+            day += timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {exported} row(s) to {root}, deleted {deleted}; '
+            f'{skipped} table-day(s) already archived.'
+        ))
@@ -0,0 +1,172 @@
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from cars.models import Car
+from analytics.accesslog import parse_car_view
+from analytics.buffer import write_events
+from analytics.models import CarView, AccessLogCheckpoint
+from analytics.screening import RecentViews
+from analytics.useragents import is_bot
+from analytics.views import MAX_USER_AGENT_LENGTH
+
+
+class Command(BaseCommand):
+    """
+    Load car detail views from nginx access logs.
+
+    Each successful GET /api/cars/<id>/ becomes a CarView (detail_view).
+    Bots and repeat views within the screening window are skipped, as at
+    the tracking endpoints. Events are written in batches together with
+    the file offset reached, so a restarted run resumes exactly where the
+    last committed batch ended. Use this instead of, not as well as, the
+    browser's detail_view tracking, or those views will be counted twice.
+    """
+
+    help = 'Ingest car detail views from nginx access logs (--follow to keep tailing)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Access log file(s) to read')
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Keep reading new lines as they are written, following log rotation',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Car views written per transaction (default: 5000)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait for new lines with --follow (default: 1)',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Ignore saved offsets and read each file from the beginning',
+        )
+
+    def handle(self, *args, **options):
+        if options['follow'] and len(options['paths']) > 1:
+            raise CommandError('--follow takes a single log file')
+
+        config = getattr(settings, 'ANALYTICS_SCREENING', {})
+        self.recent_views = RecentViews(
+            config.get('DUPLICATE_WINDOW', 30), config.get('MAX_TRACKED', 10000)
+        )
+        self.stats = dict.fromkeys(
+            ['lines', 'car_views', 'bots', 'duplicates', 'unknown_cars', 'written'], 0
+        )
+        started = time.monotonic()
+        for path in options['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f'{path} does not exist')
+            self._ingest(path, options)
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            'Read {lines} line(s), {car_views} car view(s): wrote {written}, skipped {bots} bot, '
+            '{duplicates} repeat and {unknown_cars} unknown-car view(s).'.format(**self.stats)
+        ))
+        self.stdout.write(f'{self.stats["lines"] / elapsed:,.0f} lines/s')
+
+    def _ingest(self, path, options):
+        path = os.path.abspath(path)
+        log = open(path, 'rb')
+        inode = os.fstat(log.fileno()).st_ino
+        offset = 0
+        checkpoint = AccessLogCheckpoint.objects.filter(path=path).first()
+        if checkpoint and not options['reset'] and checkpoint.inode == inode \
+                and checkpoint.offset <= os.fstat(log.fileno()).st_size:
+            offset = checkpoint.offset
+        log.seek(offset)
+        committed = None
+        draining = False
+
+        pending = []
+        try:
+            while True:
+                line = log.readline()
+                if line.endswith(b'\n'):
+                    offset += len(line)
+                    self.stats['lines'] += 1
+                    event = self._to_event(line)
+                    if event is not None:
+                        pending.append(event)
+                        if len(pending) >= options['batch_size']:
+                            self._commit(path, inode, offset, pending)
+                            committed, pending = offset, []
+                    continue
+
+                # End of file, possibly mid-line: leave the partial line for next time
+                log.seek(offset)
+                if offset != committed:
+                    self._commit(path, inode, offset, pending)
+                    committed, pending = offset, []
+                if not options['follow']:
+                    return
+                if self._rotated(path, inode):
+                    if not draining:
+                        # nginx may still append to the old file until it reopens its logs
+                        draining = True
+                        time.sleep(options['poll_interval'])
+                        continue
+                    log.close()
+                    log = open(path, 'rb')
+                    inode, offset, committed, draining = os.fstat(log.fileno()).st_ino, 0, None, False
+                    continue
+                if os.fstat(log.fileno()).st_size < offset:
+                    # Truncated in place (logrotate copytruncate): same inode, start over
+                    log.seek(0)
+                    offset, committed = 0, None
+                    continue
+                time.sleep(options['poll_interval'])
+        finally:
+            log.close()
+
+    def _to_event(self, line):
+        parsed = parse_car_view(line)
+        if parsed is None:
+            return None
+        car_id, ip_address, timestamp, user_agent = parsed
+        self.stats['car_views'] += 1
+        if is_bot(user_agent):
+            self.stats['bots'] += 1
+            return None
+        user_agent = user_agent[:MAX_USER_AGENT_LENGTH]
+        key = hash((car_id, ip_address, user_agent))
+        if self.recent_views.seen_recently(key, now=timestamp.timestamp()):
+            self.stats['duplicates'] += 1
+            return None
+        car_view = CarView(
+            car_id=car_id, view_type='detail_view', timestamp=timestamp, ip_address=ip_address
+        )
+        car_view.raw_user_agent = user_agent
+        return car_view
+
+    def _commit(self, path, inode, offset, events):
+        """Write events and the offset they end at in one transaction."""
+        with transaction.atomic():
+            if events:
+                car_ids = {event.car_id for event in events}
+                existing = set(Car.objects.filter(id__in=car_ids).values_list('id', flat=True))
+                kept = [event for event in events if event.car_id in existing]
+                self.stats['unknown_cars'] += len(events) - len(kept)
+                if kept:
+                    write_events(CarView, kept)
+                    self.stats['written'] += len(kept)
+            AccessLogCheckpoint.objects.update_or_create(
+                path=path, defaults={'inode': inode, 'offset': offset}
+            )
+
+    def _rotated(self, path, inode):
+        """Whether path now refers to a different (rotated-in) file."""
+        try:
+            return os.stat(path).st_ino != inode
+        except FileNotFoundError:
+            return False
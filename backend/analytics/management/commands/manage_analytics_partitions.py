@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from analytics.partitions import maintain_partitions
+
+
+class Command(BaseCommand):
+    """
+    Create upcoming monthly analytics partitions and drop expired ones.
+
+    Intended to run daily from cron. Dropping a month removes its raw
+    PageView/CarView rows; the daily rollups are not affected.
+    """
+
+    help = 'Create future analytics partitions and drop those past the retention window'
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'ANALYTICS_PARTITIONS', {})
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=config.get('MONTHS_AHEAD', 3),
+            help='Future months to create partitions for',
+        )
+        parser.add_argument(
+            '--retain-months',
+            type=int,
+            default=config.get('RETAIN_MONTHS', 13),
+            help='Months of raw events to keep, including the current month',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without creating or dropping anything',
+        )
+
+    def handle(self, *args, **options):
+        if options['retain_months'] < 1 or options['months_ahead'] < 0:
+            raise CommandError('--retain-months must be at least 1 and --months-ahead not negative')
+
+        created, dropped = maintain_partitions(
+            timezone.localdate(),
+            options['months_ahead'],
+            options['retain_months'],
+            dry_run=options['dry_run'],
+        )
+        prefix = 'Would create' if options['dry_run'] else 'Created'
+        for name in created:
+            self.stdout.write(f'{prefix} {name}')
+        prefix = 'Would drop' if options['dry_run'] else 'Dropped'
+        for name in dropped:
+            self.stdout.write(f'{prefix} {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(created)} partition(s) created, {len(dropped)} dropped.'
+        ))
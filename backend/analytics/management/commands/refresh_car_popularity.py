@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from analytics import popularity
+
+
+class Command(BaseCommand):
+    """
+    Re-base the per-car popularity counters on the daily rollups.
+
+    Flushes only ever add to the recent-window count, so this should run
+    daily (after midnight) to drop views that have aged out of the window.
+    """
+
+    help = 'Recompute recent and all-time car view counters from the daily rollups'
+
+    def handle(self, *args, **options):
+        cars = popularity.refresh(timezone.localdate())
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed popularity for {cars} car(s) '
+            f'({popularity.window_days()}-day window).'
+        ))
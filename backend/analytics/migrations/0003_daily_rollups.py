@@ -0,0 +1,87 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build daily counts from the events recorded before rollups existed."""
+    PageView = apps.get_model('analytics', 'PageView')
+    CarView = apps.get_model('analytics', 'CarView')
+    DailyPageViewCount = apps.get_model('analytics', 'DailyPageViewCount')
+    DailyCarViewCount = apps.get_model('analytics', 'DailyCarViewCount')
+
+    page_counts = PageView.objects.annotate(date=TruncDate('timestamp')).values(
+        'date', 'page_type'
+    ).annotate(total=Count('id')).order_by()
+    DailyPageViewCount.objects.bulk_create([
+        DailyPageViewCount(date=row['date'], page_type=row['page_type'], count=row['total'])
+        for row in page_counts
+    ], batch_size=1000)
+
+    car_counts = CarView.objects.annotate(date=TruncDate('timestamp')).values(
+        'date', 'car_id', 'view_type'
+    ).annotate(total=Count('id')).order_by()
+    DailyCarViewCount.objects.bulk_create([
+        DailyCarViewCount(date=row['date'], car_id=row['car_id'], view_type=row['view_type'], count=row['total'])
+        for row in car_counts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_car_primary_image'),
+        ('analytics', '0002_event_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCarViewCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('view_type', models.CharField(choices=[('card_click', 'Card Click'), ('detail_view', 'Detail View')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Car View Count',
+                'verbose_name_plural': 'Daily Car View Counts',
+                'ordering': ['-date', 'car'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyPageViewCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('page_type', models.CharField(choices=[('home', 'Home Page'), ('car_list', 'Car Listing'), ('car_detail', 'Car Detail'), ('contact', 'Contact Page')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Daily Page View Count',
+                'verbose_name_plural': 'Daily Page View Counts',
+                'ordering': ['-date', 'page_type'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailypageviewcount',
+            constraint=models.UniqueConstraint(fields=('date', 'page_type'), name='daily_page_view_unique'),
+        ),
+        migrations.AddField(
+            model_name='dailycarviewcount',
+            name='car',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_view_counts', to='cars.car'),
+        ),
+        migrations.AddIndex(
+            model_name='dailycarviewcount',
+            index=models.Index(fields=['car', 'date'], name='daily_car_view_car_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycarviewcount',
+            constraint=models.UniqueConstraint(fields=('date', 'car', 'view_type'), name='daily_car_view_unique'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
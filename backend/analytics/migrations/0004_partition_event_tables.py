@@ -0,0 +1,110 @@
+# Converts the raw analytics event tables to monthly range partitions.
+#
+# PostgreSQL only; other databases keep plain tables. The model state does
+# not change. Rows are copied in small committed batches while the old table
+# stays in use, and only the final catch-up copy and the rename happen under
+# a lock, so the tables are never locked for the length of a full copy. The
+# catch-up copies every row the new table lacks rather than only ids above
+# the last batch: buffered flushes are long transactions, so a row can get
+# its id before a batch is copied and commit after it.
+
+from datetime import date
+from django.db import migrations, transaction
+from django.utils import timezone
+
+TABLES = ['analytics_pageview', 'analytics_carview']
+COPY_BATCH_SIZE = 50000
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partitioned_copy(cursor, table):
+    new = f'{table}_partitioned'
+    cursor.execute(
+        f'CREATE TABLE {new} (LIKE {table} INCLUDING DEFAULTS) '
+        f'PARTITION BY RANGE (timestamp)'
+    )
+    # The partition key must be part of the primary key
+    cursor.execute(f'ALTER TABLE {new} ADD PRIMARY KEY (id, timestamp)')
+    if table == 'analytics_carview':
+        cursor.execute(
+            f'ALTER TABLE {new} ADD CONSTRAINT {table}_car_id_part_fk '
+            f'FOREIGN KEY (car_id) REFERENCES cars_car (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+        cursor.execute(f'CREATE INDEX {table}_car_id_part_idx ON {new} (car_id)')
+
+    cursor.execute(f'SELECT MIN(timestamp) FROM {table}')
+    oldest = cursor.fetchone()[0]
+    today = timezone.localdate()
+    first = timezone.localdate(oldest) if oldest else today
+    month = date(first.year, first.month, 1)
+    last = _add_months(date(today.year, today.month, 1), MONTHS_AHEAD)
+    while month <= last:
+        upper = _add_months(month, 1)
+        cursor.execute(
+            f"CREATE TABLE {table}_p{month.year:04d}_{month.month:02d} PARTITION OF {new} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {new} DEFAULT')
+
+
+def partition_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    for table in TABLES:
+        new = f'{table}_partitioned'
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            _create_partitioned_copy(cursor, table)
+
+        # Copy existing rows in batches, each in its own short transaction
+        copied_up_to = 0
+        while True:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > %s '
+                    f'ORDER BY id LIMIT %s) batch',
+                    [copied_up_to, COPY_BATCH_SIZE],
+                )
+                batch_end = cursor.fetchone()[0]
+                if batch_end is None:
+                    break
+                cursor.execute(
+                    f'INSERT INTO {new} SELECT * FROM {table} WHERE id > %s AND id <= %s',
+                    [copied_up_to, batch_end],
+                )
+                copied_up_to = batch_end
+
+        # Catch up on rows written during the copy, then swap the tables
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+            cursor.execute(
+                f'INSERT INTO {new} SELECT * FROM {table} t '
+                f'WHERE NOT EXISTS (SELECT 1 FROM {new} n WHERE n.id = t.id)'
+            )
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+            sequence = cursor.fetchone()[0]
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {new}.id')
+            cursor.execute(f'DROP TABLE {table}')
+            cursor.execute(f'ALTER TABLE {new} RENAME TO {table}')
+            cursor.execute(f'ALTER INDEX {new}_pkey RENAME TO {table}_pkey')
+
+
+class Migration(migrations.Migration):
+
+    # Each copy batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0003_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
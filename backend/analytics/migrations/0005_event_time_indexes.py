@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:26
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_partition_event_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carview',
+            index=models.Index(fields=['car', 'timestamp'], name='carview_car_timestamp_idx'),
+        ),
+        # The composite (car_id, timestamp) index replaces the plain car_id
+        # index, which migration 0004 created under its own name
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='carview',
+                    name='car',
+                    field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='analytics_views', to='cars.car'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX IF EXISTS analytics_carview_car_id_part_idx',
+                    'CREATE INDEX IF NOT EXISTS analytics_carview_car_id_part_idx ON analytics_carview (car_id)',
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='carview',
+            index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['timestamp'], name='carview_timestamp_brin'),
+        ),
+        migrations.AddIndex(
+            model_name='pageview',
+            index=django.contrib.postgres.indexes.BrinIndex(autosummarize=True, fields=['timestamp'], name='pageview_timestamp_brin'),
+        ),
+    ]
@@ -0,0 +1,171 @@
+# Moves raw User-Agent strings out of the event tables into UserAgent rows.
+#
+# The event tables are large, so existing rows are re-pointed in committed
+# batches by id, the same way 0004 copied them. The hash and parser are
+# copies of analytics.useragents, frozen here so later changes to the app
+# code don't change what this migration does.
+
+import hashlib
+import re
+
+from django.db import migrations, models, transaction
+import django.db.models.deletion
+
+MODELS = ['PageView', 'CarView']
+BATCH_SIZE = 50000
+
+BOT_RE = re.compile(
+    r'bot|crawl|spider|slurp|facebookexternalhit|embedly|preview|headless|phantomjs|'
+    r'lighthouse|pingdom|uptime|monitor|curl|wget|python-requests|python-urllib|'
+    r'go-http-client|java/|okhttp|httpclient|axios|node-fetch|scrapy',
+    re.I,
+)
+
+BROWSERS = [
+    ('Edge', re.compile(r'Edg(?:e|A|iOS)?/(\d+)')),
+    ('Opera', re.compile(r'(?:OPR|Opera)/(\d+)')),
+    ('Samsung Internet', re.compile(r'SamsungBrowser/(\d+)')),
+    ('Firefox', re.compile(r'(?:Firefox|FxiOS)/(\d+)')),
+    ('Chrome', re.compile(r'(?:Chrome|CriOS)/(\d+)')),
+    ('Safari', re.compile(r'Version/(\d+)[\d.]* (?:Mobile/\S+ )?Safari/')),
+]
+
+OPERATING_SYSTEMS = [
+    ('iOS', re.compile(r'iPhone|iPad|iPod')),
+    ('Android', re.compile(r'Android')),
+    ('Windows', re.compile(r'Windows')),
+    ('ChromeOS', re.compile(r'CrOS')),
+    ('macOS', re.compile(r'Mac OS X|Macintosh')),
+    ('Linux', re.compile(r'Linux|X11')),
+]
+
+
+def user_agent_hash(value):
+    return hashlib.sha1(value.encode('utf-8', 'replace')).hexdigest()
+
+
+def parse_user_agent(value):
+    browser, version = 'Other', ''
+    for name, pattern in BROWSERS:
+        match = pattern.search(value)
+        if match:
+            browser, version = name, match.group(1)
+            break
+
+    os_name = next((name for name, pattern in OPERATING_SYSTEMS if pattern.search(value)), 'Other')
+
+    if BOT_RE.search(value):
+        device_type = 'bot'
+    elif 'iPad' in value or 'Tablet' in value or ('Android' in value and 'Mobile' not in value):
+        device_type = 'tablet'
+    elif 'Mobi' in value or 'iPhone' in value or 'iPod' in value:
+        device_type = 'mobile'
+    elif os_name != 'Other':
+        device_type = 'desktop'
+    else:
+        device_type = 'other'
+
+    return {'browser': browser, 'browser_version': version, 'os': os_name, 'device_type': device_type}
+
+
+def intern_existing(apps, schema_editor):
+    UserAgent = apps.get_model('analytics', 'UserAgent')
+    connection = schema_editor.connection
+
+    for model_name in MODELS:
+        Model = apps.get_model('analytics', model_name)
+        values = (
+            Model.objects.exclude(raw_user_agent='')
+            .values_list('raw_user_agent', flat=True).distinct().order_by()
+        )
+        pending = []
+        for value in values.iterator():
+            pending.append(UserAgent(hash=user_agent_hash(value), value=value, **parse_user_agent(value)))
+            if len(pending) >= 1000:
+                UserAgent.objects.bulk_create(pending, ignore_conflicts=True)
+                pending = []
+        UserAgent.objects.bulk_create(pending, ignore_conflicts=True)
+
+        if connection.vendor != 'postgresql':
+            for agent in UserAgent.objects.all():
+                Model.objects.filter(raw_user_agent=agent.value).update(user_agent=agent)
+            continue
+
+        table = Model._meta.db_table
+        last_id = 0
+        while True:
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT MAX(id) FROM (SELECT id FROM {table} WHERE id > %s '
+                    f'ORDER BY id LIMIT %s) batch',
+                    [last_id, BATCH_SIZE],
+                )
+                batch_end = cursor.fetchone()[0]
+                if batch_end is None:
+                    break
+                cursor.execute(
+                    f'UPDATE {table} SET user_agent_id = ua.id FROM analytics_useragent ua '
+                    f'WHERE ua.value = {table}.raw_user_agent AND {table}.id > %s AND {table}.id <= %s',
+                    [last_id, batch_end],
+                )
+                last_id = batch_end
+
+
+class Migration(migrations.Migration):
+
+    # Each update batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('analytics', '0005_event_time_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=40, unique=True)),
+                ('value', models.TextField()),
+                ('browser', models.CharField(max_length=30)),
+                ('browser_version', models.CharField(blank=True, max_length=20)),
+                ('os', models.CharField(max_length=30)),
+                ('device_type', models.CharField(choices=[('desktop', 'Desktop'), ('mobile', 'Mobile'), ('tablet', 'Tablet'), ('bot', 'Bot'), ('other', 'Other')], max_length=10)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'User Agent',
+                'verbose_name_plural': 'User Agents',
+                'ordering': ['-first_seen'],
+            },
+        ),
+        migrations.RenameField(
+            model_name='pageview',
+            old_name='user_agent',
+            new_name='raw_user_agent',
+        ),
+        migrations.RenameField(
+            model_name='carview',
+            old_name='user_agent',
+            new_name='raw_user_agent',
+        ),
+        migrations.AddField(
+            model_name='pageview',
+            name='user_agent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='analytics.useragent'),
+        ),
+        migrations.AddField(
+            model_name='carview',
+            name='user_agent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='analytics.useragent'),
+        ),
+        migrations.RunPython(intern_existing, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='pageview',
+            name='raw_user_agent',
+        ),
+        migrations.RemoveField(
+            model_name='carview',
+            name='raw_user_agent',
+        ),
+    ]
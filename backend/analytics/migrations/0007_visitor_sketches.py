@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_car_primary_image'),
+        ('analytics', '0006_intern_user_agents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('registers', models.BinaryField()),
+            ],
+            options={
+                'verbose_name': 'Daily Visitor Sketch',
+                'verbose_name_plural': 'Daily Visitor Sketches',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCarVisitorSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('registers', models.BinaryField()),
+                ('car', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_visitor_sketches', to='cars.car')),
+            ],
+            options={
+                'verbose_name': 'Daily Car Visitor Sketch',
+                'verbose_name_plural': 'Daily Car Visitor Sketches',
+                'ordering': ['-date', 'car'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailycarvisitorsketch',
+            index=models.Index(fields=['car', 'date'], name='daily_car_visitor_car_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycarvisitorsketch',
+            constraint=models.UniqueConstraint(fields=('date', 'car'), name='daily_car_visitor_unique'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def backfill_popularity(apps, schema_editor):
+    # Only all-time totals; the recent window is filled by refresh_car_popularity
+    CarPopularity = apps.get_model('analytics', 'CarPopularity')
+    DailyCarViewCount = apps.get_model('analytics', 'DailyCarViewCount')
+    totals = DailyCarViewCount.objects.values('car_id').annotate(total=Sum('count')).order_by()
+    CarPopularity.objects.bulk_create([
+        CarPopularity(car_id=row['car_id'], total_views=row['total']) for row in totals
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_car_primary_image'),
+        ('analytics', '0007_visitor_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarPopularity',
+            fields=[
+                ('car', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity_stats', serialize=False, to='cars.car')),
+                ('total_views', models.PositiveBigIntegerField(default=0)),
+                ('recent_views', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Car Popularity',
+                'verbose_name_plural': 'Car Popularity',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='carpopularity',
+            index=models.Index(fields=['-recent_views'], name='car_popularity_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carpopularity',
+            index=models.Index(fields=['-total_views'], name='car_popularity_total_idx'),
+        ),
+        migrations.RunPython(backfill_popularity, migrations.RunPython.noop),
+    ]
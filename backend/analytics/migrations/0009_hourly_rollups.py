@@ -0,0 +1,76 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:38
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def backfill_hourly(apps, schema_editor):
+    """Build hourly counts from the events still in the raw tables."""
+    PageView = apps.get_model('analytics', 'PageView')
+    CarView = apps.get_model('analytics', 'CarView')
+    HourlyPageViewCount = apps.get_model('analytics', 'HourlyPageViewCount')
+    HourlyCarViewCount = apps.get_model('analytics', 'HourlyCarViewCount')
+
+    page_counts = PageView.objects.annotate(hour=TruncHour('timestamp')).values(
+        'hour', 'page_type'
+    ).annotate(total=Count('id')).order_by()
+    HourlyPageViewCount.objects.bulk_create([
+        HourlyPageViewCount(hour=row['hour'], page_type=row['page_type'], count=row['total'])
+        for row in page_counts
+    ], batch_size=1000)
+
+    car_counts = CarView.objects.annotate(hour=TruncHour('timestamp')).values(
+        'hour', 'view_type'
+    ).annotate(total=Count('id')).order_by()
+    HourlyCarViewCount.objects.bulk_create([
+        HourlyCarViewCount(hour=row['hour'], view_type=row['view_type'], count=row['total'])
+        for row in car_counts
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0008_car_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyCarViewCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('view_type', models.CharField(choices=[('card_click', 'Card Click'), ('detail_view', 'Detail View')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Hourly Car View Count',
+                'verbose_name_plural': 'Hourly Car View Counts',
+                'ordering': ['-hour', 'view_type'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyPageViewCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('page_type', models.CharField(choices=[('home', 'Home Page'), ('car_list', 'Car Listing'), ('car_detail', 'Car Detail'), ('contact', 'Contact Page')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Hourly Page View Count',
+                'verbose_name_plural': 'Hourly Page View Counts',
+                'ordering': ['-hour', 'page_type'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hourlypageviewcount',
+            constraint=models.UniqueConstraint(fields=('hour', 'page_type'), name='hourly_page_view_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlycarviewcount',
+            constraint=models.UniqueConstraint(fields=('hour', 'view_type'), name='hourly_car_view_unique'),
+        ),
+        migrations.RunPython(backfill_hourly, migrations.RunPython.noop),
+    ]
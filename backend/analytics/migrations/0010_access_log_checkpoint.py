@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0009_hourly_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessLogCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('inode', models.BigIntegerField()),
+                ('offset', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Access Log Checkpoint',
+                'verbose_name_plural': 'Access Log Checkpoints',
+            },
+        ),
+    ]
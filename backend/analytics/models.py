@@ -1,7 +1,37 @@
+from django.contrib.postgres.indexes import BrinIndex
 from django.db import models
+from django.utils import timezone
 from cars.models import Car
 
 
+class UserAgent(models.Model):
+    """A distinct User-Agent string, parsed once and shared by event rows"""
+    DEVICE_TYPE_CHOICES = [
+        ('desktop', 'Desktop'),
+        ('mobile', 'Mobile'),
+        ('tablet', 'Tablet'),
+        ('bot', 'Bot'),
+        ('other', 'Other'),
+    ]
+    
+    # SHA-1 of value; indexing the hash keeps the unique index small
+    hash = models.CharField(max_length=40, unique=True)
+    value = models.TextField()
+    browser = models.CharField(max_length=30)
+    browser_version = models.CharField(max_length=20, blank=True)
+    os = models.CharField(max_length=30)
+    device_type = models.CharField(max_length=10, choices=DEVICE_TYPE_CHOICES)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-first_seen']
+        verbose_name = 'User Agent'
+        verbose_name_plural = 'User Agents'
+    
+    def __str__(self):
+        return f"{self.browser} / {self.os} ({self.get_device_type_display()})"
+
+
 class PageView(models.Model):
     """Track page views across the website"""
     PAGE_CHOICES = [
@@ -12,14 +42,23 @@ class PageView(models.Model):
     ]
     
     page_type = models.CharField(max_length=20, choices=PAGE_CHOICES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event is received, not when the buffered row is written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
+    # Not indexed: events are never looked up by user agent
+    user_agent = models.ForeignKey(
+        UserAgent, on_delete=models.PROTECT, null=True, blank=True,
+        related_name='+', db_index=False
+    )
     
     class Meta:
         ordering = ['-timestamp']
         verbose_name = 'Page View'
         verbose_name_plural = 'Page Views'
+        indexes = [
+            # Rows arrive in timestamp order, so a tiny BRIN index covers range scans
+            BrinIndex(fields=['timestamp'], autosummarize=True, name='pageview_timestamp_brin'),
+        ]
     
     def __str__(self):
         return f"{self.get_page_type_display()} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -27,16 +66,26 @@ class PageView(models.Model):
 
 class CarView(models.Model):
     """Track views of specific cars"""
-    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='analytics_views')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    VIEW_TYPE_CHOICES = [
+        ('card_click', 'Card Click'),
+        ('detail_view', 'Detail View'),
+    ]
+    
+    # Lookups by car use the (car, timestamp) index below
+    car = models.ForeignKey(
+        Car, on_delete=models.CASCADE, related_name='analytics_views', db_index=False
+    )
+    # Set when the event is received, not when the buffered row is written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
+    # Not indexed: events are never looked up by user agent
+    user_agent = models.ForeignKey(
+        UserAgent, on_delete=models.PROTECT, null=True, blank=True,
+        related_name='+', db_index=False
+    )
     view_type = models.CharField(
         max_length=20,
-        choices=[
-            ('card_click', 'Card Click'),
-            ('detail_view', 'Detail View'),
-        ],
+        choices=VIEW_TYPE_CHOICES,
         default='detail_view'
     )
     
@@ -44,6 +93,159 @@ class CarView(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Car View'
         verbose_name_plural = 'Car Views'
+        indexes = [
+            BrinIndex(fields=['timestamp'], autosummarize=True, name='carview_timestamp_brin'),
+            # Per-car stats over a time range
+            models.Index(fields=['car', 'timestamp'], name='carview_car_timestamp_idx'),
+        ]
     
     def __str__(self):
         return f"{self.car.brand} {self.car.model} - {self.view_type} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
+
+
+class DailyPageViewCount(models.Model):
+    """Page views per day and page type, maintained as events are flushed"""
+    date = models.DateField()
+    page_type = models.CharField(max_length=20, choices=PageView.PAGE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date', 'page_type']
+        verbose_name = 'Daily Page View Count'
+        verbose_name_plural = 'Daily Page View Counts'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'page_type'], name='daily_page_view_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} {self.page_type}: {self.count}"
+
+
+class DailyCarViewCount(models.Model):
+    """Car views per day, car and view type, maintained as events are flushed"""
+    date = models.DateField()
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='daily_view_counts')
+    view_type = models.CharField(max_length=20, choices=CarView.VIEW_TYPE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date', 'car']
+        verbose_name = 'Daily Car View Count'
+        verbose_name_plural = 'Daily Car View Counts'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'car', 'view_type'], name='daily_car_view_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['car', 'date'], name='daily_car_view_car_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} car {self.car_id} {self.view_type}: {self.count}"
+
+
+class HourlyPageViewCount(models.Model):
+    """Site-wide page views per hour and page type, for hourly time series"""
+    hour = models.DateTimeField()
+    page_type = models.CharField(max_length=20, choices=PageView.PAGE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-hour', 'page_type']
+        verbose_name = 'Hourly Page View Count'
+        verbose_name_plural = 'Hourly Page View Counts'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'page_type'], name='hourly_page_view_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.page_type}: {self.count}"
+
+
+class HourlyCarViewCount(models.Model):
+    """Car views per hour and view type across all cars, for hourly time series"""
+    hour = models.DateTimeField()
+    view_type = models.CharField(max_length=20, choices=CarView.VIEW_TYPE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-hour', 'view_type']
+        verbose_name = 'Hourly Car View Count'
+        verbose_name_plural = 'Hourly Car View Counts'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'view_type'], name='hourly_car_view_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.view_type}: {self.count}"
+
+
+class DailyVisitorSketch(models.Model):
+    """HyperLogLog sketch of the day's unique site visitors (see hll.py)"""
+    date = models.DateField(unique=True)
+    registers = models.BinaryField()
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'Daily Visitor Sketch'
+        verbose_name_plural = 'Daily Visitor Sketches'
+    
+    def __str__(self):
+        return f"{self.date} visitors"
+
+
+class DailyCarVisitorSketch(models.Model):
+    """HyperLogLog sketch of the day's unique visitors to one car"""
+    date = models.DateField()
+    car = models.ForeignKey(Car, on_delete=models.CASCADE, related_name='daily_visitor_sketches')
+    registers = models.BinaryField()
+    
+    class Meta:
+        ordering = ['-date', 'car']
+        verbose_name = 'Daily Car Visitor Sketch'
+        verbose_name_plural = 'Daily Car Visitor Sketches'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'car'], name='daily_car_visitor_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['car', 'date'], name='daily_car_visitor_car_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} car {self.car_id} visitors"
+
+
+class CarPopularity(models.Model):
+    """Per-car view counters, maintained in batches for popularity ordering"""
+    car = models.OneToOneField(
+        Car, on_delete=models.CASCADE, primary_key=True, related_name='popularity_stats'
+    )
+    total_views = models.PositiveBigIntegerField(default=0)
+    # Views in the last ANALYTICS_POPULARITY_WINDOW_DAYS days, re-based daily
+    recent_views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Car Popularity'
+        verbose_name_plural = 'Car Popularity'
+        indexes = [
+            models.Index(fields=['-recent_views'], name='car_popularity_recent_idx'),
+            models.Index(fields=['-total_views'], name='car_popularity_total_idx'),
+        ]
+    
+    def __str__(self):
+        return f"car {self.car_id}: {self.recent_views} recent / {self.total_views} total"
+
+
+class AccessLogCheckpoint(models.Model):
+    """How far ingest_access_log has read a log file, saved with each batch"""
+    path = models.CharField(max_length=500, unique=True)
+    # Detects rotation: a new inode or a file shorter than offset restarts at 0
+    inode = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Access Log Checkpoint'
+        verbose_name_plural = 'Access Log Checkpoints'
+    
+    def __str__(self):
+        return f"{self.path} @ {self.offset}"
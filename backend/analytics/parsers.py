@@ -0,0 +1,11 @@
+from rest_framework.parsers import JSONParser
+
+
+class BeaconJSONParser(JSONParser):
+    """
+    Parse JSON sent as text/plain.
+    
+    navigator.sendBeacon() can only send CORS-safelisted content types
+    without a preflight, so the frontend posts its JSON batch as text/plain.
+    """
+    media_type = 'text/plain'
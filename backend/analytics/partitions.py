@@ -0,0 +1,158 @@
+"""
+Monthly range partitions for the raw analytics event tables.
+
+On PostgreSQL, analytics_pageview and analytics_carview are partitioned by
+month on timestamp (see migration 0004). New months are created ahead of
+time and expired months are dropped whole, which is O(1) and leaves no
+table bloat, unlike a large DELETE. Rows that arrive for a month with no
+partition land in the DEFAULT partition and are moved out when that
+month's partition is created.
+
+Long-term statistics are kept in the daily rollups, which are not pruned.
+"""
+
+import re
+from datetime import date
+from django.db import connection, transaction
+from .models import PageView, CarView
+
+PARTITIONED_MODELS = [PageView, CarView]
+PARTITION_NAME_RE = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def month_start(day):
+    """First day of the month containing day."""
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, count):
+    """Shift a month-start date by count months."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month.year:04d}_{month.month:02d}'
+
+
+def default_partition_name(table):
+    return f'{table}_default'
+
+
+def is_partitioned(model):
+    """Whether the model's table is a partitioned table in this database."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+            [model._meta.db_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(model):
+    """Return the month-start dates of the model's monthly partitions, sorted."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass',
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        if match and name.startswith(table):
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(model, month):
+    """
+    Create the partition for one month if it doesn't exist.
+
+    Any rows already sitting in the DEFAULT partition for that month are
+    moved into the new partition. Returns True if a partition was created.
+    """
+    table = model._meta.db_table
+    if month in list_partitions(model):
+        return False
+
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    lower, upper = month, add_months(month, 1)
+    bounds = [lower.isoformat(), upper.isoformat()]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {default} '
+            f'WHERE timestamp >= %s::timestamptz AND timestamp < %s::timestamptz)',
+            bounds,
+        )
+        has_stray_rows = cursor.fetchone()[0]
+        if has_stray_rows:
+            cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {default}')
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        if has_stray_rows:
+            cursor.execute(
+                f'INSERT INTO {table} SELECT * FROM {default} '
+                f'WHERE timestamp >= %s::timestamptz AND timestamp < %s::timestamptz',
+                bounds,
+            )
+            cursor.execute(
+                f'DELETE FROM {default} '
+                f'WHERE timestamp >= %s::timestamptz AND timestamp < %s::timestamptz',
+                bounds,
+            )
+            cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT')
+    return True
+
+
+def drop_partition(model, month):
+    """Detach and drop one month's partition."""
+    table = model._meta.db_table
+    name = partition_name(table, month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Run deferred FK checks now; pending trigger events would block the DROP
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {name}')
+        cursor.execute(f'DROP TABLE {name}')
+
+
+def maintain_partitions(today, months_ahead, retain_months, dry_run=False):
+    """
+    Create partitions through months_ahead and drop those older than retain_months.
+
+    A partition is dropped only when its whole month is older than the
+    retention window. Returns (created, dropped) lists of partition names.
+    """
+    current = month_start(today)
+    oldest_kept = add_months(current, -(retain_months - 1))
+    created = []
+    dropped = []
+
+    for model in PARTITIONED_MODELS:
+        if not is_partitioned(model):
+            continue
+        table = model._meta.db_table
+        existing = set(list_partitions(model))
+
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                if dry_run or create_partition(model, month):
+                    created.append(partition_name(table, month))
+
+        for month in sorted(existing):
+            if month < oldest_kept:
+                if not dry_run:
+                    drop_partition(model, month)
+                dropped.append(partition_name(table, month))
+
+    return created, dropped
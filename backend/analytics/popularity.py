@@ -0,0 +1,79 @@
+"""
+Per-car popularity counters.
+
+CarPopularity holds an all-time and a recent-window view count per car,
+indexed so cars can be listed by popularity without aggregating events.
+Both counters are incremented once per flushed batch; views dated before the
+recent window, e.g. backfilled from access logs, only add to the total. The
+recent count still only grows between refreshes, so refresh() re-bases both
+from the daily rollups; it is run daily by the refresh_car_popularity
+command.
+"""
+
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import CarView, CarPopularity, DailyCarViewCount
+
+
+def window_days():
+    return getattr(settings, 'ANALYTICS_POPULARITY_WINDOW_DAYS', 7)
+
+
+def window_start(today):
+    """First day of the recent window ending today."""
+    return today - timedelta(days=window_days() - 1)
+
+
+def record_events(model, instances):
+    """Add a batch of just-written car views to the counters."""
+    if model is not CarView or not instances:
+        return
+    since = window_start(timezone.localdate())
+    totals = Counter(event.car_id for event in instances)
+    recent = Counter(
+        event.car_id for event in instances if timezone.localdate(event.timestamp) >= since
+    )
+    # Sorted by car_id so concurrent flushes lock rows in the same order
+    counts = sorted(totals.items())
+    table = CarPopularity._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (car_id, total_views, recent_views) '
+            f'VALUES {", ".join(["(%s, %s, %s)"] * len(counts))} '
+            f'ON CONFLICT (car_id) DO UPDATE SET '
+            f'total_views = {table}.total_views + EXCLUDED.total_views, '
+            f'recent_views = {table}.recent_views + EXCLUDED.recent_views',
+            [value for car_id, count in counts for value in (car_id, count, recent[car_id])],
+        )
+
+
+def refresh(today):
+    """
+    Recompute both counters from the daily rollups.
+    
+    The recent window covers window_days() days ending today. Returns the
+    number of cars with a counter row.
+    """
+    table = CarPopularity._meta.db_table
+    rollups = DailyCarViewCount._meta.db_table
+    since = window_start(today)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (car_id, total_views, recent_views) '
+            f'SELECT car_id, SUM(count), COALESCE(SUM(count) FILTER (WHERE date >= %s), 0) '
+            f'FROM {rollups} GROUP BY car_id ORDER BY car_id '
+            f'ON CONFLICT (car_id) DO UPDATE SET '
+            f'total_views = EXCLUDED.total_views, '
+            f'recent_views = EXCLUDED.recent_views',
+            [since],
+        )
+        # Cars whose rollups were all removed
+        cursor.execute(
+            f'UPDATE {table} SET total_views = 0, recent_views = 0 '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {rollups} r WHERE r.car_id = {table}.car_id) '
+            f'AND (total_views <> 0 OR recent_views <> 0)'
+        )
+    return CarPopularity.objects.count()
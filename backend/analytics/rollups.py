@@ -0,0 +1,210 @@
+"""
+Daily and hourly rollups of analytics events.
+
+Raw PageView/CarView tables grow without bound, so summary statistics and
+time series are read from per-day and per-hour count tables instead. Hourly
+counts are site-wide (per page type or view type, not per car) to stay
+small. The counts are incremented in the same transaction that writes each
+buffered batch of events, using an INSERT ... ON CONFLICT upsert, and can be
+rebuilt from the raw tables with the rebuild_analytics_rollups command.
+"""
+
+from collections import Counter
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+from .models import (
+    PageView, CarView, DailyPageViewCount, DailyCarViewCount,
+    HourlyPageViewCount, HourlyCarViewCount,
+)
+from .timeranges import filter_days
+
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def _upsert_counts(model, key_fields, counts):
+    """Add counts to rollup rows keyed by key_fields, creating rows as needed."""
+    opts = model._meta
+    table = opts.db_table
+    key_columns = [opts.get_field(name).column for name in key_fields]
+    row_placeholder = '(' + ', '.join(['%s'] * (len(key_columns) + 1)) + ')'
+    # Lock rows in key order, so concurrent flushes of overlapping keys can't deadlock
+    items = sorted(counts.items())
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), UPSERT_BATCH_SIZE):
+            batch = items[start:start + UPSERT_BATCH_SIZE]
+            params = []
+            for key, count in batch:
+                params.extend(key)
+                params.append(count)
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(key_columns)}, count) '
+                f'VALUES {", ".join([row_placeholder] * len(batch))} '
+                f'ON CONFLICT ({", ".join(key_columns)}) '
+                f'DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                params,
+            )
+
+
+def hour_start(timestamp):
+    """Start of the local hour containing timestamp."""
+    return timezone.localtime(timestamp).replace(minute=0, second=0, microsecond=0)
+
+
+def record_events(model, instances):
+    """Fold a batch of just-written events into the daily and hourly rollups."""
+    if model is PageView:
+        counts = Counter(
+            (timezone.localdate(event.timestamp), event.page_type) for event in instances
+        )
+        _upsert_counts(DailyPageViewCount, ['date', 'page_type'], counts)
+        counts = Counter((hour_start(event.timestamp), event.page_type) for event in instances)
+        _upsert_counts(HourlyPageViewCount, ['hour', 'page_type'], counts)
+    elif model is CarView:
+        counts = Counter(
+            (timezone.localdate(event.timestamp), event.car_id, event.view_type)
+            for event in instances
+        )
+        _upsert_counts(DailyCarViewCount, ['date', 'car', 'view_type'], counts)
+        counts = Counter((hour_start(event.timestamp), event.view_type) for event in instances)
+        _upsert_counts(HourlyCarViewCount, ['hour', 'view_type'], counts)
+
+
+def _replace(start_date, end_date, daily_pages, daily_cars, hourly_pages, hourly_cars):
+    """
+    Swap the rollups for an inclusive date range for freshly counted rows.
+
+    Page (or car) rollups are left as they are when their daily counts are None.
+    """
+    def in_range(queryset, field):
+        if start_date:
+            queryset = queryset.filter(**{f'{field}__gte': start_date})
+        if end_date:
+            queryset = queryset.filter(**{f'{field}__lte': end_date})
+        return queryset
+
+    written = 0
+    with transaction.atomic():
+        if daily_pages is not None:
+            in_range(DailyPageViewCount.objects.all(), 'date').delete()
+            filter_days(HourlyPageViewCount.objects.all(), start_date, end_date, field='hour').delete()
+            written += len(DailyPageViewCount.objects.bulk_create([
+                DailyPageViewCount(date=day, page_type=page_type, count=count)
+                for (day, page_type), count in daily_pages
+            ], batch_size=1000))
+            written += len(HourlyPageViewCount.objects.bulk_create([
+                HourlyPageViewCount(hour=hour, page_type=page_type, count=count)
+                for (hour, page_type), count in hourly_pages
+            ], batch_size=1000))
+        if daily_cars is not None:
+            in_range(DailyCarViewCount.objects.all(), 'date').delete()
+            filter_days(HourlyCarViewCount.objects.all(), start_date, end_date, field='hour').delete()
+            written += len(DailyCarViewCount.objects.bulk_create([
+                DailyCarViewCount(date=day, car_id=car_id, view_type=view_type, count=count)
+                for (day, car_id, view_type), count in daily_cars
+            ], batch_size=1000))
+            written += len(HourlyCarViewCount.objects.bulk_create([
+                HourlyCarViewCount(hour=hour, view_type=view_type, count=count)
+                for (hour, view_type), count in hourly_cars
+            ], batch_size=1000))
+    return written
+
+
+def recount_range(model, start_date=None, end_date=None):
+    """
+    The inclusive range of model's rollups that can be recounted from its raw table.
+
+    start_date defaults to the oldest day still in the raw table, so days
+    dropped by partition retention or deleted after archiving keep their
+    rollups. Raises RuntimeError if the range includes a day that has
+    rollups but no raw events left. Returns None if the raw table is empty
+    and no start_date was given.
+    """
+    if start_date is None:
+        oldest = model.objects.aggregate(oldest=Min('timestamp'))['oldest']
+        if oldest is None:
+            return None
+        start_date = timezone.localdate(oldest)
+
+    rollup = DailyPageViewCount if model is PageView else DailyCarViewCount
+    rollup_days = rollup.objects.filter(date__gte=start_date)
+    if end_date:
+        rollup_days = rollup_days.filter(date__lte=end_date)
+    raw_days = filter_days(model.objects.all(), start_date, end_date).annotate(
+        date=TruncDate('timestamp')
+    ).values_list('date', flat=True).distinct()
+    pruned = sorted(set(rollup_days.values_list('date', flat=True)) - set(raw_days))
+    if pruned:
+        raise RuntimeError(
+            f'{model._meta.db_table} has no raw events left for {len(pruned)} day(s) with rollups, '
+            f'from {pruned[0]} to {pruned[-1]}; rebuild them --from-archive or leave them out of the range'
+        )
+    return start_date, end_date
+
+
+def rebuild(start_date=None, end_date=None):
+    """
+    Recompute rollups from the raw tables for an inclusive date range.
+
+    Each table is recounted over its recount_range(), so rollups for days
+    whose raw events are gone are never replaced by nothing. Returns the
+    number of rollup rows written.
+    """
+    written = 0
+    page_range = recount_range(PageView, start_date, end_date)
+    car_range = recount_range(CarView, start_date, end_date)
+    if page_range:
+        # Filter the raw tables on timestamp itself so indexes and partition pruning apply
+        page_counts = filter_days(PageView.objects.all(), *page_range).annotate(
+            date=TruncDate('timestamp')
+        ).values('date', 'page_type').annotate(total=Count('id')).order_by()
+        hourly_page_counts = filter_days(PageView.objects.all(), *page_range).annotate(
+            hour=TruncHour('timestamp')
+        ).values('hour', 'page_type').annotate(total=Count('id')).order_by()
+        written += _replace(
+            *page_range,
+            [((row['date'], row['page_type']), row['total']) for row in page_counts], None,
+            [((row['hour'], row['page_type']), row['total']) for row in hourly_page_counts], None,
+        )
+    if car_range:
+        car_counts = filter_days(CarView.objects.all(), *car_range).annotate(
+            date=TruncDate('timestamp')
+        ).values('date', 'car_id', 'view_type').annotate(total=Count('id')).order_by()
+        hourly_car_counts = filter_days(CarView.objects.all(), *car_range).annotate(
+            hour=TruncHour('timestamp')
+        ).values('hour', 'view_type').annotate(total=Count('id')).order_by()
+        written += _replace(
+            *car_range,
+            None, [((row['date'], row['car_id'], row['view_type']), row['total']) for row in car_counts],
+            None, [((row['hour'], row['view_type']), row['total']) for row in hourly_car_counts],
+        )
+    return written
+
+
+def rebuild_from_events(start_date, end_date, page_events=None, car_events=None):
+    """
+    Recompute rollups for an inclusive date range from event tuples.
+
+    page_events yields (timestamp, page_type) and car_events yields
+    (timestamp, car_id, view_type), e.g. read back from an archive. The
+    rollups of a table whose events are None are not touched. Returns the
+    number of rollup rows written.
+    """
+    daily_pages = hourly_pages = daily_cars = hourly_cars = None
+    if page_events is not None:
+        daily_pages, hourly_pages = Counter(), Counter()
+        for timestamp, page_type in page_events:
+            daily_pages[timezone.localdate(timestamp), page_type] += 1
+            hourly_pages[hour_start(timestamp), page_type] += 1
+        daily_pages, hourly_pages = daily_pages.items(), hourly_pages.items()
+    if car_events is not None:
+        daily_cars, hourly_cars = Counter(), Counter()
+        for timestamp, car_id, view_type in car_events:
+            daily_cars[timezone.localdate(timestamp), car_id, view_type] += 1
+            hourly_cars[hour_start(timestamp), view_type] += 1
+        daily_cars, hourly_cars = daily_cars.items(), hourly_cars.items()
+
+    return _replace(start_date, end_date, daily_pages, daily_cars, hourly_pages, hourly_cars)
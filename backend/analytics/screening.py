@@ -0,0 +1,106 @@
+"""
+Ingest-time screening of tracking events.
+
+Events from known bots are rejected before they reach the buffer, and a car
+view is suppressed if the same client (IP and User-Agent) already viewed the
+same car within DUPLICATE_WINDOW seconds. Both checks are O(1) per event
+and need no query: bots are matched with one precompiled pattern and recent
+views are remembered in a bounded per-process LRU. With several workers a
+repeat view can still slip through on a different worker, which only
+under-suppresses.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from .useragents import is_bot
+
+
+class RecentViews:
+    """Bounded LRU remembering when each key was last counted."""
+
+    def __init__(self, window=30, max_entries=10000):
+        self.window = window
+        self.max_entries = max_entries
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen_recently(self, key, now=None):
+        """
+        Return True if key was counted less than window seconds ago.
+        
+        Otherwise record now as the time it was counted. Suppressed repeats
+        don't extend the window, so a client clicking continuously is still
+        counted once per window.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last = self._seen.get(key)
+            if last is not None and now - last < self.window:
+                return True
+            self._seen[key] = now
+            self._seen.move_to_end(key)
+            if len(self._seen) > self.max_entries:
+                self._seen.popitem(last=False)
+            return False
+
+    def __len__(self):
+        return len(self._seen)
+
+
+class EventScreen:
+    """Bot and duplicate-view filter with rejection counters."""
+
+    def __init__(self, duplicate_window=30, max_tracked=10000):
+        self.recent_views = RecentViews(duplicate_window, max_tracked)
+        self._lock = threading.Lock()
+        self.stats = {'bots': 0, 'duplicates': 0}
+
+    def is_bot(self, user_agent, count=1):
+        """Whether events from user_agent should be rejected, counting count events if so."""
+        if not is_bot(user_agent):
+            return False
+        with self._lock:
+            self.stats['bots'] += count
+        return True
+
+    def is_duplicate(self, car_view, ip_address, user_agent):
+        """Whether this client already viewed the car within the window."""
+        key = hash((car_view.car_id, ip_address, user_agent))
+        if not self.recent_views.seen_recently(key):
+            return False
+        with self._lock:
+            self.stats['duplicates'] += 1
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, tracked=len(self.recent_views))
+
+
+_event_screen = None
+_event_screen_lock = threading.Lock()
+
+
+def get_event_screen():
+    """Return this process's event screen, created from settings on first use."""
+    global _event_screen
+    if _event_screen is None:
+        with _event_screen_lock:
+            if _event_screen is None:
+                config = getattr(settings, 'ANALYTICS_SCREENING', {})
+                _event_screen = EventScreen(
+                    duplicate_window=config.get('DUPLICATE_WINDOW', 30),
+                    max_tracked=config.get('MAX_TRACKED', 10000),
+                )
+    return _event_screen
+
+
+@receiver(setting_changed)
+def _reset_event_screen(setting, **kwargs):
+    global _event_screen
+    if setting == 'ANALYTICS_SCREENING':
+        _event_screen = None
@@ -0,0 +1,1118 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from rest_framework.test import APITestCase
+from rest_framework import status
+from cars.models import Car
+from .buffer import EventBuffer, get_event_buffer
+from .models import (
+    PageView, CarView, DailyPageViewCount, DailyCarViewCount, UserAgent,
+    DailyVisitorSketch, DailyCarVisitorSketch, CarPopularity,
+    HourlyPageViewCount, HourlyCarViewCount, AccessLogCheckpoint,
+)
+from . import archive, hll, partitions, popularity, rollups, timeseries, visitors
+from .accesslog import parse_car_view
+from .timeranges import day_bounds, day_start, filter_days
+from .screening import RecentViews, get_event_screen
+from .useragents import UserAgentCache, parse_user_agent, resolve_user_agents
+
+
+def make_car(**kwargs):
+    """Create a car with sensible defaults for tests."""
+    defaults = dict(
+        brand='Toyota',
+        model='Yaris',
+        year=2021,
+        price=15000.00,
+        mileage=20000,
+        transmission='manual',
+        fuel_type='petrol',
+        engine_size=1.5,
+        horsepower=110,
+        color='red',
+        doors=4,
+        seats=5,
+        condition='used',
+    )
+    defaults.update(kwargs)
+    return Car.objects.create(**defaults)
+
+
+INLINE_BUFFER = {'MAX_EVENTS': 3, 'FLUSH_SIZE': 100, 'FLUSH_INTERVAL': None}
+SCREENING = {'DUPLICATE_WINDOW': 30, 'MAX_TRACKED': 100}
+# Keeps throttle counters out of assertNumQueries
+LOCMEM_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tiered': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+class TrackingAPITest(APITestCase):
+    """Test cases for the buffered tracking endpoints."""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        # Overriding per test gives every test a fresh buffer
+        settings_override = override_settings(
+            ANALYTICS_BUFFER=INLINE_BUFFER, ANALYTICS_SCREENING=SCREENING
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.car = make_car()
+        self.buffer = get_event_buffer()
+
+    def test_page_view_is_buffered_then_flushed(self):
+        """Test page views are accepted immediately and written on flush."""
+        response = self.client.post(
+            '/api/analytics/track/page/', {'page_type': 'home'},
+            HTTP_USER_AGENT='Mozilla/5.0', REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(PageView.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        page_view = PageView.objects.get()
+        self.assertEqual(page_view.page_type, 'home')
+        self.assertEqual(page_view.ip_address, '10.0.0.1')
+        self.assertEqual(page_view.user_agent.value, 'Mozilla/5.0')
+
+    def test_invalid_page_type_rejected(self):
+        """Test unknown page types are rejected without touching the buffer."""
+        response = self.client.post('/api/analytics/track/page/', {'page_type': 'admin'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.buffer.snapshot()['pending'], 0)
+
+    def test_non_string_choices_rejected(self):
+        """Test list or object page_type/view_type values are a 400, not a server error."""
+        for url, payload in [
+            ('/api/analytics/track/page/', {'page_type': ['home']}),
+            ('/api/analytics/track/page/', {'page_type': {'home': 1}}),
+            ('/api/analytics/track/car/', {'car': self.car.id, 'view_type': ['detail_view']}),
+        ]:
+            response = self.client.post(url, payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.buffer.snapshot()['pending'], 0)
+
+    def test_non_object_body_rejected(self):
+        """Test a JSON list or string body is a 400, not a server error."""
+        for url in ['/api/analytics/track/page/', '/api/analytics/track/car/']:
+            for body in [[], 'x']:
+                response = self.client.post(url, body, format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_forwarded_ip_is_not_stored(self):
+        """Test a malformed X-Forwarded-For cannot break a batch insert."""
+        self.client.post(
+            '/api/analytics/track/page/', {'page_type': 'home'},
+            HTTP_X_FORWARDED_FOR='not-an-ip'
+        )
+        self.buffer.flush()
+        self.assertIsNone(PageView.objects.get().ip_address)
+
+    def test_car_view_for_missing_car_discarded_on_flush(self):
+        """Test events for deleted cars are dropped with one query at flush."""
+        self.client.post('/api/analytics/track/car/', {'car': self.car.id, 'view_type': 'card_click'})
+        self.client.post('/api/analytics/track/car/', {'car': 99999})
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(CarView.objects.get().view_type, 'card_click')
+        self.assertEqual(self.buffer.snapshot()['failed'], 1)
+
+    def test_full_buffer_applies_back_pressure(self):
+        """Test events beyond MAX_EVENTS are dropped and counted."""
+        for _ in range(3):
+            self.client.post('/api/analytics/track/page/', {'page_type': 'home'})
+        response = self.client.post('/api/analytics/track/page/', {'page_type': 'home'})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(self.buffer.snapshot()['dropped'], 1)
+
+
+class BatchTrackingAPITest(APITestCase):
+    """Test cases for the batched beacon endpoint."""
+
+    url = '/api/analytics/track/batch/'
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        settings_override = override_settings(
+            ANALYTICS_BUFFER=INLINE_BUFFER, ANALYTICS_SCREENING=SCREENING
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.car = make_car()
+        self.buffer = get_event_buffer()
+
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_batch_accepts_mixed_events(self):
+        """Test page and car events in one batch are written together."""
+        events = [
+            {'type': 'page', 'page_type': 'car_list'},
+            {'type': 'car', 'car': self.car.id, 'view_type': 'card_click'},
+        ]
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, {'events': events}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['accepted'], 2)
+        self.buffer.flush()
+        self.assertEqual(PageView.objects.count(), 1)
+        self.assertEqual(CarView.objects.count(), 1)
+
+    def test_beacon_text_plain_body(self):
+        """Test sendBeacon-style text/plain JSON bodies are accepted."""
+        body = json.dumps([{'type': 'page', 'page_type': 'home'}])
+        response = self.client.post(self.url, body, content_type='text/plain;charset=UTF-8')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_invalid_events_reported_by_index(self):
+        """Test invalid events are rejected individually without failing the batch."""
+        events = [
+            {'type': 'page', 'page_type': 'home'},
+            {'type': 'car', 'car': 99999},
+            {'type': 'unknown'},
+        ]
+        response = self.client.post(self.url, {'events': events}, format='json')
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual([r['index'] for r in response.data['rejected']], [1, 2])
+
+    def test_malformed_events_rejected_individually(self):
+        """Test list or object values in one event are reported by index, not a server error."""
+        events = [
+            {'type': ['page'], 'page_type': 'home'},
+            {'type': 'page', 'page_type': ['home']},
+            {'type': 'car', 'car': self.car.id, 'view_type': {'detail_view': 1}},
+            {'type': 'car', 'car': [self.car.id]},
+            {'type': 'car', 'car': True},
+            {'type': 'page', 'page_type': 'home'},
+        ]
+        response = self.client.post(self.url, {'events': events}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual([r['index'] for r in response.data['rejected']], [0, 1, 2, 3, 4])
+
+    def test_batch_size_limit(self):
+        """Test oversized batches are rejected."""
+        events = [{'type': 'page', 'page_type': 'home'}] * 51
+        response = self.client.post(self.url, {'events': events}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EventBufferTest(TestCase):
+    """Test cases for EventBuffer flush thresholds."""
+
+    def test_size_threshold_flushes_inline(self):
+        """Test reaching FLUSH_SIZE writes the batch without a background thread."""
+        buffer = EventBuffer(max_events=10, flush_size=2, flush_interval=None)
+        buffer.add(PageView(page_type='home'))
+        self.assertEqual(PageView.objects.count(), 0)
+        buffer.add(PageView(page_type='contact'))
+        self.assertEqual(PageView.objects.count(), 2)
+
+    def test_stop_flushes_pending_events(self):
+        """Test shutdown writes whatever is still buffered."""
+        buffer = EventBuffer(max_events=10, flush_size=100, flush_interval=None)
+        buffer.add(PageView(page_type='home'))
+        buffer.stop()
+        self.assertEqual(PageView.objects.count(), 1)
+
+    def test_failed_car_check_counts_events_as_failed(self):
+        """Test a failing car lookup is handled like a failed write, not raised."""
+        car = make_car()
+        buffer = EventBuffer(max_events=10, flush_size=100, flush_interval=None)
+        buffer.extend([CarView(car=car), PageView(page_type='home')])
+        with mock.patch.object(Car.objects, 'filter', side_effect=DatabaseError('connection lost')):
+            self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.snapshot()['failed'], 1)
+        self.assertEqual(CarView.objects.count(), 0)
+
+
+class BackgroundFlushTest(TransactionTestCase):
+    """Test the background flusher thread writes on the time threshold."""
+
+    def test_interval_flush(self):
+        """Test buffered events are written after FLUSH_INTERVAL without a size trigger."""
+        buffer = EventBuffer(max_events=10, flush_size=100, flush_interval=0.05)
+        buffer.add(PageView(page_type='home'))
+        deadline = time.monotonic() + 5
+        while PageView.objects.count() == 0 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        buffer.stop()
+        self.assertEqual(PageView.objects.count(), 1)
+        self.assertEqual(buffer.snapshot()['flushed'], 1)
+
+
+class DailyRollupTest(TestCase):
+    """Test cases for incrementally maintained daily rollups."""
+
+    def setUp(self):
+        self.car = make_car()
+        self.buffer = EventBuffer(max_events=100, flush_size=100, flush_interval=None)
+
+    def test_flush_increments_rollups(self):
+        """Test each flush adds its batch to the existing daily counts."""
+        yesterday = timezone.now() - timedelta(days=1)
+        self.buffer.extend([
+            PageView(page_type='home'),
+            PageView(page_type='home'),
+            PageView(page_type='home', timestamp=yesterday),
+            CarView(car=self.car, view_type='card_click'),
+        ])
+        self.buffer.flush()
+        self.buffer.add(PageView(page_type='home'))
+        self.buffer.flush()
+
+        today = timezone.localdate()
+        self.assertEqual(DailyPageViewCount.objects.get(date=today, page_type='home').count, 3)
+        self.assertEqual(
+            DailyPageViewCount.objects.get(date=today - timedelta(days=1), page_type='home').count, 1
+        )
+        self.assertEqual(DailyCarViewCount.objects.get(car=self.car, date=today).count, 1)
+
+    def test_upserts_lock_rows_in_key_order(self):
+        """Test rows are upserted in sorted key order whatever order the batch had."""
+        now = timezone.now()
+        events = [PageView(page_type='home', timestamp=now), PageView(page_type='contact', timestamp=now)]
+        with CaptureQueriesContext(connection) as queries:
+            rollups.record_events(PageView, events)
+        for table in [DailyPageViewCount._meta.db_table, HourlyPageViewCount._meta.db_table]:
+            sql = next(query['sql'] for query in queries if f'INSERT INTO {table} ' in query['sql'])
+            self.assertLess(sql.index("'contact'"), sql.index("'home'"))
+
+    def test_rebuild_command_matches_raw_events(self):
+        """Test rebuilding recomputes counts from the raw tables."""
+        PageView.objects.bulk_create([PageView(page_type='contact') for _ in range(4)])
+        CarView.objects.create(car=self.car)
+        call_command('rebuild_analytics_rollups', stdout=StringIO())
+        self.assertEqual(DailyPageViewCount.objects.get(page_type='contact').count, 4)
+        self.assertEqual(DailyCarViewCount.objects.get(car=self.car).count, 1)
+
+    def test_admin_stats_read_rollups(self):
+        """Test the admin changelist summary comes from the rollup tables."""
+        DailyPageViewCount.objects.create(date=timezone.localdate(), page_type='home', count=7)
+        DailyCarViewCount.objects.create(
+            date=timezone.localdate(), car=self.car, view_type='detail_view', count=5
+        )
+        # Eight days back is outside "the last 7 days"
+        DailyCarViewCount.objects.create(
+            date=timezone.localdate() - timedelta(days=7), car=self.car, view_type='detail_view', count=3
+        )
+        CarPopularity.objects.create(car=self.car, total_views=5)
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+
+        response = self.client.get('/secure-admin/analytics/pageview/')
+        self.assertEqual(response.context['stats']['today_views'], 7)
+        response = self.client.get('/secure-admin/analytics/carview/')
+        self.assertEqual(response.context['stats']['week_car_views'], 5)
+        self.assertEqual(response.context['stats']['most_viewed_cars'][0]['car_id'], self.car.id)
+
+
+class PartitionTest(TestCase):
+    """Test cases for monthly partitions of the raw event tables."""
+
+    def setUp(self):
+        self.current = partitions.month_start(timezone.localdate())
+
+    def partition_of(self, model, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT tableoid::regclass::text FROM {model._meta.db_table} WHERE id = %s', [pk]
+            )
+            return cursor.fetchone()[0]
+
+    def test_event_tables_are_partitioned(self):
+        """Test new events are routed to the current month's partition."""
+        self.assertTrue(partitions.is_partitioned(PageView))
+        self.assertTrue(partitions.is_partitioned(CarView))
+        page_view = PageView.objects.create(page_type='home')
+        self.assertEqual(
+            self.partition_of(PageView, page_view.id),
+            partitions.partition_name('analytics_pageview', self.current),
+        )
+
+    def test_create_partition_moves_rows_from_default(self):
+        """Test rows that landed in DEFAULT move to a partition created later."""
+        month = partitions.add_months(self.current, 24)
+        timestamp = timezone.make_aware(datetime(month.year, month.month, 15))
+        page_view = PageView.objects.create(page_type='home', timestamp=timestamp)
+        self.assertEqual(self.partition_of(PageView, page_view.id), 'analytics_pageview_default')
+
+        self.assertTrue(partitions.create_partition(PageView, month))
+        self.assertFalse(partitions.create_partition(PageView, month))
+        self.assertEqual(
+            self.partition_of(PageView, page_view.id),
+            partitions.partition_name('analytics_pageview', month),
+        )
+
+    def test_expired_partitions_dropped_rollups_kept(self):
+        """Test months past retention are dropped whole and rollups survive."""
+        old_month = partitions.add_months(self.current, -24)
+        partitions.create_partition(PageView, old_month)
+        old_time = timezone.make_aware(datetime(old_month.year, old_month.month, 2))
+        buffer = EventBuffer(flush_interval=None)
+        buffer.add(PageView(page_type='home', timestamp=old_time))
+        buffer.flush()
+
+        created, dropped = partitions.maintain_partitions(timezone.localdate(), 3, 13)
+        self.assertEqual(created, [])
+        self.assertEqual(dropped, [partitions.partition_name('analytics_pageview', old_month)])
+        self.assertNotIn(old_month, partitions.list_partitions(PageView))
+        self.assertEqual(PageView.objects.count(), 0)
+        self.assertEqual(DailyPageViewCount.objects.get().count, 1)
+
+    def test_rebuild_after_drop_keeps_pruned_rollups(self):
+        """Test a rebuild without dates starts at the oldest raw event and refuses pruned days."""
+        old_month = partitions.add_months(self.current, -24)
+        partitions.create_partition(PageView, old_month)
+        old_day = date(old_month.year, old_month.month, 2)
+        car = make_car()
+        buffer = EventBuffer(flush_interval=None)
+        buffer.extend([
+            PageView(page_type='home', timestamp=day_start(old_day), ip_address='10.0.0.1'),
+            PageView(page_type='home'),
+            CarView(car=car),
+        ])
+        buffer.flush()
+        partitions.maintain_partitions(timezone.localdate(), 3, 13)
+
+        call_command('rebuild_analytics_rollups', stdout=StringIO())
+        self.assertEqual(DailyPageViewCount.objects.get(date=old_day).count, 1)
+        self.assertEqual(DailyVisitorSketch.objects.filter(date=old_day).count(), 1)
+        self.assertEqual(DailyPageViewCount.objects.get(date=timezone.localdate()).count, 1)
+        self.assertEqual(DailyCarViewCount.objects.get(car=car).count, 1)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_analytics_rollups', '--start', old_day.isoformat(), stdout=StringIO())
+        self.assertEqual(DailyPageViewCount.objects.get(date=old_day).count, 1)
+
+    def test_command_creates_future_partitions(self):
+        """Test the maintenance command keeps months_ahead partitions created."""
+        month = partitions.add_months(self.current, 5)
+        out = StringIO()
+        call_command('manage_analytics_partitions', '--months-ahead', '5', '--dry-run', stdout=out)
+        self.assertIn(partitions.partition_name('analytics_pageview', month), out.getvalue())
+        self.assertNotIn(month, partitions.list_partitions(PageView))
+
+        call_command('manage_analytics_partitions', '--months-ahead', '5', stdout=StringIO())
+        self.assertIn(month, partitions.list_partitions(PageView))
+        self.assertIn(month, partitions.list_partitions(CarView))
+
+
+class TimeRangeQueryTest(TestCase):
+    """Test analytics queries filter on half-open timestamp ranges."""
+
+    def setUp(self):
+        self.car = make_car()
+        self.today = timezone.localdate()
+
+    def test_day_bounds_are_half_open(self):
+        """Test the last instant of a day is included and the next midnight is not."""
+        start, end = day_bounds(self.today)
+        PageView.objects.create(page_type='home', timestamp=start)
+        PageView.objects.create(page_type='home', timestamp=end - timedelta(microseconds=1))
+        PageView.objects.create(page_type='home', timestamp=end)
+        self.assertEqual(filter_days(PageView.objects.all(), self.today, self.today).count(), 2)
+        self.assertEqual(filter_days(PageView.objects.all(), start_date=self.today).count(), 3)
+
+    def test_day_range_prunes_partitions(self):
+        """Test a day range scans only that month's partition, unlike a date cast."""
+        current = partitions.partition_name('analytics_pageview', partitions.month_start(self.today))
+        plan = filter_days(PageView.objects.all(), self.today, self.today).explain()
+        self.assertIn(current, plan)
+        self.assertNotIn('analytics_pageview_default', plan)
+        self.assertNotIn('::date', plan)
+
+        cast_plan = PageView.objects.filter(timestamp__date=self.today).explain()
+        self.assertIn('analytics_pageview_default', cast_plan)
+
+    def test_per_car_range_uses_composite_index(self):
+        """Test per-car time-range stats are served by the (car_id, timestamp) index."""
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        queryset = filter_days(CarView.objects.filter(car=self.car), self.today, self.today)
+        self.assertIn('car_id_timestamp_idx', queryset.explain())
+
+    def test_rebuild_respects_range_edges(self):
+        """Test rebuilding one day ignores events just outside it."""
+        start, end = day_bounds(self.today)
+        PageView.objects.create(page_type='home', timestamp=start - timedelta(microseconds=1))
+        PageView.objects.create(page_type='home', timestamp=start)
+        call_command(
+            'rebuild_analytics_rollups', '--start', str(self.today), '--end', str(self.today),
+            stdout=StringIO()
+        )
+        self.assertEqual(DailyPageViewCount.objects.get(date=self.today).count, 1)
+        self.assertFalse(DailyPageViewCount.objects.filter(date=self.today - timedelta(days=1)).exists())
+
+    def test_car_view_changelist_query_count_is_constant(self):
+        """Test the car view changelist doesn't issue a query per row."""
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        CarView.objects.create(car=self.car)
+        with CaptureQueriesContext(connection) as one_row:
+            self.client.get('/secure-admin/analytics/carview/')
+        CarView.objects.bulk_create([CarView(car=make_car()) for _ in range(5)])
+        with CaptureQueriesContext(connection) as six_rows:
+            self.client.get('/secure-admin/analytics/carview/')
+        self.assertEqual(len(six_rows), len(one_row))
+
+
+@tag('benchmark')
+class TimeRangeQueryPlanBenchmarkTest(TestCase):
+    """
+    Check query plans against a multi-million-row event table.
+
+    Seeding takes a while, so it only runs with: python manage.py test --tag=benchmark
+    """
+
+    PAGE_VIEWS = 2000000
+    CAR_VIEWS = 1000000
+    CARS = 50
+    DAYS = 60
+
+    @classmethod
+    def setUpTestData(cls):
+        cars = [make_car() for _ in range(cls.CARS)]
+        cls.car = cars[0]
+        first_id = cars[0].id
+        since = day_start(timezone.localdate() - timedelta(days=cls.DAYS))
+        span = timedelta(days=cls.DAYS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO analytics_pageview (page_type, timestamp) '
+                "SELECT 'home', %s + g * %s / %s FROM generate_series(1, %s) g",
+                [since, span, cls.PAGE_VIEWS, cls.PAGE_VIEWS],
+            )
+            cursor.execute(
+                'INSERT INTO analytics_carview (car_id, timestamp, view_type) '
+                "SELECT %s + g %% %s, %s + g * %s / %s, 'card_click' "
+                'FROM generate_series(1, %s) g',
+                [first_id, cls.CARS, since, span, cls.CAR_VIEWS, cls.CAR_VIEWS],
+            )
+            cursor.execute('ANALYZE analytics_pageview')
+            cursor.execute('ANALYZE analytics_carview')
+
+    def test_day_range_uses_brin_index(self):
+        """Test counting one day reads the BRIN index instead of scanning the table."""
+        yesterday = timezone.localdate() - timedelta(days=1)
+        plan = filter_days(PageView.objects.all(), yesterday, yesterday).explain()
+        self.assertIn('timestamp_idx', plan)
+        self.assertNotIn('Seq Scan', plan)
+
+    def test_per_car_range_uses_index(self):
+        """Test a per-car week of views is read through an index, not a scan."""
+        yesterday = timezone.localdate() - timedelta(days=1)
+        queryset = CarView.objects.filter(car=self.car)
+        plan = filter_days(queryset, yesterday - timedelta(days=6), yesterday).explain()
+        self.assertIn('car_id_timestamp_idx', plan)
+        self.assertNotIn('Seq Scan', plan)
+
+
+CHROME_UA = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+)
+IPHONE_UA = (
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 '
+    '(KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1'
+)
+
+
+class UserAgentInternTest(TestCase):
+    """Test cases for interned, pre-parsed user agents."""
+
+    def page_view(self, user_agent):
+        page_view = PageView(page_type='home')
+        page_view.raw_user_agent = user_agent
+        return page_view
+
+    def test_parse_user_agent(self):
+        """Test browser, OS and device class are extracted from common agents."""
+        self.assertEqual(parse_user_agent(CHROME_UA), {
+            'browser': 'Chrome', 'browser_version': '120', 'os': 'Windows', 'device_type': 'desktop'
+        })
+        self.assertEqual(parse_user_agent(IPHONE_UA), {
+            'browser': 'Safari', 'browser_version': '17', 'os': 'iOS', 'device_type': 'mobile'
+        })
+        self.assertEqual(parse_user_agent('Googlebot/2.1 (+http://www.google.com/bot.html)')['device_type'], 'bot')
+
+    def test_repeated_agents_share_one_row(self):
+        """Test events with the same agent reference a single UserAgent row."""
+        buffer = EventBuffer(flush_interval=None)
+        buffer.extend([self.page_view(CHROME_UA), self.page_view(CHROME_UA), self.page_view(IPHONE_UA),
+                       self.page_view('')])
+        buffer.flush()
+        self.assertEqual(UserAgent.objects.count(), 2)
+        chrome = UserAgent.objects.get(browser='Chrome')
+        self.assertEqual(PageView.objects.filter(user_agent=chrome).count(), 2)
+        self.assertEqual(PageView.objects.filter(user_agent__isnull=True).count(), 1)
+
+    def test_cached_agents_need_no_query(self):
+        """Test a known agent is resolved from the LRU without touching the database."""
+        cache = UserAgentCache(max_size=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            resolve_user_agents([self.page_view(CHROME_UA)], cache=cache)
+
+        event = self.page_view(CHROME_UA)
+        with self.assertNumQueries(0):
+            resolve_user_agents([event], cache=cache)
+        self.assertEqual(event.user_agent_id, UserAgent.objects.get().id)
+        self.assertEqual(cache.snapshot()['hits'], 1)
+
+    def test_cache_not_filled_until_commit(self):
+        """Test ids from a transaction that rolls back never enter the cache."""
+        cache = UserAgentCache(max_size=10)
+        resolve_user_agents([self.page_view(CHROME_UA)], cache=cache)
+        self.assertEqual(cache.snapshot()['size'], 0)
+
+    def test_lru_evicts_least_recently_used(self):
+        """Test the cache stays bounded and keeps recently used agents."""
+        cache = UserAgentCache(max_size=2)
+        cache.update({'a': 1, 'b': 2})
+        cache.get('a')
+        cache.update({'c': 3})
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.snapshot()['size'], 2)
+
+
+class HyperLogLogTest(SimpleTestCase):
+    """Test the documented error bounds of the HyperLogLog sketches."""
+
+    def assertWithinBounds(self, estimate, actual):
+        # 3 standard errors covers 99.7% of estimates
+        self.assertLessEqual(abs(estimate - actual), 3 * hll.STANDARD_ERROR * actual + 1)
+
+    def test_small_counts_are_near_exact(self):
+        """Test linear counting keeps small cardinalities close to exact."""
+        for actual in (1, 10, 100):
+            self.assertLessEqual(abs(hll.estimate(hll.build(str(i) for i in range(actual))) - actual), 1)
+
+    def test_large_counts_within_error_bound(self):
+        """Test estimates stay within three standard errors."""
+        for actual in (1000, 20000, 100000):
+            self.assertWithinBounds(hll.estimate(hll.build(f'visitor-{i}' for i in range(actual))), actual)
+
+    def test_duplicates_are_not_counted(self):
+        """Test adding the same items again leaves the sketch unchanged."""
+        sketch = hll.build(str(i) for i in range(500))
+        self.assertEqual(hll.merge(sketch, hll.build(str(i) for i in range(500))), sketch)
+
+    def test_merge_estimates_union(self):
+        """Test merging overlapping sketches counts the union once."""
+        first = hll.build(str(i) for i in range(0, 6000))
+        second = hll.build(str(i) for i in range(4000, 10000))
+        self.assertWithinBounds(hll.estimate(hll.merge(first, second)), 10000)
+        self.assertEqual(len(hll.empty()), hll.REGISTERS)
+
+
+class UniqueVisitorsTest(APITestCase):
+    """Test cases for unique visitor sketches maintained at ingest."""
+
+    url = '/api/analytics/reports/unique-visitors/'
+
+    def setUp(self):
+        self.car = make_car()
+        self.buffer = EventBuffer(max_events=1000, flush_size=1000, flush_interval=None)
+        self.today = timezone.localdate()
+
+    def page_view(self, ip, user_agent='Mozilla/5.0', **kwargs):
+        page_view = PageView(page_type='home', ip_address=ip, **kwargs)
+        page_view.raw_user_agent = user_agent
+        return page_view
+
+    def test_flushes_merge_into_daily_sketch(self):
+        """Test repeat visitors across flushes are counted once."""
+        self.buffer.extend([self.page_view(f'10.0.0.{i}') for i in range(1, 51)])
+        self.buffer.flush()
+        self.buffer.extend([self.page_view(f'10.0.0.{i}') for i in range(26, 76)])
+        self.buffer.flush()
+
+        self.assertEqual(DailyVisitorSketch.objects.count(), 1)
+        total, daily = visitors.unique_visitors(self.today, self.today)
+        self.assertLessEqual(abs(total - 75), 1)
+        self.assertEqual(list(daily), [self.today])
+
+    def test_same_ip_different_agents_are_distinct(self):
+        """Test a visitor is an IP and user agent pair."""
+        self.buffer.extend([self.page_view('10.0.0.1', 'A'), self.page_view('10.0.0.1', 'B')])
+        self.buffer.flush()
+        self.assertEqual(visitors.unique_visitors(self.today, self.today)[0], 2)
+
+    def test_rebuild_matches_ingest(self):
+        """Test sketches rebuilt from raw rows equal those built at ingest."""
+        yesterday = timezone.now() - timedelta(days=1)
+        self.buffer.extend([self.page_view(f'10.0.1.{i}', timestamp=yesterday) for i in range(20)])
+        car_view = CarView(car=self.car, ip_address='10.0.2.1')
+        car_view.raw_user_agent = 'Mozilla/5.0'
+        self.buffer.add(car_view)
+        self.buffer.flush()
+        before = {row.date: bytes(row.registers) for row in DailyVisitorSketch.objects.all()}
+        car_before = bytes(DailyCarVisitorSketch.objects.get().registers)
+
+        call_command('rebuild_analytics_rollups', stdout=StringIO())
+        after = {row.date: bytes(row.registers) for row in DailyVisitorSketch.objects.all()}
+        self.assertEqual(after, before)
+        self.assertEqual(bytes(DailyCarVisitorSketch.objects.get().registers), car_before)
+
+    def test_report_requires_staff(self):
+        """Test the reporting API is not public."""
+        response = self.client.get(self.url)
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_report_merges_range_and_filters_by_car(self):
+        """Test the report merges days in the range and supports per-car counts."""
+        self.buffer.extend([
+            self.page_view('10.0.0.1', timestamp=timezone.now() - timedelta(days=2)),
+            self.page_view('10.0.0.1'),
+            self.page_view('10.0.0.2'),
+        ])
+        car_view = CarView(car=self.car, ip_address='10.0.0.1')
+        car_view.raw_user_agent = 'Mozilla/5.0'
+        self.buffer.add(car_view)
+        self.buffer.flush()
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unique_visitors'], 2)
+        self.assertEqual(len(response.data['daily']), 2)
+        self.assertAlmostEqual(response.data['standard_error'], 0.0163, places=4)
+
+        response = self.client.get(self.url, {'car': self.car.id, 'start': str(self.today)})
+        self.assertEqual(response.data['unique_visitors'], 1)
+
+    def test_report_rejects_bad_range(self):
+        """Test malformed and reversed date ranges are rejected."""
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        self.assertEqual(self.client.get(self.url, {'start': 'yesterday'}).status_code, 400)
+        response = self.client.get(self.url, {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_shows_unique_visitors(self):
+        """Test the page view changelist reports approximate unique visitors."""
+        self.buffer.extend([self.page_view('10.0.0.1'), self.page_view('10.0.0.2')])
+        self.buffer.flush()
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        response = self.client.get('/secure-admin/analytics/pageview/')
+        self.assertEqual(response.context['stats']['today_unique_visitors'], 2)
+        self.assertContains(response, 'Unique visitors today')
+
+
+class CarPopularityTest(TestCase):
+    """Test cases for the maintained per-car popularity counters."""
+
+    def setUp(self):
+        self.car = make_car()
+        self.other = make_car(model='Corolla')
+        self.buffer = EventBuffer(max_events=100, flush_size=100, flush_interval=None)
+
+    def test_flush_increments_counters_in_one_statement(self):
+        """Test each flush adds its car views to both counters."""
+        self.buffer.extend([CarView(car=self.car), CarView(car=self.car), CarView(car=self.other)])
+        self.buffer.flush()
+        self.buffer.add(CarView(car=self.car))
+        self.buffer.flush()
+
+        counter = CarPopularity.objects.get(car=self.car)
+        self.assertEqual((counter.total_views, counter.recent_views), (3, 3))
+        self.assertEqual(CarPopularity.objects.get(car=self.other).recent_views, 1)
+
+    def test_refresh_drops_views_outside_window(self):
+        """Test the daily refresh re-bases the recent count on the rollups."""
+        today = timezone.localdate()
+        old = today - timedelta(days=popularity.window_days())
+        self.buffer.extend([CarView(car=self.car), CarView(car=self.car)])
+        self.buffer.flush()
+        DailyCarViewCount.objects.filter(car=self.car).update(date=old)
+
+        call_command('refresh_car_popularity', stdout=StringIO())
+        counter = CarPopularity.objects.get(car=self.car)
+        self.assertEqual((counter.total_views, counter.recent_views), (2, 0))
+
+    def test_backfilled_views_skip_recent_count(self):
+        """Test views dated before the recent window only add to the total."""
+        old = timezone.localdate() - timedelta(days=popularity.window_days())
+        self.buffer.extend([CarView(car=self.car, timestamp=day_start(old)), CarView(car=self.car)])
+        self.buffer.flush()
+        counter = CarPopularity.objects.get(car=self.car)
+        self.assertEqual((counter.total_views, counter.recent_views), (2, 1))
+
+
+class EventScreeningTest(APITestCase):
+    """Test cases for bot and duplicate-view filtering at ingest."""
+
+    def setUp(self):
+        settings_override = override_settings(
+            ANALYTICS_BUFFER={'MAX_EVENTS': 100, 'FLUSH_SIZE': 100, 'FLUSH_INTERVAL': None},
+            ANALYTICS_SCREENING=SCREENING,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.car = make_car()
+        self.buffer = get_event_buffer()
+        self.screen = get_event_screen()
+
+    def test_bot_views_are_ignored(self):
+        """Test crawler traffic is acknowledged but never buffered."""
+        response = self.client.post(
+            '/api/analytics/track/car/', {'car': self.car.id},
+            HTTP_USER_AGENT='Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'ignored')
+        self.client.post('/api/analytics/track/page/', {'page_type': 'home'}, HTTP_USER_AGENT='curl/8.4.0')
+        self.assertEqual(self.buffer.snapshot()['pending'], 0)
+        self.assertEqual(self.screen.snapshot()['bots'], 2)
+
+    def test_repeat_car_view_suppressed(self):
+        """Test the same client viewing the same car again within the window counts once."""
+        for _ in range(3):
+            self.client.post('/api/analytics/track/car/', {'car': self.car.id}, HTTP_USER_AGENT=CHROME_UA)
+        other = make_car(model='Corolla')
+        self.client.post('/api/analytics/track/car/', {'car': other.id}, HTTP_USER_AGENT=CHROME_UA)
+        self.client.post(
+            '/api/analytics/track/car/', {'car': self.car.id},
+            HTTP_USER_AGENT=CHROME_UA, REMOTE_ADDR='10.0.0.9'
+        )
+        self.assertEqual(self.buffer.snapshot()['pending'], 3)
+        self.assertEqual(self.screen.snapshot()['duplicates'], 2)
+
+    def test_batch_screening(self):
+        """Test the batch endpoint ignores bots and repeats within the batch."""
+        events = [{'type': 'car', 'car': self.car.id}] * 2 + [{'type': 'page', 'page_type': 'home'}] * 2
+        response = self.client.post('/api/analytics/track/batch/', {'events': events}, format='json',
+                                    HTTP_USER_AGENT=CHROME_UA)
+        self.assertEqual((response.data['accepted'], response.data['ignored']), (3, 1))
+
+        response = self.client.post('/api/analytics/track/batch/', {'events': events}, format='json',
+                                    HTTP_USER_AGENT='python-requests/2.31')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual((response.data['accepted'], response.data['ignored']), (0, 4))
+        self.assertEqual(self.screen.snapshot()['bots'], 4)
+
+    def test_recent_views_window_and_bound(self):
+        """Test repeats are counted again after the window and memory stays bounded."""
+        recent = RecentViews(window=30, max_entries=2)
+        self.assertFalse(recent.seen_recently('a', now=0))
+        self.assertTrue(recent.seen_recently('a', now=29))
+        self.assertFalse(recent.seen_recently('a', now=30))
+        recent.seen_recently('b', now=31)
+        recent.seen_recently('c', now=32)
+        self.assertEqual(len(recent), 2)
+        self.assertFalse(recent.seen_recently('a', now=33))
+
+
+class TimeSeriesAPITest(APITestCase):
+    """Test cases for the downsampled time-series reporting API."""
+
+    url = '/api/analytics/reports/timeseries/'
+
+    def setUp(self):
+        self.car = make_car()
+        self.today = timezone.localdate()
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+
+    def test_flush_maintains_hourly_rollups(self):
+        """Test buffered events are counted into hourly buckets."""
+        start = day_start(self.today)
+        buffer = EventBuffer(flush_interval=None)
+        buffer.extend([
+            PageView(page_type='home', timestamp=start + timedelta(minutes=5)),
+            PageView(page_type='home', timestamp=start + timedelta(minutes=55)),
+            PageView(page_type='home', timestamp=start + timedelta(hours=1)),
+            CarView(car=self.car, view_type='card_click', timestamp=start),
+        ])
+        buffer.flush()
+        self.assertEqual(HourlyPageViewCount.objects.get(hour=start).count, 2)
+        self.assertEqual(HourlyCarViewCount.objects.get(hour=start).count, 1)
+
+        response = self.client.get(self.url, {'resolution': 'hour', 'start': str(self.today)})
+        counts = [point['count'] for point in response.data['points']]
+        self.assertEqual(len(counts), 24)
+        self.assertEqual(counts[:3], [2, 1, 0])
+
+    def test_daily_series_is_zero_filled(self):
+        """Test every day in the range is present, including days without views."""
+        DailyPageViewCount.objects.create(date=self.today, page_type='home', count=4)
+        DailyPageViewCount.objects.create(date=self.today, page_type='contact', count=1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([point['count'] for point in response.data['points']], [0] * 6 + [5])
+
+        response = self.client.get(self.url, {'page_type': 'contact'})
+        self.assertEqual(response.data['points'][-1]['count'], 1)
+
+    def test_long_range_is_downsampled(self):
+        """Test a year at hourly resolution falls back to a bounded daily series."""
+        start = self.today - timedelta(days=364)
+        with self.assertNumQueries(1):
+            resolution = timeseries.choose_resolution(start, self.today, 'hour')
+            points = timeseries.view_series('page_views', start, self.today, resolution)
+        self.assertEqual(resolution, 'day')
+        self.assertEqual(len(points), 365)
+
+        response = self.client.get(self.url, {'resolution': 'day', 'start': str(self.today - timedelta(days=2000))})
+        self.assertEqual(response.data['resolution'], 'week')
+        self.assertLessEqual(len(response.data['points']), timeseries.MAX_POINTS)
+
+    def test_weekly_series_sums_days(self):
+        """Test weekly buckets add up the daily counts of their week."""
+        monday = timeseries.week_start(self.today)
+        DailyCarViewCount.objects.create(date=monday, car=self.car, view_type='card_click', count=2)
+        DailyCarViewCount.objects.create(
+            date=monday + timedelta(days=1), car=self.car, view_type='detail_view', count=3
+        )
+        response = self.client.get(self.url, {
+            'metric': 'car_views', 'resolution': 'week', 'car': self.car.id,
+            'start': str(monday - timedelta(days=7)),
+        })
+        self.assertEqual(response.data['points'], [
+            {'t': monday - timedelta(days=7), 'count': 0},
+            {'t': monday, 'count': 5},
+        ])
+
+    def test_per_car_series_not_hourly(self):
+        """Test per-car series use daily buckets since hourly counts are site-wide."""
+        response = self.client.get(self.url, {'metric': 'car_views', 'resolution': 'hour', 'car': self.car.id})
+        self.assertEqual(response.data['resolution'], 'day')
+
+    def test_invalid_parameters_rejected(self):
+        """Test unknown metrics, resolutions and reversed ranges are rejected."""
+        self.assertEqual(self.client.get(self.url, {'metric': 'clicks'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'resolution': 'minute'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'car': self.car.id}).status_code, 400)
+        self.assertEqual(
+            self.client.get(self.url, {'start': '2025-02-01', 'end': '2025-01-01'}).status_code, 400
+        )
+        self.client.logout()
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+
+
+def log_line(path, ip='203.0.113.7', when='19/Oct/2026:13:45:01 +0000', status_code=200, user_agent=CHROME_UA):
+    """Build an nginx combined-format access log line."""
+    return (
+        f'{ip} - - [{when}] "GET {path} HTTP/1.1" {status_code} 1532 '
+        f'"https://example.com/cars" "{user_agent}"\n'
+    )
+
+
+class AccessLogIngestTest(TestCase):
+    """Test cases for loading car views from nginx access logs."""
+
+    def setUp(self):
+        self.car = make_car()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.path = os.path.join(self.directory, 'access.log')
+
+    def write(self, lines, mode='a'):
+        with open(self.path, mode) as f:
+            f.write(''.join(lines))
+
+    def ingest(self):
+        call_command('ingest_access_log', self.path, stdout=StringIO())
+
+    def test_parse_car_view(self):
+        """Test only successful car detail GETs are parsed, with their time zone."""
+        car_id, ip, timestamp, user_agent = parse_car_view(
+            log_line('/api/cars/12/?ref=home', when='19/Oct/2026:15:45:01 +0200').encode()
+        )
+        self.assertEqual((car_id, ip, user_agent), (12, '203.0.113.7', CHROME_UA))
+        self.assertEqual(timestamp, datetime(2026, 10, 19, 13, 45, 1, tzinfo=dt_timezone.utc))
+        self.assertIsNone(parse_car_view(log_line('/api/cars/').encode()))
+        self.assertIsNone(parse_car_view(log_line('/api/cars/12/', status_code=404).encode()))
+        self.assertIsNone(parse_car_view(log_line('/api/cars/popular/').encode()))
+
+    def test_ingest_screens_and_checkpoints(self):
+        """Test views are loaded once, with bots, repeats and unknown cars skipped."""
+        car_path = f'/api/cars/{self.car.id}/'
+        self.write([
+            log_line(car_path),
+            log_line(car_path, when='19/Oct/2026:13:45:10 +0000'),
+            log_line(car_path, ip='198.51.100.1', user_agent='Googlebot/2.1'),
+            log_line('/api/cars/99999/', ip='198.51.100.2'),
+            log_line('/static/js/main.js'),
+        ])
+        self.ingest()
+        car_view = CarView.objects.get()
+        self.assertEqual(car_view.view_type, 'detail_view')
+        self.assertEqual(car_view.user_agent.browser, 'Chrome')
+        self.assertEqual(DailyCarViewCount.objects.get().count, 1)
+
+        self.ingest()
+        self.assertEqual(CarView.objects.count(), 1)
+        self.assertEqual(AccessLogCheckpoint.objects.get().offset, os.path.getsize(self.path))
+
+    def test_partial_line_waits_for_completion(self):
+        """Test a line still being written is picked up once it is complete."""
+        line = log_line(f'/api/cars/{self.car.id}/')
+        self.write([line[:40]])
+        self.ingest()
+        self.assertEqual(CarView.objects.count(), 0)
+        self.write([line[40:]])
+        self.ingest()
+        self.assertEqual(CarView.objects.count(), 1)
+
+    def test_rotated_file_read_from_start(self):
+        """Test a new file at the same path is read from the beginning."""
+        self.write([log_line('/static/app.css')] * 20)
+        self.ingest()
+        os.rename(self.path, self.path + '.1')
+        self.write([log_line(f'/api/cars/{self.car.id}/')], mode='w')
+        self.ingest()
+        self.assertEqual(CarView.objects.count(), 1)
+
+    def test_follow_restarts_after_truncation(self):
+        """Test --follow reads a file truncated in place (copytruncate) from the start."""
+        self.write([log_line('/static/app.css')] * 20)
+        polls = []
+
+        def poll(seconds):
+            polls.append(seconds)
+            if len(polls) == 1:
+                self.write([log_line(f'/api/cars/{self.car.id}/')], mode='w')
+            else:
+                raise KeyboardInterrupt
+
+        with mock.patch('time.sleep', side_effect=poll), self.assertRaises(KeyboardInterrupt):
+            call_command('ingest_access_log', self.path, follow=True, stdout=StringIO())
+        self.assertEqual(CarView.objects.count(), 1)
+        self.assertEqual(AccessLogCheckpoint.objects.get().offset, os.path.getsize(self.path))
+
+
+@tag('benchmark')
+class AccessLogThroughputTest(TestCase):
+    """Check parsing keeps well above a million lines per minute on one core."""
+
+    def test_parse_throughput(self):
+        lines = [log_line('/static/js/main.js').encode()] * 9 + [log_line('/api/cars/1/').encode()]
+        lines *= 30000
+        started = time.perf_counter()
+        for line in lines:
+            parse_car_view(line)
+        per_minute = len(lines) / (time.perf_counter() - started) * 60
+        self.assertGreater(per_minute, 5000000)
+
+
+class ArchiveExportTest(TestCase):
+    """Test cases for exporting raw events to the file archive."""
+
+    def setUp(self):
+        self.car = make_car()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+        timestamp = day_start(self.yesterday) + timedelta(hours=10)
+        events = []
+        for i in range(1, 6):
+            page_view = PageView(page_type='home', ip_address=f'10.0.0.{i}', timestamp=timestamp)
+            page_view.raw_user_agent = CHROME_UA
+            events.append(page_view)
+        car_view = CarView(car=self.car, ip_address='10.0.0.1', timestamp=timestamp)
+        car_view.raw_user_agent = CHROME_UA
+        buffer = EventBuffer(max_events=100, flush_size=100, flush_interval=None)
+        buffer.extend(events + [car_view])
+        buffer.flush()
+        PageView.objects.create(page_type='home')
+
+    def export(self, *args):
+        call_command(
+            'export_analytics_archive', '--output-dir', self.directory, *args, stdout=StringIO()
+        )
+
+    def assert_archive_restores_rollups(self):
+        DailyPageViewCount.objects.all().delete()
+        DailyCarViewCount.objects.all().delete()
+        DailyVisitorSketch.objects.all().delete()
+        call_command(
+            'rebuild_analytics_rollups', '--from-archive', self.directory,
+            '--start', self.yesterday.isoformat(), '--end', self.yesterday.isoformat(),
+            stdout=StringIO(),
+        )
+        self.assertEqual(DailyPageViewCount.objects.get(date=self.yesterday).count, 5)
+        self.assertEqual(DailyCarViewCount.objects.get(date=self.yesterday, car=self.car).count, 1)
+        self.assertEqual(visitors.unique_visitors(self.yesterday, self.yesterday)[0], 5)
+
+    def test_export_delete_and_rebuild_from_csv(self):
+        """Test a closed day is archived, removed and recoverable from the archive."""
+        self.export('--format', 'csv', '--delete')
+        self.assertEqual(PageView.objects.count(), 1)
+        self.assertEqual(CarView.objects.count(), 0)
+
+        rows = list(archive.read_events(
+            self.directory, CarView, ['car_id', 'timestamp', 'ip_address', 'user_agent']
+        ))
+        self.assertEqual(
+            rows, [(self.car.id, day_start(self.yesterday) + timedelta(hours=10), '10.0.0.1', CHROME_UA)]
+        )
+        self.assert_archive_restores_rollups()
+
+    @unittest.skipUnless(archive.pyarrow, 'pyarrow is not installed')
+    def test_export_parquet(self):
+        """Test Parquet archives read back the same events."""
+        self.export('--format', 'parquet', '--chunk-size', '2')
+        (day, path), = archive.archived_days(self.directory, PageView)
+        self.assertEqual(day, self.yesterday)
+        self.assertTrue(path.endswith('date=%s/events.parquet' % self.yesterday.isoformat()))
+        self.assertEqual(archive.pyarrow.parquet.ParquetFile(path).num_row_groups, 3)
+        self.assert_archive_restores_rollups()
+
+    def test_rebuild_from_archive_keeps_days_not_archived(self):
+        """Test an archive rebuild without dates only replaces the days it holds."""
+        self.export('--format', 'csv', '--delete')
+        today = timezone.localdate()
+        unarchived = self.yesterday - timedelta(days=3)
+        DailyPageViewCount.objects.create(date=unarchived, page_type='home', count=4)
+        HourlyPageViewCount.objects.create(hour=day_start(unarchived), page_type='home', count=4)
+        DailyVisitorSketch.objects.create(date=unarchived, registers=hll.empty())
+        DailyPageViewCount.objects.create(date=today, page_type='home', count=1)
+        DailyCarViewCount.objects.create(date=today, car=self.car, view_type='detail_view', count=2)
+
+        call_command('rebuild_analytics_rollups', '--from-archive', self.directory, stdout=StringIO())
+        self.assertEqual(DailyPageViewCount.objects.get(date=today).count, 1)
+        self.assertEqual(DailyPageViewCount.objects.get(date=unarchived).count, 4)
+        self.assertEqual(HourlyPageViewCount.objects.get(hour=day_start(unarchived)).count, 4)
+        self.assertTrue(DailyVisitorSketch.objects.filter(date=unarchived).exists())
+        self.assertEqual(DailyCarViewCount.objects.get(date=today).count, 2)
+        self.assertEqual(DailyPageViewCount.objects.get(date=self.yesterday).count, 5)
+        self.assertEqual(DailyCarViewCount.objects.get(date=self.yesterday).count, 1)
+
+    def test_overwrite_merges_late_rows_into_deleted_day(self):
+        """Test re-exporting a day whose rows were deleted keeps the archived rows."""
+        self.export('--format', 'csv', '--delete')
+        PageView.objects.create(page_type='contact', timestamp=day_start(self.yesterday))
+        self.export('--format', 'csv', '--delete', '--overwrite')
+        page_types = [row[0] for row in archive.read_events(self.directory, PageView, ['page_type'])]
+        self.assertEqual(sorted(page_types), ['contact'] + ['home'] * 5)
+        self.assertEqual(PageView.objects.filter(timestamp__lt=day_start(timezone.localdate())).count(), 0)
+        self.assertEqual(len(list(archive.read_events(self.directory, CarView, ['id']))), 1)
+
+    def test_delete_only_removes_archived_ids(self):
+        """Test a row committed after the export is kept even with a lower id."""
+        self.export('--format', 'csv')
+        lowest = PageView.objects.order_by('id').first().id
+        late = PageView.objects.create(id=lowest - 1, page_type='contact', timestamp=day_start(self.yesterday))
+        self.assertEqual(archive.delete_day(self.directory, PageView, self.yesterday), 5)
+        self.assertEqual(list(PageView.objects.filter(timestamp__lt=day_start(timezone.localdate()))), [late])
+
+    def test_only_closed_unarchived_days_are_exported(self):
+        """Test today is refused and archived days are not exported again."""
+        with self.assertRaises(CommandError):
+            self.export('--end', timezone.localdate().isoformat())
+        self.export('--format', 'csv')
+        PageView.objects.create(page_type='contact', timestamp=day_start(self.yesterday))
+        self.export('--format', 'csv', '--delete')
+        ips = [row[0] for row in archive.read_events(self.directory, PageView, ['ip_address'])]
+        self.assertEqual(len(ips), 5)
+        self.assertEqual(PageView.objects.filter(timestamp__lt=day_start(timezone.localdate())).count(), 6)
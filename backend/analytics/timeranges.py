@@ -0,0 +1,35 @@
+"""
+Half-open timestamp ranges for analytics queries.
+
+Filtering with timestamp__date wraps the column in a cast, which no index
+can serve and which prevents partition pruning. These helpers turn local
+calendar days into [start, end) bounds on the raw timestamp column instead.
+"""
+
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+def day_start(day):
+    """Aware datetime for local midnight at the start of day."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_bounds(start_date, end_date=None):
+    """
+    Return (start, end) datetimes covering the local days start_date..end_date.
+
+    end_date is inclusive and defaults to start_date; the returned end is
+    exclusive (midnight after end_date).
+    """
+    end_date = end_date or start_date
+    return day_start(start_date), day_start(end_date + timedelta(days=1))
+
+
+def filter_days(queryset, start_date=None, end_date=None, field='timestamp'):
+    """Restrict queryset to local days start_date..end_date (either may be None)."""
+    if start_date:
+        queryset = queryset.filter(**{f'{field}__gte': day_start(start_date)})
+    if end_date:
+        queryset = queryset.filter(**{f'{field}__lt': day_start(end_date + timedelta(days=1))})
+    return queryset
@@ -0,0 +1,94 @@
+"""
+View-count time series from the rollup tables.
+
+Hourly points come from the hourly rollups; daily and weekly points from
+the daily rollups, with weeks summed in the database. If the requested
+resolution would produce more than MAX_POINTS buckets it is coarsened
+(hour -> day -> week), so the rows read per request stay bounded however
+long the range is. Missing buckets are returned as zero.
+"""
+
+from datetime import timedelta
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+from .models import (
+    DailyPageViewCount, DailyCarViewCount, HourlyPageViewCount, HourlyCarViewCount,
+)
+from .timeranges import day_bounds
+
+RESOLUTIONS = ['hour', 'day', 'week']
+MAX_POINTS = 400
+
+
+def week_start(day):
+    """Monday of the week containing day."""
+    return day - timedelta(days=day.weekday())
+
+
+def bucket_count(start_date, end_date, resolution):
+    days = (end_date - start_date).days + 1
+    if resolution == 'hour':
+        return days * 24
+    if resolution == 'day':
+        return days
+    return (week_start(end_date) - week_start(start_date)).days // 7 + 1
+
+
+def choose_resolution(start_date, end_date, requested, hourly=True):
+    """
+    Return the finest resolution at or above requested that fits MAX_POINTS.
+    
+    Returns None if even weekly buckets are too many.
+    """
+    for resolution in RESOLUTIONS[RESOLUTIONS.index(requested):]:
+        if resolution == 'hour' and not hourly:
+            continue
+        if bucket_count(start_date, end_date, resolution) <= MAX_POINTS:
+            return resolution
+    return None
+
+
+def _buckets(start_date, end_date, resolution):
+    if resolution == 'hour':
+        start, end = day_bounds(start_date, end_date)
+        return [start + timedelta(hours=i) for i in range(int((end - start).total_seconds() // 3600))]
+    if resolution == 'day':
+        return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    first = week_start(start_date)
+    return [first + timedelta(weeks=i) for i in range(bucket_count(start_date, end_date, 'week'))]
+
+
+def view_series(metric, start_date, end_date, resolution, car=None, **filters):
+    """
+    Return [(bucket, count)] for page_views or car_views over the date range.
+    
+    filters narrow by page_type or view_type. car (car views only) is only
+    available at day or week resolution, as hourly counts are site-wide.
+    Weekly buckets cover whole weeks, including days outside the range.
+    """
+    if resolution == 'hour':
+        model = HourlyPageViewCount if metric == 'page_views' else HourlyCarViewCount
+        start, end = day_bounds(start_date, end_date)
+        rows = model.objects.filter(hour__gte=start, hour__lt=end, **filters)
+        key = 'hour'
+    else:
+        model = DailyPageViewCount if metric == 'page_views' else DailyCarViewCount
+        if car is not None:
+            filters['car'] = car
+        if resolution == 'week':
+            # Widen to whole weeks so the first and last buckets aren't partial
+            start_date, end_date = week_start(start_date), week_start(end_date) + timedelta(days=6)
+        rows = model.objects.filter(date__gte=start_date, date__lte=end_date, **filters)
+        if resolution == 'week':
+            rows = rows.annotate(week=TruncWeek('date'))
+            key = 'week'
+        else:
+            key = 'date'
+
+    totals = {}
+    for row in rows.values(key).annotate(total=Sum('count')).order_by():
+        bucket = row[key]
+        if resolution == 'week':
+            bucket = bucket.date() if hasattr(bucket, 'date') else bucket
+        totals[bucket] = row['total']
+    return [(bucket, totals.get(bucket, 0)) for bucket in _buckets(start_date, end_date, resolution)]
@@ -6,4 +6,7 @@ app_name = 'analytics'
 urlpatterns = [
     path('track/page/', views.track_page_view, name='track_page'),
     path('track/car/', views.track_car_view, name='track_car'),
+    path('track/batch/', views.track_batch, name='track_batch'),
+    path('reports/unique-visitors/', views.unique_visitors_report, name='unique_visitors'),
+    path('reports/timeseries/', views.view_timeseries_report, name='timeseries'),
 ]
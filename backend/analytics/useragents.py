@@ -0,0 +1,170 @@
+"""
+Interned User-Agent strings.
+
+Event rows reference a UserAgent row instead of repeating the full header,
+which is usually 100-250 bytes and shared by many visitors. Buffered events
+carry the raw string in raw_user_agent; when a batch is flushed the strings
+are resolved to ids through a per-process LRU, so a known agent costs no
+query and unknown agents in the batch cost one lookup and one insert. The
+browser, OS and device class are parsed once, when an agent is first seen.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from .models import UserAgent
+
+# Crawlers, link previewers, monitors and HTTP libraries; one precompiled alternation
+BOT_RE = re.compile(
+    r'bot|crawl|spider|slurp|facebookexternalhit|embedly|preview|headless|phantomjs|'
+    r'lighthouse|pingdom|uptime|monitor|curl|wget|python-requests|python-urllib|'
+    r'go-http-client|java/|okhttp|httpclient|axios|node-fetch|scrapy',
+    re.I,
+)
+
+# (name, pattern) in priority order; many browsers also claim to be Chrome/Safari
+BROWSERS = [
+    ('Edge', re.compile(r'Edg(?:e|A|iOS)?/(\d+)')),
+    ('Opera', re.compile(r'(?:OPR|Opera)/(\d+)')),
+    ('Samsung Internet', re.compile(r'SamsungBrowser/(\d+)')),
+    ('Firefox', re.compile(r'(?:Firefox|FxiOS)/(\d+)')),
+    ('Chrome', re.compile(r'(?:Chrome|CriOS)/(\d+)')),
+    ('Safari', re.compile(r'Version/(\d+)[\d.]* (?:Mobile/\S+ )?Safari/')),
+]
+
+OPERATING_SYSTEMS = [
+    ('iOS', re.compile(r'iPhone|iPad|iPod')),
+    ('Android', re.compile(r'Android')),
+    ('Windows', re.compile(r'Windows')),
+    ('ChromeOS', re.compile(r'CrOS')),
+    ('macOS', re.compile(r'Mac OS X|Macintosh')),
+    ('Linux', re.compile(r'Linux|X11')),
+]
+
+
+def user_agent_hash(value):
+    return hashlib.sha1(value.encode('utf-8', 'replace')).hexdigest()
+
+
+def is_bot(value):
+    """Whether a User-Agent string belongs to a known crawler or script."""
+    return bool(value) and BOT_RE.search(value) is not None
+
+
+def parse_user_agent(value):
+    """Return browser, browser_version, os and device_type for a User-Agent string."""
+    browser, version = 'Other', ''
+    for name, pattern in BROWSERS:
+        match = pattern.search(value)
+        if match:
+            browser, version = name, match.group(1)
+            break
+
+    os_name = next((name for name, pattern in OPERATING_SYSTEMS if pattern.search(value)), 'Other')
+
+    if is_bot(value):
+        device_type = 'bot'
+    elif 'iPad' in value or 'Tablet' in value or ('Android' in value and 'Mobile' not in value):
+        device_type = 'tablet'
+    elif 'Mobi' in value or 'iPhone' in value or 'iPod' in value:
+        device_type = 'mobile'
+    elif os_name != 'Other':
+        device_type = 'desktop'
+    else:
+        device_type = 'other'
+
+    return {'browser': browser, 'browser_version': version, 'os': os_name, 'device_type': device_type}
+
+
+class UserAgentCache:
+    """Thread-safe LRU of user agent hash -> UserAgent id."""
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key):
+        with self._lock:
+            agent_id = self._ids.get(key)
+            if agent_id is None:
+                self.stats['misses'] += 1
+                return None
+            self._ids.move_to_end(key)
+            self.stats['hits'] += 1
+            return agent_id
+
+    def update(self, ids):
+        with self._lock:
+            for key, agent_id in ids.items():
+                self._ids[key] = agent_id
+                self._ids.move_to_end(key)
+            while len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, size=len(self._ids))
+
+
+def resolve_user_agents(instances, cache=None):
+    """
+    Set user_agent_id on unsaved events from their raw_user_agent strings.
+    
+    Events with an empty or missing raw_user_agent are left without one.
+    Must run inside the transaction that saves the events: ids are only
+    added to the cache once it commits, so a rollback can't leave the
+    cache pointing at rows that were never written.
+    """
+    cache = cache or get_user_agent_cache()
+    by_hash = {}
+    for instance in instances:
+        value = getattr(instance, 'raw_user_agent', '')
+        if value:
+            by_hash.setdefault(user_agent_hash(value), (value, []))[1].append(instance)
+
+    ids = {}
+    missing = []
+    for key in by_hash:
+        agent_id = cache.get(key)
+        if agent_id is None:
+            missing.append(key)
+        else:
+            ids[key] = agent_id
+
+    if missing:
+        found = dict(UserAgent.objects.filter(hash__in=missing).values_list('hash', 'id'))
+        new = [key for key in missing if key not in found]
+        if new:
+            UserAgent.objects.bulk_create([
+                UserAgent(hash=key, value=by_hash[key][0], **parse_user_agent(by_hash[key][0]))
+                for key in new
+            ], ignore_conflicts=True)
+            # ignore_conflicts doesn't return ids, and another worker may have won the race
+            found.update(UserAgent.objects.filter(hash__in=new).values_list('hash', 'id'))
+        ids.update(found)
+        transaction.on_commit(lambda: cache.update(found))
+
+    for key, (value, events) in by_hash.items():
+        for instance in events:
+            instance.user_agent_id = ids[key]
+
+
+_user_agent_cache = None
+_user_agent_cache_lock = threading.Lock()
+
+
+def get_user_agent_cache():
+    """Return this process's user agent cache."""
+    global _user_agent_cache
+    if _user_agent_cache is None:
+        with _user_agent_cache_lock:
+            if _user_agent_cache is None:
+                _user_agent_cache = UserAgentCache(
+                    getattr(settings, 'ANALYTICS_USER_AGENT_CACHE_SIZE', 2048)
+                )
+    return _user_agent_cache
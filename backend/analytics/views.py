@@ -1,8 +1,27 @@
+import ipaddress
+from datetime import date, timedelta
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
+from django.utils import timezone
+from cars.models import Car
+from . import hll, timeseries, visitors
+from .buffer import get_event_buffer
 from .models import PageView, CarView
-from .serializers import PageViewSerializer, CarViewSerializer
+from .parsers import BeaconJSONParser
+from .screening import get_event_screen
+
+PAGE_TYPES = {value for value, label in PageView.PAGE_CHOICES}
+VIEW_TYPES = {value for value, label in CarView.VIEW_TYPE_CHOICES}
+MAX_USER_AGENT_LENGTH = 512
+NOT_AN_OBJECT = {'non_field_errors': ['Invalid data. Expected a dictionary.']}
+MAX_BATCH_EVENTS = 50
+MAX_REPORT_DAYS = 366
+# Weekly points for this long still fit timeseries.MAX_POINTS
+MAX_TIMESERIES_DAYS = 7 * 399
 
 
 def get_client_ip(request):
@@ -15,27 +34,261 @@ def get_client_ip(request):
     return ip
 
 
+def get_client_info(request):
+    """Return (ip_address, user_agent) safe to store without further validation"""
+    ip = (get_client_ip(request) or '').strip()
+    try:
+        ip = str(ipaddress.ip_address(ip))
+    except ValueError:
+        ip = None
+    user_agent = request.META.get('HTTP_USER_AGENT', '')[:MAX_USER_AGENT_LENGTH]
+    return ip, user_agent
+
+
+def build_page_view(data, ip_address, user_agent):
+    """Validate a page view payload. Returns (instance, errors)."""
+    page_type = data.get('page_type')
+    if not isinstance(page_type, str) or page_type not in PAGE_TYPES:
+        return None, {'page_type': [f'"{page_type}" is not a valid choice.']}
+    page_view = PageView(page_type=page_type, timestamp=timezone.now(), ip_address=ip_address)
+    # Resolved to a UserAgent row when the buffer is flushed
+    page_view.raw_user_agent = user_agent
+    return page_view, None
+
+
+def build_car_view(data, ip_address, user_agent):
+    """
+    Validate a car view payload. Returns (instance, errors).
+    
+    The car is not looked up here; events for cars that don't exist are
+    discarded when the buffer is flushed, with one query per batch.
+    """
+    car_id = data.get('car')
+    # Lists, objects, booleans and floats are not ids, even where int() accepts them
+    if isinstance(car_id, bool) or not isinstance(car_id, (int, str)):
+        return None, {'car': ['A valid car id is required.']}
+    try:
+        car_id = int(car_id)
+    except ValueError:
+        return None, {'car': ['A valid car id is required.']}
+    if car_id < 1:
+        return None, {'car': ['A valid car id is required.']}
+    view_type = data.get('view_type', 'detail_view')
+    if not isinstance(view_type, str) or view_type not in VIEW_TYPES:
+        return None, {'view_type': [f'"{view_type}" is not a valid choice.']}
+    car_view = CarView(
+        car_id=car_id,
+        view_type=view_type,
+        timestamp=timezone.now(),
+        ip_address=ip_address,
+    )
+    car_view.raw_user_agent = user_agent
+    return car_view, None
+
+
+def _enqueue(instance):
+    """Hand an event to the write-behind buffer and report back-pressure."""
+    if get_event_buffer().add(instance):
+        return Response({'status': 'accepted'}, status=status.HTTP_202_ACCEPTED)
+    return Response(
+        {'status': 'dropped'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '30'},
+    )
+
+
+def _ignored():
+    """Acknowledge an event that was screened out, so clients don't retry it."""
+    return Response({'status': 'ignored'}, status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(['POST'])
 def track_page_view(request):
     """Track a page view"""
-    serializer = PageViewSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save(
-            ip_address=get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
-        )
-        return Response({'status': 'recorded'}, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    ip_address, user_agent = get_client_info(request)
+    if get_event_screen().is_bot(user_agent):
+        return _ignored()
+    if not isinstance(request.data, dict):
+        return Response(NOT_AN_OBJECT, status=status.HTTP_400_BAD_REQUEST)
+    page_view, errors = build_page_view(request.data, ip_address, user_agent)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    return _enqueue(page_view)
 
 
 @api_view(['POST'])
 def track_car_view(request):
-    """Track a car view"""
-    serializer = CarViewSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save(
-            ip_address=get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+    """Track a car view, ignoring bots and repeat views by the same client"""
+    screen = get_event_screen()
+    ip_address, user_agent = get_client_info(request)
+    if screen.is_bot(user_agent):
+        return _ignored()
+    if not isinstance(request.data, dict):
+        return Response(NOT_AN_OBJECT, status=status.HTTP_400_BAD_REQUEST)
+    car_view, errors = build_car_view(request.data, ip_address, user_agent)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+    if screen.is_duplicate(car_view, ip_address, user_agent):
+        return _ignored()
+    return _enqueue(car_view)
+
+
+@api_view(['POST'])
+@parser_classes([JSONParser, BeaconJSONParser])
+def track_batch(request):
+    """
+    Track several page and car views in one request.
+    
+    Accepts {"events": [...]} or a bare list, where each event is
+    {"type": "page", "page_type": ...} or {"type": "car", "car": ..., "view_type": ...}.
+    Referenced cars are verified with a single query and the valid events
+    are queued for one bulk insert. Bot traffic and repeat car views are
+    acknowledged but counted as ignored.
+    """
+    events = request.data.get('events') if isinstance(request.data, dict) else request.data
+    if not isinstance(events, list) or not events:
+        return Response({'events': ['A non-empty list of events is required.']},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(events) > MAX_BATCH_EVENTS:
+        return Response({'events': [f'At most {MAX_BATCH_EVENTS} events per batch.']},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    screen = get_event_screen()
+    ip_address, user_agent = get_client_info(request)
+    if screen.is_bot(user_agent, count=len(events)):
+        return Response(
+            {'accepted': 0, 'dropped': 0, 'ignored': len(events), 'rejected': []},
+            status=status.HTTP_202_ACCEPTED,
         )
-        return Response({'status': 'recorded'}, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    builders = {'page': build_page_view, 'car': build_car_view}
+    valid = []
+    rejected = []
+    for index, event in enumerate(events):
+        if not isinstance(event, dict) or not isinstance(event.get('type'), str) \
+                or event['type'] not in builders:
+            rejected.append({'index': index, 'errors': {'type': ['Must be "page" or "car".']}})
+            continue
+        instance, errors = builders[event['type']](event, ip_address, user_agent)
+        if errors:
+            rejected.append({'index': index, 'errors': errors})
+        else:
+            valid.append((index, instance))
+    
+    # Verify every referenced car in one query
+    car_ids = {instance.car_id for index, instance in valid if isinstance(instance, CarView)}
+    if car_ids:
+        existing = set(Car.objects.filter(id__in=car_ids).values_list('id', flat=True))
+        checked = []
+        for index, instance in valid:
+            if isinstance(instance, CarView) and instance.car_id not in existing:
+                rejected.append({'index': index, 'errors': {'car': ['Car does not exist.']}})
+            else:
+                checked.append((index, instance))
+        valid = checked
+    
+    rejected.sort(key=lambda item: item['index'])
+    if not valid:
+        return Response({'accepted': 0, 'rejected': rejected}, status=status.HTTP_400_BAD_REQUEST)
+    
+    instances = [
+        instance for index, instance in valid
+        if not (isinstance(instance, CarView) and screen.is_duplicate(instance, ip_address, user_agent))
+    ]
+    accepted = get_event_buffer().extend(instances)
+    body = {
+        'accepted': accepted,
+        'dropped': len(instances) - accepted,
+        'ignored': len(valid) - len(instances),
+        'rejected': rejected,
+    }
+    if instances and not accepted:
+        return Response(body, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '30'})
+    return Response(body, status=status.HTTP_202_ACCEPTED)
+
+
+def _report_params(request, max_days):
+    """Parse start, end and car query parameters, raising ValidationError if invalid."""
+    try:
+        end = date.fromisoformat(request.query_params['end']) if 'end' in request.query_params \
+            else timezone.localdate()
+        start = date.fromisoformat(request.query_params['start']) if 'start' in request.query_params \
+            else end - timedelta(days=6)
+    except ValueError:
+        raise ValidationError({'detail': 'Dates must be YYYY-MM-DD.'})
+    if start > end or (end - start).days >= max_days:
+        raise ValidationError(
+            {'detail': f'start must not be after end, and the range is limited to {max_days} days.'}
+        )
+    
+    car = request.query_params.get('car')
+    if car is not None:
+        try:
+            car = int(car)
+        except ValueError:
+            raise ValidationError({'car': 'Must be a car id.'})
+    return start, end, car
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def unique_visitors_report(request):
+    """
+    Approximate unique visitors for a date range (staff only).
+    
+    Query parameters: start and end (YYYY-MM-DD, inclusive; default the
+    last 7 days) and optionally car to count visitors to one car. Counts
+    come from merged HyperLogLog sketches and are within about
+    3 x standard_error of the true value.
+    """
+    start, end, car = _report_params(request, MAX_REPORT_DAYS)
+    total, daily = visitors.unique_visitors(start, end, car=car)
+    return Response({
+        'start': start,
+        'end': end,
+        'car': car,
+        'unique_visitors': total,
+        'standard_error': round(hll.STANDARD_ERROR, 4),
+        'daily': [{'date': day, 'unique_visitors': count} for day, count in daily.items()],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def view_timeseries_report(request):
+    """
+    Page or car view counts over time (staff only).
+    
+    Query parameters: metric (page_views or car_views), start and end
+    (YYYY-MM-DD, inclusive; default the last 7 days), resolution (hour, day
+    or week; default day), and optional page_type, view_type or car filters.
+    Points come from the rollup tables. A resolution that would give more
+    than timeseries.MAX_POINTS points is coarsened and the one used is
+    returned. Per-car series are available by day or week only.
+    """
+    metric = request.query_params.get('metric', 'page_views')
+    if metric not in ('page_views', 'car_views'):
+        raise ValidationError({'metric': 'Must be "page_views" or "car_views".'})
+    requested = request.query_params.get('resolution', 'day')
+    if requested not in timeseries.RESOLUTIONS:
+        raise ValidationError({'resolution': f'Must be one of {", ".join(timeseries.RESOLUTIONS)}.'})
+    start, end, car = _report_params(request, MAX_TIMESERIES_DAYS)
+    if car is not None and metric != 'car_views':
+        raise ValidationError({'car': 'Only available for car_views.'})
+    
+    filters = {}
+    if metric == 'page_views' and 'page_type' in request.query_params:
+        filters['page_type'] = request.query_params['page_type']
+    if metric == 'car_views' and 'view_type' in request.query_params:
+        filters['view_type'] = request.query_params['view_type']
+    
+    resolution = timeseries.choose_resolution(start, end, requested, hourly=car is None)
+    points = timeseries.view_series(metric, start, end, resolution, car=car, **filters)
+    return Response({
+        'metric': metric,
+        'start': start,
+        'end': end,
+        'requested_resolution': requested,
+        'resolution': resolution,
+        'points': [{'t': bucket, 'count': count} for bucket, count in points],
+    })
@@ -0,0 +1,167 @@
+"""
+Approximate unique visitors per day and per car.
+
+A visitor is an (IP address, User-Agent) pair. Each flushed batch of events
+is folded into per-day HyperLogLog sketches (see hll.py): page views feed
+the site-wide sketch and car views the per-car sketch. Ranges are answered
+by merging the daily sketches, so no query ever runs COUNT(DISTINCT) over
+the raw tables.
+"""
+
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from . import hll
+from .models import PageView, CarView, DailyVisitorSketch, DailyCarVisitorSketch
+from .rollups import recount_range
+from .timeranges import filter_days
+
+
+def visitor_key(ip_address, user_agent):
+    """Identity used for unique counts, or None if the event has neither part."""
+    if not ip_address and not user_agent:
+        return None
+    return f'{ip_address or ""}|{user_agent or ""}'
+
+
+def _merge_into(model, key_fields, sketches):
+    """Merge sketches keyed by key_fields values into model rows."""
+    if not sketches:
+        return
+    # Make sure every row exists, then lock them in a fixed order to avoid deadlocks
+    model.objects.bulk_create([
+        model(registers=hll.empty(), **dict(zip(key_fields, key))) for key in sketches
+    ], ignore_conflicts=True)
+    condition = reduce(or_, (Q(**dict(zip(key_fields, key))) for key in sketches))
+    rows = list(model.objects.select_for_update().filter(condition).order_by(*key_fields))
+    for row in rows:
+        key = tuple(getattr(row, field) for field in key_fields)
+        row.registers = hll.merge(row.registers, sketches[key])
+    model.objects.bulk_update(rows, ['registers'])
+
+
+def _sketch_events(events):
+    """Build one sketch per key from (key, visitor) pairs."""
+    registers = defaultdict(lambda: bytearray(hll.REGISTERS))
+    for key, visitor in events:
+        if visitor:
+            hll.add(registers[key], visitor)
+    return {key: bytes(value) for key, value in registers.items()}
+
+
+def record_events(model, instances):
+    """Fold a batch of just-written events into the daily visitor sketches."""
+    events = (
+        (event, visitor_key(event.ip_address, getattr(event, 'raw_user_agent', '')))
+        for event in instances
+    )
+    if model is PageView:
+        sketches = _sketch_events(
+            ((timezone.localdate(event.timestamp),), visitor) for event, visitor in events
+        )
+        _merge_into(DailyVisitorSketch, ['date'], sketches)
+    elif model is CarView:
+        sketches = _sketch_events(
+            ((timezone.localdate(event.timestamp), event.car_id), visitor) for event, visitor in events
+        )
+        _merge_into(DailyCarVisitorSketch, ['date', 'car_id'], sketches)
+
+
+def unique_visitors(start_date, end_date, car=None):
+    """
+    Estimate unique visitors over the inclusive date range.
+    
+    Returns (total, daily) where daily maps each date that has a sketch to
+    that day's estimate. With car, counts visitors to that car only.
+    """
+    if car is None:
+        rows = DailyVisitorSketch.objects.all()
+    else:
+        rows = DailyCarVisitorSketch.objects.filter(car=car)
+    rows = rows.filter(date__gte=start_date, date__lte=end_date)
+
+    by_date = defaultdict(list)
+    for day, registers in rows.values_list('date', 'registers'):
+        by_date[day].append(registers)
+
+    daily = {day: hll.estimate(hll.merge(*sketches)) for day, sketches in sorted(by_date.items())}
+    total = hll.estimate(hll.merge(*(s for sketches in by_date.values() for s in sketches)))
+    return total, daily
+
+
+def unique_car_visitors(start_date, end_date):
+    """Estimate visitors who viewed any car over the inclusive date range."""
+    rows = DailyCarVisitorSketch.objects.filter(date__gte=start_date, date__lte=end_date)
+    return hll.estimate(hll.merge(*rows.values_list('registers', flat=True)))
+
+
+def rebuild(start_date=None, end_date=None):
+    """
+    Recompute visitor sketches from the raw tables for an inclusive date range.
+
+    Each table is recounted over rollups.recount_range(), so sketches for
+    days whose raw events are gone are kept. Returns the number of sketch
+    rows written.
+    """
+    written = 0
+    page_range = recount_range(PageView, start_date, end_date)
+    if page_range:
+        page_events = filter_days(PageView.objects.all(), *page_range).values_list(
+            'timestamp', 'ip_address', 'user_agent__value'
+        ).order_by()
+        written += rebuild_from_events(*page_range, page_events=page_events.iterator(chunk_size=5000))
+    car_range = recount_range(CarView, start_date, end_date)
+    if car_range:
+        car_events = filter_days(CarView.objects.all(), *car_range).values_list(
+            'timestamp', 'car_id', 'ip_address', 'user_agent__value'
+        ).order_by()
+        written += rebuild_from_events(*car_range, car_events=car_events.iterator(chunk_size=5000))
+    return written
+
+
+def rebuild_from_events(start_date, end_date, page_events=None, car_events=None):
+    """
+    Recompute visitor sketches for an inclusive date range from event tuples.
+
+    page_events yields (timestamp, ip_address, user_agent) and car_events
+    yields (timestamp, car_id, ip_address, user_agent). The sketches of a
+    table whose events are None are not touched. Returns the number of
+    sketch rows written.
+    """
+    def in_range(queryset):
+        if start_date:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(date__lte=end_date)
+        return queryset
+
+    page_sketches = car_sketches = None
+    if page_events is not None:
+        page_sketches = _sketch_events(
+            ((timezone.localdate(timestamp),), visitor_key(ip, user_agent))
+            for timestamp, ip, user_agent in page_events
+        )
+    if car_events is not None:
+        car_sketches = _sketch_events(
+            ((timezone.localdate(timestamp), car_id), visitor_key(ip, user_agent))
+            for timestamp, car_id, ip, user_agent in car_events
+        )
+
+    written = 0
+    with transaction.atomic():
+        if page_sketches is not None:
+            in_range(DailyVisitorSketch.objects.all()).delete()
+            written += len(DailyVisitorSketch.objects.bulk_create([
+                DailyVisitorSketch(date=day, registers=registers)
+                for (day,), registers in page_sketches.items()
+            ], batch_size=500))
+        if car_sketches is not None:
+            in_range(DailyCarVisitorSketch.objects.all()).delete()
+            written += len(DailyCarVisitorSketch.objects.bulk_create([
+                DailyCarVisitorSketch(date=day, car_id=car_id, registers=registers)
+                for (day, car_id), registers in car_sketches.items()
+            ], batch_size=500))
+    return written
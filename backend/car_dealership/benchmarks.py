@@ -0,0 +1,95 @@
+"""
+Benchmarks for the shared cache backend.
+
+Runs the same get/set/incr workload against PostgresCache, LocMemCache and
+FileBasedCache and reports operations per second, plus a concurrent incr
+check: several threads increment one key and any increments lost to a
+non-atomic read-modify-write are counted. LocMem is the fastest but is per
+process, which is the reason PostgresCache exists; the numbers show what
+sharing costs per operation.
+"""
+
+import shutil
+import tempfile
+import threading
+import time
+from django.conf import settings
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from .cache import PostgresCache
+
+BACKENDS = ['postgres', 'locmem', 'filebased']
+OPERATIONS = ['set', 'get', 'incr']
+
+
+def make_cache(name, directory):
+    """Create a benchmark cache with its own key prefix, so real entries are untouched."""
+    params = {'KEY_PREFIX': 'benchmark', 'TIMEOUT': 300}
+    if name == 'postgres':
+        return PostgresCache(settings.CACHES['default'].get('LOCATION', 'shared_cache'), params)
+    if name == 'locmem':
+        return LocMemCache('benchmark', params)
+    return FileBasedCache(directory, params)
+
+
+def time_operations(cache, operations):
+    """Ops/s of set, get and incr over the given number of keys."""
+    keys = [f'key{i}' for i in range(operations)]
+    value = {'id': 1, 'make': 'Toyota', 'model': 'Corolla', 'price': '18500.00'}
+    results = {}
+
+    start = time.perf_counter()
+    for key in keys:
+        cache.set(key, value)
+    results['set'] = operations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    results['get'] = operations / (time.perf_counter() - start)
+
+    cache.set('counter', 0)
+    start = time.perf_counter()
+    for _ in keys:
+        cache.incr('counter')
+    results['incr'] = operations / (time.perf_counter() - start)
+    return results
+
+
+def lost_increments(cache, threads, increments):
+    """Increment one key from several threads; return how many increments were lost."""
+    cache.set('contended', 0)
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        try:
+            for _ in range(increments):
+                cache.incr('contended')
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * increments - cache.get('contended')
+
+
+def run_benchmarks(operations=1000, names=None, threads=4):
+    """Benchmark all (or the named) backends."""
+    results = []
+    for name in names or BACKENDS:
+        directory = tempfile.mkdtemp(prefix='cache-benchmark-')
+        cache = make_cache(name, directory)
+        try:
+            result = time_operations(cache, operations)
+            result['name'] = name
+            result['lost_increments'] = lost_increments(cache, threads, max(1, operations // threads))
+            results.append(result)
+        finally:
+            cache.delete_many([f'key{i}' for i in range(operations)] + ['counter', 'contended'])
+            shutil.rmtree(directory, ignore_errors=True)
+    return results
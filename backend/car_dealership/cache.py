@@ -0,0 +1,181 @@
+"""
+Shared cache backend on an unlogged PostgreSQL table.
+
+Without CACHES every gunicorn worker gets its own LocMemCache, so throttle
+limits are multiplied by the worker count and each worker warms its own
+cache. This backend keeps entries in one table that all workers (and
+management commands) share, with no extra service to run.
+
+The table (migration car_dealership 0001) is UNLOGGED: writes skip the WAL,
+and after a crash PostgreSQL empties it, which is acceptable for a cache.
+Compared with Django's DatabaseCache:
+
+- set/add are single INSERT ... ON CONFLICT statements, not a SELECT
+  followed by INSERT or UPDATE.
+- Integers are stored in their own column, so incr/decr are one atomic
+  UPDATE ... RETURNING and concurrent increments are never lost.
+- Expired rows are invisible to reads immediately and are deleted in
+  batches every CULL_EVERY writes via an index on expires, rather than
+  counting the table on every write.
+"""
+
+import itertools
+import pickle
+import time
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import connections
+
+CULL_BATCH_SIZE = 10000
+
+
+class PostgresCache(BaseCache):
+    """Cache backend storing entries in the UNLOGGED table named by LOCATION."""
+
+    def __init__(self, table, params):
+        super().__init__(params)
+        self._table = table
+        options = params.get('OPTIONS', {})
+        self._db = options.get('DATABASE', 'default')
+        self._cull_every = options.get('CULL_EVERY', 1000)
+        self._writes = itertools.count(1)
+
+    def _cursor(self):
+        return connections[self._db].cursor()
+
+    @staticmethod
+    def _encode(value):
+        # bool is an int subclass but must round-trip as bool
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return None, value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL), None
+
+    @staticmethod
+    def _decode(value, int_value):
+        if int_value is not None:
+            return int_value
+        return pickle.loads(bytes(value))
+
+    def _wrote(self, cursor):
+        """Delete a batch of expired rows every CULL_EVERY writes."""
+        if self._cull_every and next(self._writes) % self._cull_every == 0:
+            cursor.execute(
+                f'DELETE FROM {self._table} WHERE cache_key IN ('
+                f'SELECT cache_key FROM {self._table} WHERE expires <= %s LIMIT %s)',
+                [time.time(), CULL_BATCH_SIZE],
+            )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        blob, int_value = self._encode(value)
+        with self._cursor() as cursor:
+            # Replaces the row only if it has expired
+            cursor.execute(
+                f'INSERT INTO {self._table} (cache_key, value, int_value, expires) '
+                f'VALUES (%s, %s, %s, %s) ON CONFLICT (cache_key) DO UPDATE '
+                f'SET value = EXCLUDED.value, int_value = EXCLUDED.int_value, expires = EXCLUDED.expires '
+                f'WHERE {self._table}.expires <= %s RETURNING 1',
+                [key, blob, int_value, self.get_backend_timeout(timeout), time.time()],
+            )
+            added = cursor.fetchone() is not None
+            self._wrote(cursor)
+        return added
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        key_map = {}
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            key_map[cache_key] = key
+        with self._cursor() as cursor:
+            cursor.execute(
+                f'SELECT cache_key, value, int_value FROM {self._table} '
+                f'WHERE cache_key = ANY(%s) AND (expires IS NULL OR expires > %s)',
+                [list(key_map), time.time()],
+            )
+            rows = cursor.fetchall()
+        return {key_map[cache_key]: self._decode(value, int_value) for cache_key, value, int_value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        expires = self.get_backend_timeout(timeout)
+        params = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            params.extend([key, *self._encode(value), expires])
+        with self._cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self._table} (cache_key, value, int_value, expires) '
+                f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(data))} '
+                f'ON CONFLICT (cache_key) DO UPDATE '
+                f'SET value = EXCLUDED.value, int_value = EXCLUDED.int_value, expires = EXCLUDED.expires',
+                params,
+            )
+            self._wrote(cursor)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {self._table} SET expires = %s '
+                f'WHERE cache_key = %s AND (expires IS NULL OR expires > %s)',
+                [self.get_backend_timeout(timeout), key, time.time()],
+            )
+            return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Atomically add delta to an integer entry; raises ValueError if it's missing."""
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        with self._cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {self._table} SET int_value = int_value + %s '
+                f'WHERE cache_key = %s AND int_value IS NOT NULL AND (expires IS NULL OR expires > %s) '
+                f'RETURNING int_value',
+                [delta, cache_key, time.time()],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def delete(self, key, version=None):
+        return self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        cache_keys = []
+        for key in keys:
+            cache_key = self.make_key(key, version=version)
+            self.validate_key(cache_key)
+            cache_keys.append(cache_key)
+        if not cache_keys:
+            return False
+        with self._cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self._table} WHERE cache_key = ANY(%s)', [cache_keys])
+            return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._cursor() as cursor:
+            cursor.execute(
+                f'SELECT 1 FROM {self._table} WHERE cache_key = %s AND (expires IS NULL OR expires > %s)',
+                [key, time.time()],
+            )
+            return cursor.fetchone() is not None
+
+    def clear(self):
+        with self._cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self._table}')
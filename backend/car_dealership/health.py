@@ -1,7 +1,13 @@
 from django.http import JsonResponse
 from django.views import View
 from django.db import connection
-from django.core.cache import cache
+from django.core.cache import cache, caches
+from analytics.buffer import get_event_buffer
+from analytics.screening import get_event_screen
+from analytics.useragents import get_user_agent_cache
+from cars.caching import get_response_cache
+from contact.screening import get_contact_screen
+from .tiered import TIERED_CACHE_ALIAS
 import sys
 
 
@@ -9,7 +15,7 @@ class HealthCheckView(View):
     """
     Enhanced health check endpoint for monitoring.
     Returns 200 OK if the application is running and dependencies are accessible.
-    Checks: application, database, cache (if configured).
+    Checks: application, database, cache (if configured), analytics buffer.
     """
     
     def get(self, request):
@@ -40,6 +46,14 @@ class HealthCheckView(View):
         except Exception as e:
             health_status['checks']['cache'] = 'not_configured'
         
+        # Analytics write-behind buffer counters for this worker
+        health_status['checks']['analytics_buffer'] = get_event_buffer().snapshot()
+        health_status['checks']['user_agent_cache'] = get_user_agent_cache().snapshot()
+        health_status['checks']['analytics_screening'] = get_event_screen().snapshot()
+        health_status['checks']['contact_screening'] = get_contact_screen().snapshot()
+        health_status['checks']['tiered_cache'] = caches[TIERED_CACHE_ALIAS].tier.snapshot()
+        health_status['checks']['car_response_cache'] = get_response_cache().snapshot()
+        
         # Return 503 if unhealthy, 200 if healthy
         status_code = 200 if health_status['status'] == 'healthy' else 503
         
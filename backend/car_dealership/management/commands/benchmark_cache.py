@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from car_dealership.benchmarks import BACKENDS, run_benchmarks
+
+
+class Command(BaseCommand):
+    """Compare the shared PostgreSQL cache with Django's per-process and file caches."""
+
+    help = 'Measure get/set/incr throughput and incr atomicity of the cache backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--operations',
+            type=int,
+            default=1000,
+            help='Keys written and read per backend (default: 1000)',
+        )
+        parser.add_argument(
+            '--backend',
+            action='append',
+            choices=BACKENDS,
+            help='Only run the named backend (can be repeated)',
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Threads incrementing one key in the atomicity check (default: 4)',
+        )
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            operations=options['operations'],
+            names=options['backend'],
+            threads=options['threads'],
+        )
+
+        self.stdout.write(
+            f"{'backend':<12}{'set/s':>10}{'get/s':>10}{'incr/s':>10}{'lost incr':>11}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<12}"
+                f"{result['set']:>10.0f}"
+                f"{result['get']:>10.0f}"
+                f"{result['incr']:>10.0f}"
+                f"{result['lost_increments']:>11}"
+            )
@@ -0,0 +1,48 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.views.static import serve
+from django.core.exceptions import SuspiciousFileOperation
+
+# {stem}.{digest}.ext as written by cars.models.optimize_image, optionally
+# with the suffix storage appends when a name is already taken
+HASHED_NAME = re.compile(r'^.+\.[0-9a-f]{12}(_[A-Za-z0-9]{7})?\.\w+$')
+
+
+def cache_control(path):
+    """Immutable for content-hashed names; files uploaded before hashing may still be replaced."""
+    if HASHED_NAME.match(os.path.basename(path)):
+        return f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_UNHASHED_CACHE_MAX_AGE}'
+
+
+def serve_media(request, path):
+    """
+    Serve an uploaded media file.
+
+    In 'x-accel' mode Django only checks the file exists and hands the
+    transfer off to nginx via X-Accel-Redirect, so gunicorn workers are not
+    tied up streaming images. In 'django' mode (development/demo) the file
+    is streamed by Django itself. Cache-Control is set here for both modes;
+    only content-hashed filenames are marked immutable.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid media path')
+
+    if settings.MEDIA_DELIVERY == 'x-accel':
+        if not os.path.isfile(full_path):
+            raise Http404('Media file not found')
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(path)
+    else:
+        response = serve(request, path, document_root=settings.MEDIA_ROOT)
+
+    response['Cache-Control'] = cache_control(path)
+    return response
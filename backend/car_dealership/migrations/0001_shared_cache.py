@@ -0,0 +1,26 @@
+# Table behind car_dealership.cache.PostgresCache (see CACHES in settings).
+#
+# UNLOGGED skips the WAL for every cache write; PostgreSQL truncates the
+# table after a crash, which only means a cold cache. It is created even if
+# CACHES points elsewhere, so switching backends needs no new migration.
+
+from django.db import migrations
+
+CREATE_TABLE = """
+CREATE UNLOGGED TABLE shared_cache (
+    cache_key text PRIMARY KEY,
+    value bytea,
+    int_value bigint,
+    expires double precision
+);
+CREATE INDEX shared_cache_expires_idx ON shared_cache (expires);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = []
+
+    operations = [
+        migrations.RunSQL(CREATE_TABLE, 'DROP TABLE shared_cache'),
+    ]
@@ -69,6 +69,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'car_dealership.wsgi.application'
 
+# Keeps the tiered cache's worker memory and listeners out of test runs
+TEST_RUNNER = 'car_dealership.test_runner.TestRunner'
+
 # Database - All credentials from environment variables
 DATABASES = {
     'default': {
@@ -117,6 +120,14 @@ STATICFILES_FINDERS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media delivery mode:
+# 'django' - files are streamed by Django (development and demo setups)
+# 'x-accel' - Django only locates the file and nginx sends it via X-Accel-Redirect
+MEDIA_DELIVERY = config('MEDIA_DELIVERY', default='django')
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'  # Must match the internal nginx location
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365  # 1 year - uploaded filenames are content-hashed
+MEDIA_UNHASHED_CACHE_MAX_AGE = 60 * 60  # 1 hour - files uploaded before hashing keep their names
+
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
@@ -134,6 +145,38 @@ EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
 ADMIN_EMAIL = config('ADMIN_EMAIL')
 
+# Contact form emails are queued in the outbox and sent by send_outbox_emails
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': 50,  # Emails sent per SMTP connection
+    'MAX_ATTEMPTS': 6,  # Attempts before an email is marked failed
+    'RETRY_DELAY': 60,  # Seconds before the first retry; doubles on each attempt
+    'MAX_RETRY_DELAY': 3600,
+    'LEASE': 300,  # Seconds a claimed email is hidden from other workers
+}
+
+# Contact form submissions repeated within WINDOW are acknowledged but not saved
+CONTACT_SCREENING = {
+    'WINDOW': 3600,  # Seconds a submission's fingerprint is remembered
+    'MAX_TRACKED': 10000,  # Fingerprints remembered per worker
+    'MAX_COPIES': 3,  # Near-identical messages from different senders accepted per window
+}
+
+# Cached CarViewSet responses (cars/caching.py)
+CAR_RESPONSE_CACHE = {
+    'SOFT_TTL': 60,  # Seconds a response is fresh; after that one request rebuilds it while others get the stale copy
+    'HARD_TTL': 600,  # Seconds a stale response may still be served
+    'LOCK_TIMEOUT': 10,  # Seconds before a rebuild lock held by a crashed request lapses
+    'WAIT_TIMEOUT': 3,  # Seconds a request waits for another's rebuild of a missing response
+}
+
+# Pre-rendering of cached car responses (cars/warming.py, warm_cache command)
+CACHE_WARMING = {
+    'HOSTS': [],  # Hosts the site is served as; empty means the non-wildcard ALLOWED_HOSTS
+    'WORKERS': 4,  # Concurrent renders
+    'TOP_VALUES': 5,  # Most common values per search filter to warm
+    'ON_INVENTORY_CHANGE': True,  # Re-render the homepage lists after each car or image change
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -144,8 +187,8 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'car_dealership.throttling.SharedAnonRateThrottle',
+        'car_dealership.throttling.SharedUserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/hour',  # Anonymous users: 100 requests per hour
@@ -154,6 +197,34 @@ REST_FRAMEWORK = {
     },
 }
 
+# Analytics ingestion - events are buffered per worker and written with bulk_create
+ANALYTICS_BUFFER = {
+    'MAX_EVENTS': 10000,  # Events beyond this are dropped (and counted) if the DB falls behind
+    'FLUSH_SIZE': 200,  # Flush as soon as this many events are waiting
+    'FLUSH_INTERVAL': 5,  # Seconds between background flushes; None flushes inline
+}
+
+# Ingest-time filtering of bot traffic and repeat car views
+ANALYTICS_SCREENING = {
+    'DUPLICATE_WINDOW': 30,  # Seconds during which a client's repeat view of a car is ignored
+    'MAX_TRACKED': 10000,  # Recent (client, car) pairs remembered per worker
+}
+
+# Distinct user agents whose ids each worker keeps in memory
+ANALYTICS_USER_AGENT_CACHE_SIZE = 2048
+
+# Days of views behind ?ordering=-popularity and /api/cars/popular/
+ANALYTICS_POPULARITY_WINDOW_DAYS = 7
+
+# Raw analytics events are partitioned by month; rollups are kept indefinitely
+ANALYTICS_PARTITIONS = {
+    'MONTHS_AHEAD': 3,  # Future monthly partitions to keep created
+    'RETAIN_MONTHS': config('ANALYTICS_RETAIN_MONTHS', default=13, cast=int),  # Including the current month
+}
+
+# Where export_analytics_archive writes daily Parquet/CSV files of raw events
+ANALYTICS_ARCHIVE_DIR = config('ANALYTICS_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'archive'))
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -200,8 +271,32 @@ LOGGING = {
     },
 }
 
+# Shared cache for all workers, kept in an UNLOGGED PostgreSQL table (no extra service)
+CACHES = {
+    'default': {
+        'BACKEND': 'car_dealership.cache.PostgresCache',
+        'LOCATION': 'shared_cache',  # Created by migration car_dealership 0001
+        'KEY_PREFIX': 'car_dealership',
+        'TIMEOUT': 300,  # 5 minutes default timeout
+        'OPTIONS': {
+            'CULL_EVERY': 1000,  # Writes between deletions of expired entries
+        },
+    },
+    # Per-worker LRU in front of 'default' for hot keys, invalidated via LISTEN/NOTIFY
+    'tiered': {
+        'BACKEND': 'car_dealership.tiered.TieredCache',
+        'LOCATION': 'default',  # The shared cache alias behind it
+        'OPTIONS': {
+            'CHANNEL': 'cache_invalidation',
+            'MAX_ENTRIES': 500,
+            'MAX_BYTES': 16 * 1024 * 1024,
+            'MAX_AGE': 60,  # Seconds an entry may be served from memory at most
+        },
+    },
+}
+
 # Optional Redis Cache Configuration
-# Uncomment to enable Redis caching (requires django-redis and redis packages)
+# Uncomment to replace the PostgreSQL cache with Redis (requires django-redis and redis packages)
 # CACHES = {
 #     'default': {
 #         'BACKEND': 'django_redis.cache.RedisCache',
@@ -0,0 +1,31 @@
+from django.test.runner import DiscoverRunner
+from .tiered import disable_listeners, stop_listeners
+
+
+BENCHMARK_TAG = 'benchmark'
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner that keeps worker memory out of the tiered cache.
+
+    Tests tagged benchmark seed millions of rows, so they only run when
+    asked for with --tag=benchmark.
+    """
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        exclude_tags = set(exclude_tags or [])
+        if BENCHMARK_TAG not in (tags or []):
+            exclude_tags.add(BENCHMARK_TAG)
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Test transactions roll back the shared cache but not worker memory,
+        # so entries from one test could otherwise be served in the next
+        disable_listeners()
+
+    def teardown_databases(self, old_config, **kwargs):
+        # Listeners started by tests must disconnect before the database is dropped
+        stop_listeners()
+        super().teardown_databases(old_config, **kwargs)
@@ -0,0 +1,278 @@
+import threading
+import time
+from unittest import mock
+from django.core.cache import cache
+from django.db import connections
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from .cache import PostgresCache
+from .throttling import SharedAnonRateThrottle
+from .tiered import LocalTier, TieredCache
+
+
+def make_cache(**options):
+    return PostgresCache('shared_cache', {'KEY_PREFIX': 'test', 'OPTIONS': options})
+
+
+class PostgresCacheTest(TestCase):
+    """Test cases for the unlogged-table cache backend."""
+
+    def setUp(self):
+        self.cache = make_cache()
+
+    def test_set_get_round_trips_values(self):
+        """Test values keep their type, including ints, bools and None."""
+        values = {'dict': {'a': [1, 2]}, 'int': 42, 'bool': True, 'none': None, 'big': 2 ** 70}
+        self.cache.set_many(values)
+        for key, value in values.items():
+            self.assertEqual(self.cache.get(key, 'missing'), value)
+            self.assertIs(type(self.cache.get(key, 'missing')), type(value))
+
+    def test_get_many_skips_missing_keys(self):
+        """Test get_many only returns keys that exist."""
+        self.cache.set('a', 1)
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'a': 1})
+
+    def test_expired_entries_are_invisible(self):
+        """Test entries past their timeout are not returned or counted."""
+        with mock.patch('car_dealership.cache.time.time', return_value=1000):
+            self.cache.set('key', 'value', timeout=10)
+            self.cache.set('forever', 'value', timeout=None)
+        with mock.patch('car_dealership.cache.time.time', return_value=1011):
+            self.assertIsNone(self.cache.get('key'))
+            self.assertFalse(self.cache.has_key('key'))
+            self.assertEqual(self.cache.get('forever'), 'value')
+
+    def test_add_only_replaces_expired_entries(self):
+        """Test add() keeps a live entry but replaces an expired one."""
+        with mock.patch('car_dealership.cache.time.time', return_value=1000):
+            self.assertTrue(self.cache.add('key', 'first', timeout=10))
+            self.assertFalse(self.cache.add('key', 'second', timeout=10))
+            self.assertEqual(self.cache.get('key'), 'first')
+        with mock.patch('car_dealership.cache.time.time', return_value=1011):
+            self.assertTrue(self.cache.add('key', 'third', timeout=10))
+            self.assertEqual(self.cache.get('key'), 'third')
+
+    def test_incr_and_decr(self):
+        """Test incr/decr update integer entries and reject missing or non-integer ones."""
+        self.cache.set('count', 5)
+        self.assertEqual(self.cache.incr('count'), 6)
+        self.assertEqual(self.cache.decr('count', 3), 3)
+        self.assertEqual(self.cache.get('count'), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('text', 'abc')
+        with self.assertRaises(ValueError):
+            self.cache.incr('text')
+
+    def test_touch_and_delete(self):
+        """Test touch() extends live entries and delete() removes them."""
+        with mock.patch('car_dealership.cache.time.time', return_value=1000):
+            self.cache.set('key', 'value', timeout=10)
+            self.assertTrue(self.cache.touch('key', timeout=100))
+            self.assertFalse(self.cache.touch('missing'))
+        with mock.patch('car_dealership.cache.time.time', return_value=1050):
+            self.assertEqual(self.cache.get('key'), 'value')
+            self.assertTrue(self.cache.delete('key'))
+            self.assertFalse(self.cache.delete('key'))
+
+    def test_versions_and_prefixes_are_separate(self):
+        """Test entries under another version or key prefix don't collide."""
+        other = PostgresCache('shared_cache', {'KEY_PREFIX': 'other'})
+        self.cache.set('key', 'v1')
+        self.cache.set('key', 'v2', version=2)
+        self.assertEqual(self.cache.get('key'), 'v1')
+        self.assertEqual(self.cache.get('key', version=2), 'v2')
+        self.assertIsNone(other.get('key'))
+
+    def test_expired_rows_are_culled(self):
+        """Test every CULL_EVERY-th write deletes expired rows."""
+        culling = make_cache(CULL_EVERY=3)
+        with mock.patch('car_dealership.cache.time.time', return_value=1000):
+            culling.set('old', 'value', timeout=10)
+        with mock.patch('car_dealership.cache.time.time', return_value=2000):
+            culling.set('new', 'value', timeout=10)
+            with connections['default'].cursor() as cursor:
+                cursor.execute("SELECT count(*) FROM shared_cache WHERE cache_key LIKE 'test:%%'")
+                self.assertEqual(cursor.fetchone()[0], 2)
+                culling.set('newer', 'value', timeout=10)
+                cursor.execute("SELECT cache_key FROM shared_cache WHERE cache_key LIKE 'test:%%'")
+                self.assertEqual(sorted(row[0] for row in cursor.fetchall()), ['test:1:new', 'test:1:newer'])
+
+
+class PostgresCacheConcurrencyTest(TransactionTestCase):
+    """Test increments from several connections are never lost."""
+
+    def tearDown(self):
+        make_cache().delete_many(['contended'])
+
+    def test_concurrent_incr_is_atomic(self):
+        """Test threads on their own connections all land their increments."""
+        shared = make_cache()
+        shared.set('contended', 0)
+        barrier = threading.Barrier(4)
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(50):
+                    shared.incr('contended')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(shared.get('contended'), 200)
+
+
+class SharedRateThrottleTest(TestCase):
+    """Test cases for the sliding-window throttle."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.now = 3600 * 1000
+
+    def make_throttle(self, rate='3/hour'):
+        throttle = SharedAnonRateThrottle()
+        throttle.rate = rate
+        throttle.num_requests, throttle.duration = throttle.parse_rate(rate)
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def allow(self, ip='10.0.0.1'):
+        request = self.factory.get('/', REMOTE_ADDR=ip)
+        request.user = mock.Mock(is_authenticated=False)
+        throttle = self.make_throttle()
+        return throttle.allow_request(request, view=None), throttle
+
+    def test_limit_is_shared_between_instances(self):
+        """Test requests counted by one throttle instance (worker) limit another."""
+        results = [self.allow()[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        self.assertTrue(self.allow(ip='10.0.0.2')[0])
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        """Test the previous window's count decays as the new window progresses."""
+        for _ in range(3):
+            self.allow()
+        # A quarter into the next window, 3 * 0.75 + 1 > 3
+        self.now += 3600 + 900
+        allowed, throttle = self.allow()
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(throttle.wait(), 300)
+        # Three quarters in, 3 * 0.25 + 2 <= 3 (the rejected request counts too)
+        self.now += 1800
+        allowed, throttle = self.allow()
+        self.assertTrue(allowed)
+        self.assertEqual(throttle.count, 2)
+
+    def test_wait_until_window_ends_when_current_window_is_full(self):
+        """Test wait() is the rest of the window once its own count exceeds the limit."""
+        for _ in range(3):
+            self.allow()
+        self.now += 600
+        allowed, throttle = self.allow()
+        self.assertFalse(allowed)
+        self.assertEqual(throttle.wait(), 3000)
+
+
+class LocalTierTest(SimpleTestCase):
+    """Test cases for the in-process LRU of the tiered cache."""
+
+    def test_entries_and_bytes_are_bounded(self):
+        """Test the least recently used entries are dropped past either bound."""
+        tier = LocalTier('test', max_entries=2)
+        for key in 'abc':
+            tier.put(key, key, tier.generation)
+        self.assertEqual(tier.snapshot()['entries'], 2)
+        self.assertEqual(tier.get('c'), 'c')
+        self.assertIsNot(tier.get('b'), 'b')
+
+        small = LocalTier('test', max_bytes=300)
+        small.put('a', 'x' * 200, small.generation)
+        small.put('b', 'y' * 200, small.generation)
+        self.assertEqual(small.get('b'), 'y' * 200)
+        self.assertEqual(small.snapshot()['entries'], 1)
+
+    def test_entries_expire_after_max_age(self):
+        """Test an entry is not served once it is older than MAX_AGE."""
+        tier = LocalTier('test', max_age=10)
+        with mock.patch('car_dealership.tiered.time.monotonic', return_value=100):
+            tier.put('key', 'value', tier.generation)
+        with mock.patch('car_dealership.tiered.time.monotonic', return_value=109):
+            self.assertEqual(tier.get('key'), 'value')
+        with mock.patch('car_dealership.tiered.time.monotonic', return_value=110):
+            self.assertIsNot(tier.get('key'), 'value')
+
+    def test_value_read_before_an_eviction_is_not_stored(self):
+        """Test put() skips values fetched before an invalidation arrived."""
+        tier = LocalTier('test')
+        generation = tier.generation
+        tier.evict(['key'])
+        tier.put('key', 'stale', generation)
+        self.assertEqual(tier.snapshot()['entries'], 0)
+
+    def test_cached_values_are_copies(self):
+        """Test mutating a returned value doesn't change the cached one."""
+        tier = LocalTier('test')
+        tier.put('key', [1, 2], tier.generation)
+        tier.get('key').append(3)
+        self.assertEqual(tier.get('key'), [1, 2])
+
+
+class TieredCacheInvalidationTest(TransactionTestCase):
+    """Test writes in one process evict the key from another process's memory."""
+
+    CHANNEL = 'test_cache_invalidation'
+
+    def make_worker(self):
+        worker = TieredCache('default', {'OPTIONS': {'CHANNEL': self.CHANNEL}})
+        # Each worker gets its own tier, as separate processes would
+        worker.tier = LocalTier(self.CHANNEL)
+        worker.tier.ensure_listener()
+        self.addCleanup(worker.tier.stop)
+        self.wait_for(lambda: worker.tier.listening)
+        return worker
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Timed out waiting for the cache listener')
+            time.sleep(0.01)
+
+    def set_and_wait(self, writer, reader, key, value):
+        """Set key in writer and wait until reader has evicted it, so the eviction can't hit a later read."""
+        generation = reader.tier.generation
+        writer.set(key, value)
+        self.wait_for(lambda: reader.tier.generation > generation)
+
+    def tearDown(self):
+        cache.delete_many(['cars:featured'])
+
+    def test_write_evicts_key_in_other_worker(self):
+        """Test a delete in one worker is seen by another worker's next read."""
+        writer, reader = self.make_worker(), self.make_worker()
+        self.set_and_wait(writer, reader, 'cars:featured', ['old'])
+        self.assertEqual(reader.get('cars:featured'), ['old'])
+        self.assertEqual(reader.tier.snapshot()['entries'], 1)
+
+        hits = reader.tier.stats['hits']
+        self.assertEqual(reader.get('cars:featured'), ['old'])
+        self.assertEqual(reader.tier.stats['hits'], hits + 1)
+
+        writer.delete('cars:featured')
+        self.wait_for(lambda: reader.tier.snapshot()['entries'] == 0)
+        self.assertIsNone(reader.get('cars:featured'))
+
+    def test_clear_empties_other_workers(self):
+        """Test clear() in one worker empties every worker's memory."""
+        writer, reader = self.make_worker(), self.make_worker()
+        self.set_and_wait(writer, reader, 'cars:featured', ['old'])
+        reader.get('cars:featured')
+        self.assertEqual(reader.tier.snapshot()['entries'], 1)
+        writer.clear()
+        self.wait_for(lambda: reader.tier.snapshot()['entries'] == 0)
@@ -0,0 +1,63 @@
+"""
+Request throttles that count in a shared cache with atomic increments.
+
+DRF's throttles keep a list of request times per client and write the
+whole list back on every request, so two workers handling the same client
+at once can overwrite each other's entries. These count requests with
+cache.add()/cache.incr() instead, using a sliding-window estimate: the
+count in the current fixed window plus the previous window's count
+weighted by how much of it still overlaps. That is two small keys per
+client and exact under concurrency when the cache's incr is atomic
+(car_dealership.cache.PostgresCache, Redis, Memcached). Rejected requests
+are counted too, so a client that keeps retrying stays throttled.
+"""
+
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+
+class SharedRateThrottleMixin:
+    """Sliding-window counter in place of SimpleRateThrottle's request history."""
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window, self.elapsed = divmod(now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        previous_key = f'{self.key}:{int(window) - 1}'
+
+        # Kept for two windows so it can serve as the next window's "previous"
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.count = self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr()
+            self.cache.set(current_key, 1, self.duration * 2)
+            self.count = 1
+        self.previous_count = self.cache.get(previous_key, 0)
+
+        overlap = 1 - self.elapsed / self.duration
+        if self.previous_count * overlap + self.count > self.num_requests:
+            return self.throttle_failure()
+        return True
+
+    def wait(self):
+        """Seconds until the estimate drops back under the limit."""
+        remaining = self.duration - self.elapsed
+        if self.count > self.num_requests or not self.previous_count:
+            return remaining
+        # Solve previous_count * (1 - t / duration) + count <= num_requests for t
+        needed = self.duration * (1 - (self.num_requests - self.count) / self.previous_count)
+        return max(0, min(remaining, needed - self.elapsed))
+
+
+class SharedAnonRateThrottle(SharedRateThrottleMixin, AnonRateThrottle):
+    """Per-IP limit for anonymous requests, shared across workers."""
+
+
+class SharedUserRateThrottle(SharedRateThrottleMixin, UserRateThrottle):
+    """Per-user limit for authenticated requests, shared across workers."""
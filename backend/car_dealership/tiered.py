@@ -0,0 +1,345 @@
+"""
+Two-tier cache: a per-process LRU in front of the shared cache.
+
+Hot keys such as the homepage car lists are read on almost every request,
+and even PostgresCache costs a round trip for each read. TieredCache keeps
+recently read values in a bounded in-process LRU (L1) and falls back to the
+shared cache named by LOCATION (L2).
+
+Every write through TieredCache, including invalidate(), deletes or
+replaces the L2 entry and publishes the key with NOTIFY. Each process runs
+one daemon thread that LISTENs on a dedicated connection and evicts
+notified keys from its L1. NOTIFY is sent when the writing transaction
+commits, so other processes never evict before the new rows are visible.
+
+Staleness is bounded:
+- L1 is only used while the listener is connected. After a dropped
+  connection L1 is emptied, because notifications may have been missed.
+  Reads then go to L2 until the listener reconnects.
+- Each L1 entry also expires after MAX_AGE seconds. This covers values
+  changed in L2 directly, without going through TieredCache.
+"""
+
+import json
+import logging
+import os
+import pickle
+import select
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+TIERED_CACHE_ALIAS = 'tiered'
+# NOTIFY payloads are limited to 8000 bytes
+MAX_PAYLOAD = 7000
+CLEAR_ALL = '*'
+POLL_INTERVAL = 1.0
+RECONNECT_DELAY = 5.0
+
+_MISSING = object()
+
+
+class LocalTier:
+    """
+    Bounded LRU of pickled values plus the thread that keeps it invalidated.
+
+    Values are stored pickled, so callers can't mutate a cached object
+    shared with other requests, and MAX_BYTES can be enforced.
+    """
+
+    def __init__(self, channel, database='default', max_entries=500, max_bytes=16 * 1024 * 1024, max_age=60,
+                 listen=True):
+        self.channel = channel
+        # Without a listener the tier stays empty and reads go to the shared cache
+        self.listen = listen
+        self.database = database
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # key -> (expires, pickled value)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every eviction, so a value read from L2 before an
+        # invalidation arrived isn't stored after it
+        self.generation = 0
+        self.listening = False
+        self._pid = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'disconnects': 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    self._pop(key)
+                self.stats['misses'] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return pickle.loads(entry[1])
+
+    def put(self, key, value, generation):
+        """Store a value read from L2 unless an eviction happened since generation."""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.max_age, data)
+            self._bytes += len(data)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= len(self._entries.popitem(last=False)[1][1])
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def evict(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def ensure_listener(self):
+        """Start the listener thread in this process (again after a fork)."""
+        pid = os.getpid()
+        if self._pid == pid or not self.listen:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self.listening = False
+            self._entries.clear()
+            self._bytes = 0
+            self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name=f'cache-listener-{self.channel}', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the listener and wait for it to disconnect; the next use starts a new one."""
+        with self._lock:
+            self._pid = None
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2 import sql
+        wrapper = connections[self.database]
+        conn = psycopg2.connect(**wrapper.get_connection_params())
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(self.channel)))
+        return conn
+
+    def _listen(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self.clear()
+                self.listening = True
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], POLL_INTERVAL) == ([], [], []):
+                        # Idle: make sure the connection is still alive
+                        with conn.cursor() as cursor:
+                            cursor.execute('SELECT 1')
+                    conn.poll()
+                    keys = []
+                    for notify in conn.notifies:
+                        if notify.payload == CLEAR_ALL:
+                            self.clear()
+                        else:
+                            keys.extend(json.loads(notify.payload))
+                    conn.notifies.clear()
+                    if keys:
+                        self.stats['invalidations'] += len(keys)
+                        self.evict(keys)
+            except Exception as e:
+                logger.warning('Cache invalidation listener on %s failed: %s', self.channel, e)
+                self._stop.wait(RECONNECT_DELAY)
+            finally:
+                self.listening = False
+                self.clear()
+                if conn is not None:
+                    conn.close()
+                    self.stats['disconnects'] += 1
+
+    def publish(self, keys):
+        """NOTIFY keys to every process; sent when the current transaction commits."""
+        with connections[self.database].cursor() as cursor:
+            chunk, size = [], 0
+            for key in keys:
+                if chunk and size + len(key) > MAX_PAYLOAD:
+                    cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, json.dumps(chunk)])
+                    chunk, size = [], 0
+                chunk.append(key)
+                size += len(key) + 4
+            if chunk:
+                cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, json.dumps(chunk)])
+
+    def publish_clear(self):
+        with connections[self.database].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, CLEAR_ALL])
+
+    def snapshot(self):
+        with self._lock:
+            return dict(
+                self.stats, entries=len(self._entries), bytes=self._bytes, listening=self.listening
+            )
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+_listeners_enabled = True
+
+
+def disable_listeners():
+    """Keep tiers created from now on out of use, e.g. where test transactions roll back L2."""
+    global _listeners_enabled
+    _listeners_enabled = False
+
+
+def stop_listeners():
+    """Stop every listener thread in this process, e.g. before its database is dropped."""
+    for tier in list(_tiers.values()):
+        tier.stop()
+
+
+def get_local_tier(channel, **options):
+    """Return this process's LocalTier for a channel, created on first use."""
+    tier = _tiers.get(channel)
+    if tier is None:
+        with _tiers_lock:
+            tier = _tiers.get(channel)
+            if tier is None:
+                tier = _tiers[channel] = LocalTier(channel, listen=_listeners_enabled, **options)
+    return tier
+
+
+class TieredCache(BaseCache):
+    """
+    Cache backend serving reads from a LocalTier in front of the cache alias in LOCATION.
+
+    Keys, versions and timeouts are those of the shared cache.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._shared_alias = location
+        options = params.get('OPTIONS', {})
+        self.tier = get_local_tier(
+            options.get('CHANNEL', 'cache_invalidation'),
+            database=options.get('DATABASE', 'default'),
+            max_entries=options.get('MAX_ENTRIES', 500),
+            max_bytes=options.get('MAX_BYTES', 16 * 1024 * 1024),
+            max_age=options.get('MAX_AGE', 60),
+        )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _changed(self, keys, version=None):
+        cache_keys = [self.shared.make_key(key, version=version) for key in keys]
+        self.tier.evict(cache_keys)
+        self.tier.publish(cache_keys)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        self.tier.ensure_listener()
+        if not self.tier.listening:
+            return self.shared.get_many(keys, version=version)
+        found = {}
+        missing = {}
+        for key in keys:
+            cache_key = self.shared.make_key(key, version=version)
+            value = self.tier.get(cache_key)
+            if value is _MISSING:
+                missing[key] = cache_key
+            else:
+                found[key] = value
+        if missing:
+            generation = self.tier.generation
+            fetched = self.shared.get_many(list(missing), version=version)
+            for key, value in fetched.items():
+                self.tier.put(missing[key], value, generation)
+            found.update(fetched)
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._changed([key], version)
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._changed([key], version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self._changed(list(data), version)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._changed([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        self._changed([key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self._changed(keys, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        self.shared.clear()
+        self.tier.clear()
+        self.tier.publish_clear()
+
+
+def invalidate(*keys):
+    """
+    Drop keys from the tiered cache in every process.
+
+    Call from model signals. The keys are deleted at once and again after
+    the transaction commits, in case another request refilled them from the
+    old rows in between.
+    """
+    caches[TIERED_CACHE_ALIAS].delete_many(keys)
+    if connections['default'].in_atomic_block:
+        transaction.on_commit(lambda: caches[TIERED_CACHE_ALIAS].delete_many(keys))
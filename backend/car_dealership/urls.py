@@ -2,10 +2,11 @@
 URL configuration for car_dealership project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from .health import HealthCheckView
+from .media import serve_media
 
 # Customize admin site headers
 admin.site.site_header = "Car Dealership Administration"
@@ -20,8 +21,10 @@ urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health-check'),
 ]
 
-# Serve media files (for development and demo)
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Serve media files (streamed by Django, or handed off to nginx via X-Accel-Redirect)
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
+]
 
 # Serve static files in development
 if settings.DEBUG:
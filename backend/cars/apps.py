@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CarsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cars'
+    
+    def ready(self):
+        # Connect signal handlers that keep Car.primary_image in sync
+        import cars.signals
@@ -0,0 +1,172 @@
+"""
+Benchmarks for the car image optimization pipeline.
+
+Generates synthetic uploads in the modes and sizes dealers actually send
+(large camera JPEGs, RGBA and palette PNGs), runs them through
+optimize_image() and reports throughput, p95 latency and peak memory.
+Each case has thresholds; a run that exceeds them is reported as a
+regression.
+"""
+
+import ctypes
+import ctypes.util
+import math
+import re
+import time
+import tracemalloc
+from io import BytesIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from .models import optimize_image
+
+
+# Thresholds are deliberately generous (roughly 3x a typical run on one
+# modern core) so they catch regressions such as an extra full-size copy or
+# a slower resampling filter, not machine-to-machine noise.
+BENCHMARK_CASES = [
+    {
+        'name': 'jpeg_4000x3000',
+        'mode': 'RGB',
+        'size': (4000, 3000),
+        'format': 'JPEG',
+        'max_p95_ms': 1000,
+        'max_peak_mb': 200,
+    },
+    {
+        'name': 'jpeg_1280x720',
+        'mode': 'RGB',
+        'size': (1280, 720),
+        'format': 'JPEG',
+        'max_p95_ms': 80,
+        'max_peak_mb': 40,
+    },
+    {
+        'name': 'png_rgba_2400x1600',
+        'mode': 'RGBA',
+        'size': (2400, 1600),
+        'format': 'PNG',
+        'max_p95_ms': 1000,
+        'max_peak_mb': 150,
+    },
+    {
+        'name': 'png_palette_1600x1200',
+        'mode': 'P',
+        'size': (1600, 1200),
+        'format': 'PNG',
+        'max_p95_ms': 400,
+        'max_peak_mb': 100,
+    },
+]
+
+
+def make_synthetic_image(mode, size, fmt):
+    """Encode a photo-like test image (gradient plus sensor noise) to bytes."""
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.merge('RGB', [Image.effect_noise(size, sigma) for sigma in (30, 45, 60)])
+    img = Image.blend(noise, Image.merge('RGB', [gradient] * 3), 0.6)
+
+    if mode == 'RGBA':
+        img.putalpha(gradient)
+    elif mode == 'P':
+        img = img.quantize(colors=256)
+
+    output = BytesIO()
+    img.save(output, format=fmt)
+    return output.getvalue()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class PeakMemory:
+    """
+    Measure peak memory growth over a block of code.
+
+    Pillow allocates pixel buffers outside the Python allocator, so on Linux
+    this resets and reads the process high-water mark (VmHWM). Elsewhere it
+    falls back to tracemalloc, which only sees Python allocations.
+    """
+
+    STATUS_PATH = '/proc/self/status'
+    CLEAR_REFS_PATH = '/proc/self/clear_refs'
+
+    def __init__(self):
+        self.peak_bytes = 0
+        self._baseline = 0
+        self._use_proc = True
+
+    def _read_status_kb(self, field):
+        with open(self.STATUS_PATH) as f:
+            match = re.search(rf'^{field}:\s+(\d+) kB', f.read(), re.MULTILINE)
+        return int(match.group(1)) if match else 0
+
+    def _release_free_memory(self):
+        # Hand memory freed by earlier cases back to the OS so it is not
+        # silently reused below the baseline
+        libc_name = ctypes.util.find_library('c')
+        if libc_name:
+            try:
+                ctypes.CDLL(libc_name).malloc_trim(0)
+            except AttributeError:
+                pass  # Not glibc
+
+    def __enter__(self):
+        try:
+            self._release_free_memory()
+            with open(self.CLEAR_REFS_PATH, 'w') as f:
+                f.write('5')  # Reset the peak RSS counter
+            self._baseline = self._read_status_kb('VmRSS')
+        except OSError:
+            self._use_proc = False
+            tracemalloc.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._use_proc:
+            self.peak_bytes = max(0, self._read_status_kb('VmHWM') - self._baseline) * 1024
+        else:
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return False
+
+
+def run_case(case, iterations, tolerance=1.0):
+    """Benchmark one case and return its measurements and any regressions."""
+    extension = 'jpg' if case['format'] == 'JPEG' else case['format'].lower()
+    data = make_synthetic_image(case['mode'], case['size'], case['format'])
+    latencies = []
+
+    with PeakMemory() as memory:
+        for i in range(iterations):
+            upload = SimpleUploadedFile(f"bench{i}.{extension}", data)
+            start = time.perf_counter()
+            optimize_image(upload)
+            latencies.append(time.perf_counter() - start)
+
+    p95_ms = percentile(latencies, 95) * 1000
+    peak_mb = memory.peak_bytes / (1024 * 1024)
+    failures = []
+    if p95_ms > case['max_p95_ms'] * tolerance:
+        failures.append(f"p95 {p95_ms:.0f}ms > {case['max_p95_ms'] * tolerance:.0f}ms")
+    if peak_mb > case['max_peak_mb'] * tolerance:
+        failures.append(f"peak memory {peak_mb:.1f}MB > {case['max_peak_mb'] * tolerance:.0f}MB")
+
+    return {
+        'name': case['name'],
+        'iterations': iterations,
+        'input_kb': len(data) / 1024,
+        'throughput': iterations / sum(latencies),
+        'p95_ms': p95_ms,
+        'peak_mb': peak_mb,
+        'failures': failures,
+    }
+
+
+def run_benchmarks(iterations=5, names=None, tolerance=1.0):
+    """Run all (or the named) benchmark cases."""
+    cases = [case for case in BENCHMARK_CASES if not names or case['name'] in names]
+    return [run_case(case, iterations, tolerance) for case in cases]
@@ -0,0 +1,178 @@
+"""
+Cached CarViewSet responses with stale-while-revalidate and single-flight rebuilds.
+
+Responses are stored in the tiered cache under a key made of the request
+URL and the current cars generation. Saving or deleting a Car or CarImage
+bumps the generation (see signals.py), so every cached listing and detail
+is replaced at once without tracking which keys exist.
+
+Each entry is kept for HARD_TTL seconds but is fresh for only SOFT_TTL:
+- Fresh entries are served as they are.
+- For a stale entry, one request takes a lock in the shared cache and
+  rebuilds it. Concurrent requests, in any worker, are served the stale
+  entry meanwhile.
+- For a missing entry, e.g. right after an inventory change, one request
+  builds it. The others wait up to WAIT_TIMEOUT for that result instead
+  of all querying the database; they are counted as coalesced.
+"""
+
+import hashlib
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.utils.http import urlencode
+from car_dealership.tiered import TIERED_CACHE_ALIAS
+
+GENERATION_KEY = 'cars:generation'
+
+
+def _new_generation():
+    # Start from the clock, so entries cached under a lost generation are never reused
+    caches[TIERED_CACHE_ALIAS].add(GENERATION_KEY, time.time_ns() // 1000, None)
+
+
+def current_generation():
+    cache = caches[TIERED_CACHE_ALIAS]
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        _new_generation()
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        caches[TIERED_CACHE_ALIAS].incr(GENERATION_KEY)
+    except ValueError:
+        _new_generation()
+
+
+def on_commit_once(func):
+    """Run func when the current transaction commits, registering it only once per transaction."""
+    connection = connections['default']
+    if connection.in_atomic_block and any(entry[1] is func for entry in connection.run_on_commit):
+        return
+    transaction.on_commit(func)
+
+
+def invalidate_car_responses():
+    """
+    Retire every cached car response.
+
+    Bumped at once and again after the transaction commits, in case another
+    request cached a response built from the old rows in between.
+    """
+    bump_generation()
+    if connections['default'].in_atomic_block:
+        on_commit_once(bump_generation)
+
+
+def response_key(request):
+    """Cache key for a request: scheme, host, path and sorted query parameters."""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f'{request.build_absolute_uri(request.path)}?{query}'
+    return f'cars:{current_generation()}:{hashlib.sha1(url.encode()).hexdigest()}'
+
+
+class ResponseCache:
+    """Stale-while-revalidate cache with single-flight rebuilds and per-process counters."""
+
+    def __init__(self, soft_ttl=60, hard_ttl=600, lock_timeout=10, wait_timeout=3.0, poll_interval=0.05):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'stale_hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'coalesced': 0,
+            'wait_timeouts': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get_or_build(self, key, build):
+        """Return the cached data for key, calling build() in at most one request at a time."""
+        cache = caches[TIERED_CACHE_ALIAS]
+        entry = cache.get(key)
+        if entry is not None and time.time() < entry['fresh_until']:
+            self._count('hits')
+            return entry['data']
+
+        # Locks live only in the shared cache; they must not be served from worker memory
+        locks = caches[DEFAULT_CACHE_ALIAS]
+        lock_key = f'{key}:lock'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while not locks.add(lock_key, token, self.lock_timeout):
+            if entry is not None:
+                # Another request is refreshing it
+                self._count('stale_hits')
+                return entry['data']
+            if not waited:
+                self._count('coalesced')
+                waited = True
+            if time.monotonic() >= deadline:
+                self._count('wait_timeouts')
+                return build()
+            time.sleep(self.poll_interval)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['data']
+
+        try:
+            if waited:
+                # The request we waited for may have finished just before we took the lock
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry['data']
+            self._count('refreshes' if entry is not None else 'misses')
+            data = build()
+            cache.set(key, {'data': data, 'fresh_until': time.time() + self.soft_ttl}, self.hard_ttl)
+            return data
+        finally:
+            if locks.get(lock_key) == token:
+                locks.delete(lock_key)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Return this process's response cache, configured from CAR_RESPONSE_CACHE."""
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                config = getattr(settings, 'CAR_RESPONSE_CACHE', {})
+                _response_cache = ResponseCache(
+                    soft_ttl=config.get('SOFT_TTL', 60),
+                    hard_ttl=config.get('HARD_TTL', 600),
+                    lock_timeout=config.get('LOCK_TIMEOUT', 10),
+                    wait_timeout=config.get('WAIT_TIMEOUT', 3.0),
+                )
+    return _response_cache
+
+
+@receiver(setting_changed)
+def _reset_response_cache(setting, **kwargs):
+    global _response_cache
+    if setting == 'CAR_RESPONSE_CACHE':
+        _response_cache = None
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+from PIL import Image
+from cars.models import CarImage, generate_placeholder
+
+
+class Command(BaseCommand):
+    """Generate inline placeholders for car images uploaded before they existed."""
+
+    help = 'Backfill low-quality image placeholders for existing car images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of images to update per query (default: 100)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate placeholders for images that already have one',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        queryset = CarImage.objects.only('id', 'image', 'placeholder').order_by('id')
+        if not options['force']:
+            queryset = queryset.filter(placeholder='')
+
+        updated = 0
+        failed = 0
+        batch = []
+
+        for car_image in queryset.iterator(chunk_size=batch_size):
+            try:
+                with car_image.image.open('rb') as f:
+                    img = Image.open(f)
+                    img.draft('RGB', (img.width // 8 or 1, img.height // 8 or 1))
+                    car_image.placeholder = generate_placeholder(img)
+            except (OSError, ValueError) as e:
+                failed += 1
+                self.stderr.write(f'Skipping image {car_image.id}: {e}')
+                continue
+
+            # Update only the placeholder column; CarImage.save() would re-encode the photo
+            batch.append(car_image)
+            if len(batch) >= batch_size:
+                CarImage.objects.bulk_update(batch, ['placeholder'])
+                updated += len(batch)
+                batch = []
+
+        if batch:
+            CarImage.objects.bulk_update(batch, ['placeholder'])
+            updated += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {updated} placeholder(s), {failed} failed.'
+        ))
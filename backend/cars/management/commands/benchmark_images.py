@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from cars.benchmarks import BENCHMARK_CASES, run_benchmarks
+
+
+class Command(BaseCommand):
+    """Benchmark the image optimization pipeline and fail on regressions."""
+
+    help = 'Measure throughput, p95 latency and peak memory of car image processing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5,
+            help='Images processed per case (default: 5)',
+        )
+        parser.add_argument(
+            '--case',
+            action='append',
+            choices=[case['name'] for case in BENCHMARK_CASES],
+            help='Only run the named case (can be repeated)',
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=1.0,
+            help='Multiply all thresholds, e.g. 2.0 on slow CI machines (default: 1.0)',
+        )
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            iterations=options['iterations'],
+            names=options['case'],
+            tolerance=options['tolerance'],
+        )
+
+        self.stdout.write(
+            f"{'case':<24}{'input':>10}{'img/s':>9}{'p95':>10}{'peak mem':>11}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['name']:<24}"
+                f"{result['input_kb']:>8.0f}KB"
+                f"{result['throughput']:>9.2f}"
+                f"{result['p95_ms']:>8.0f}ms"
+                f"{result['peak_mb']:>9.1f}MB"
+            )
+
+        failures = [
+            f"{result['name']}: {failure}"
+            for result in results
+            for failure in result['failures']
+        ]
+        if failures:
+            raise CommandError('Performance regression:\n  ' + '\n  '.join(failures))
+
+        self.stdout.write(self.style.SUCCESS('All image benchmarks within thresholds.'))
@@ -0,0 +1,130 @@
+import heapq
+import os
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from cars.models import CarImage
+
+
+class Command(BaseCommand):
+    """
+    Find and delete car image files that no CarImage row references.
+
+    Deleting cars or images removes the rows but leaves files in
+    MEDIA_ROOT/cars/. The directory is scanned in name order from a
+    cursor kept in the shared cache (never in the publicly served media
+    tree), so large volumes are reconciled over several runs, and each
+    batch of names is checked with a single query. Each run reads the
+    directory once but only keeps and sorts the next --limit names.
+    """
+
+    help = 'Reclaim disk space from orphaned car image files (dry run unless --delete)'
+
+    UPLOAD_DIR = 'cars'
+    CURSOR_KEY = 'cars:orphan_scan_cursor'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete orphaned files (default is to only report them)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=5000,
+            help='Maximum files to examine in this run (default: 5000)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Files checked against the database per query (default: 500)',
+        )
+        parser.add_argument(
+            '--min-age-hours',
+            type=float,
+            default=24,
+            help='Ignore files newer than this, e.g. uploads still being saved (default: 24)',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Restart the scan from the beginning of the directory',
+        )
+
+    def handle(self, *args, **options):
+        upload_root = os.path.join(settings.MEDIA_ROOT, self.UPLOAD_DIR)
+        if not os.path.isdir(upload_root):
+            self.stdout.write('No media directory to scan.')
+            return
+
+        cursor = '' if options['reset'] else cache.get(self.CURSOR_KEY, '')
+        cutoff = time.time() - options['min_age_hours'] * 3600
+        batch_size = options['batch_size']
+
+        pending = 0
+
+        def after_cursor():
+            nonlocal pending
+            with os.scandir(upload_root) as entries:
+                for entry in entries:
+                    if entry.name > cursor:
+                        pending += 1
+                        yield entry.name
+
+        # Bounded heap: only the next --limit names are held in memory
+        to_scan = heapq.nsmallest(options['limit'], after_cursor())
+
+        scanned = 0
+        orphan_count = 0
+        orphan_bytes = 0
+        for start in range(0, len(to_scan), batch_size):
+            batch = to_scan[start:start + batch_size]
+            orphans = self._find_orphans(upload_root, batch, cutoff)
+            scanned += len(batch)
+            orphan_count += len(orphans)
+            orphan_bytes += sum(size for path, size in orphans)
+
+            if options['delete']:
+                for path, size in orphans:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+            # Persist progress after every batch so an interrupted run resumes here
+            cache.set(self.CURSOR_KEY, batch[-1], None)
+
+        finished = len(to_scan) == pending
+        if finished:
+            cache.delete(self.CURSOR_KEY)
+
+        action = 'Deleted' if options['delete'] else 'Found'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} file(s). {action} {orphan_count} orphan(s), '
+            f'{orphan_bytes / (1024 * 1024):.1f}MB reclaimable.'
+        ))
+        if not finished:
+            self.stdout.write(f'{pending - len(to_scan)} file(s) left; run again to continue.')
+
+    def _find_orphans(self, upload_root, names, cutoff):
+        """Return (path, size) for files in names that no CarImage references."""
+        stored_names = [f'{self.UPLOAD_DIR}/{name}' for name in names]
+        referenced = set(
+            CarImage.objects.filter(image__in=stored_names).values_list('image', flat=True)
+        )
+
+        orphans = []
+        for name, stored_name in zip(names, stored_names):
+            if stored_name in referenced:
+                continue
+            path = os.path.join(upload_root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if os.path.isfile(path) and stat.st_mtime < cutoff:
+                orphans.append((path, stat.st_size))
+        return orphans
@@ -0,0 +1,66 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from cars.caching import bump_generation
+from cars.warming import default_hosts, default_scheme, homepage_paths, warm, warm_paths
+
+
+class Command(BaseCommand):
+    """Pre-render the most requested car responses into the cache, e.g. after a deploy."""
+
+    help = 'Render homepage lists, facets, common searches and featured cars into the response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help="Concurrent renders (default: CACHE_WARMING['WORKERS'])",
+        )
+        parser.add_argument(
+            '--host',
+            action='append',
+            help='Host the site is served as (can be repeated; default: ALLOWED_HOSTS)',
+        )
+        parser.add_argument(
+            '--scheme',
+            choices=['http', 'https'],
+            help='Scheme requests reach Django with (default: https if SECURE_PROXY_SSL_HEADER is set)',
+        )
+        parser.add_argument(
+            '--homepage-only',
+            action='store_true',
+            help="Only the homepage lists and featured cars' details",
+        )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Retire existing cached responses first, e.g. after a deploy that changes their content',
+        )
+
+    def handle(self, *args, **options):
+        hosts = options['host'] or default_hosts()
+        if not hosts:
+            raise CommandError('No host to warm; pass --host or set CACHE_WARMING["HOSTS"]')
+        if options['refresh']:
+            bump_generation()
+
+        paths = homepage_paths() if options['homepage_only'] else warm_paths()
+        start = time.perf_counter()
+        results = warm(paths, hosts=hosts, scheme=options['scheme'] or default_scheme(), workers=options['workers'])
+        elapsed = time.perf_counter() - start
+
+        if options['verbosity'] >= 2:
+            for result in results:
+                self.stdout.write(f"{result['status']:>4} {result['ms']:>8.1f}ms  {result['host']}{result['path']}")
+
+        failed = [result for result in results if result['status'] != 200]
+        slowest = max(results, key=lambda result: result['ms'], default=None)
+        self.stdout.write(
+            f'Warmed {len(results) - len(failed)} of {len(results)} responses '
+            f'for {len(hosts)} host(s) in {elapsed:.2f}s'
+            + (f" (slowest {slowest['ms']:.0f}ms: {slowest['path']})" if slowest else '')
+        )
+        for result in failed:
+            self.stderr.write(f"{result['status']} {result['host']}{result['path']}")
+        if failed:
+            raise CommandError(f'{len(failed)} responses could not be rendered')
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0007_alter_car_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carimage',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False, help_text='Tiny base64 JPEG preview shown while the full image loads'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fix_primary_images(apps, schema_editor):
+    """Keep at most one primary image per car and fill in Car.primary_image."""
+    Car = apps.get_model('cars', 'Car')
+    CarImage = apps.get_model('cars', 'CarImage')
+
+    for car in Car.objects.filter(images__isnull=False).distinct().iterator():
+        images = CarImage.objects.filter(car=car).order_by('-is_primary', 'order', 'uploaded_at')
+        cover = images.first()
+        images.filter(is_primary=True).exclude(pk=cover.pk).update(is_primary=False)
+        Car.objects.filter(pk=car.pk).update(primary_image=cover)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0008_carimage_placeholder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Cover image (denormalized, maintained by CarImage)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='cars.carimage'),
+        ),
+        migrations.RunPython(fix_primary_images, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='carimage',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_primary', True)), fields=('car',), name='one_primary_image_per_car'),
+        ),
+    ]
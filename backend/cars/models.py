@@ -1,13 +1,20 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
 from django.core.exceptions import ValidationError
 from PIL import Image
 from io import BytesIO
 from django.core.files.uploadedfile import InMemoryUploadedFile
+import base64
+import hashlib
+import os
 import sys
 import re
 
 
+# Longest edge of the low-quality image placeholder (LQIP) in pixels
+PLACEHOLDER_SIZE = 20
+
+
 def validate_brand_model(value):
     """Validate that brand/model contains only allowed characters."""
     if not re.match(r'^[a-zA-Z0-9\s\-\.]+$', value):
@@ -31,6 +38,67 @@ def validate_vin(value):
             raise ValidationError('VIN must contain only letters (excluding I, O, Q) and numbers.')
 
 
+def generate_placeholder(img):
+    """
+    Build a tiny blurred JPEG preview of an RGB image as a data URI.
+    
+    The result is small enough (well under 1KB) to be returned inline
+    with listings so the frontend can paint it before the full photo loads.
+    """
+    thumb = img.copy()
+    if thumb.mode != 'RGB':
+        thumb = thumb.convert('RGB')
+    thumb.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BILINEAR)
+    output = BytesIO()
+    thumb.save(output, format='JPEG', quality=40, optimize=True)
+    encoded = base64.b64encode(output.getvalue()).decode('ascii')
+    return f"data:image/jpeg;base64,{encoded}"
+
+
+def optimize_image(image_file):
+    """
+    Convert an uploaded image to an optimized JPEG.
+    
+    Returns the optimized file (content-hashed name, max 1920x1080) and its
+    inline placeholder.
+    """
+    img = Image.open(image_file)
+    
+    # Convert RGBA to RGB if necessary
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+        img = background
+    
+    # Resize if image is too large (max 1920x1080)
+    max_size = (1920, 1080)
+    if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
+        img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    
+    # Precompute the inline placeholder once, at processing time
+    placeholder = generate_placeholder(img)
+    
+    # Save optimized image
+    output = BytesIO()
+    img.save(output, format='JPEG', quality=85, optimize=True)
+    output.seek(0)
+    
+    # Content-hashed filename so the file can be cached as immutable
+    stem = os.path.splitext(os.path.basename(image_file.name))[0]
+    digest = hashlib.sha256(output.getbuffer()).hexdigest()[:12]
+    
+    # Wrap the optimized bytes as an upload for the storage backend
+    optimized = InMemoryUploadedFile(
+        output, 'ImageField',
+        f"{stem}.{digest}.jpg",
+        'image/jpeg',
+        sys.getsizeof(output), None
+    )
+    return optimized, placeholder
+
+
 class Car(models.Model):
     """Model representing a car in the dealership inventory."""
     
@@ -143,6 +211,15 @@ class Car(models.Model):
     )
     is_featured = models.BooleanField(default=False)
     is_available = models.BooleanField(default=True)
+    primary_image = models.ForeignKey(
+        'CarImage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='+',
+        help_text="Cover image (denormalized, maintained by CarImage)"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -179,13 +256,14 @@ class Car(models.Model):
     @property
     def get_image_url(self):
         """Return primary image URL."""
-        primary_image = self.images.filter(is_primary=True).first()
-        if primary_image:
-            return primary_image.image.url
-        first_image = self.images.first()
-        if first_image:
-            return first_image.image.url
+        if self.primary_image_id:
+            return self.primary_image.image.url
         return None
+    
+    def refresh_primary_image(self):
+        """Recompute the cover image: the primary image, else the first image."""
+        self.primary_image = self.images.first()
+        Car.objects.filter(pk=self.pk).update(primary_image=self.primary_image)
 
 
 class CarImage(models.Model):
@@ -196,50 +274,50 @@ class CarImage(models.Model):
     is_primary = models.BooleanField(default=False, help_text="Set as primary/cover image")
     caption = models.CharField(max_length=200, blank=True, help_text="Optional image caption")
     order = models.PositiveIntegerField(default=0, help_text="Display order")
+    placeholder = models.TextField(
+        blank=True,
+        editable=False,
+        help_text="Tiny base64 JPEG preview shown while the full image loads"
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-is_primary', 'order', 'uploaded_at']
         verbose_name = 'Car Image'
         verbose_name_plural = 'Car Images'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['car'],
+                condition=models.Q(is_primary=True),
+                name='one_primary_image_per_car',
+            ),
+        ]
     
     def __str__(self):
         return f"Image for {self.car.full_name} - {'Primary' if self.is_primary else 'Additional'}"
     
     def save(self, *args, **kwargs):
-        """Save with image optimization."""
-        # Ensure only one primary image per car
-        if self.is_primary:
-            CarImage.objects.filter(car=self.car, is_primary=True).update(is_primary=False)
+        """Save with image optimization and keep the car's cover image in sync."""
+        # Optimize newly uploaded images; stored files are immutable and never re-encoded
+        if self.image and not self.image._committed:
+            self.image, self.placeholder = optimize_image(self.image)
         
-        # Optimize image before saving
-        if self.image:
-            img = Image.open(self.image)
+        with transaction.atomic():
+            # Lock the car row so concurrent saves cannot both claim primary
+            car = Car.objects.select_for_update(of=('self',)).select_related(
+                'primary_image'
+            ).get(pk=self.car_id)
+            cover = car.primary_image
             
-            # Convert RGBA to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
+            # Demote the previous primary only when it actually changes
+            if self.is_primary and cover is not None and cover.pk != self.pk and cover.is_primary:
+                CarImage.objects.filter(pk=cover.pk).update(is_primary=False)
             
-            # Resize if image is too large (max 1920x1080)
-            max_size = (1920, 1080)
-            if img.size[0] > max_size[0] or img.size[1] > max_size[1]:
-                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            super().save(*args, **kwargs)
             
-            # Save optimized image
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=85, optimize=True)
-            output.seek(0)
-            
-            # Replace the image file with optimized version
-            self.image = InMemoryUploadedFile(
-                output, 'ImageField',
-                f"{self.image.name.split('.')[0]}.jpg",
-                'image/jpeg',
-                sys.getsizeof(output), None
-            )
-        
-        super().save(*args, **kwargs)
+            if self.is_primary or cover is None:
+                if car.primary_image_id != self.pk:
+                    Car.objects.filter(pk=car.pk).update(primary_image=self)
+            elif cover.pk == self.pk or not cover.is_primary:
+                # Demoted, or the car has no primary and falls back to the first image
+                car.refresh_primary_image()
@@ -7,8 +7,8 @@ class CarImageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = CarImage
-        fields = ['id', 'image', 'is_primary', 'caption', 'order', 'uploaded_at']
-        read_only_fields = ['id', 'uploaded_at']
+        fields = ['id', 'image', 'placeholder', 'is_primary', 'caption', 'order', 'uploaded_at']
+        read_only_fields = ['id', 'placeholder', 'uploaded_at']
 
 
 class CarSerializer(serializers.ModelSerializer):
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .caching import invalidate_car_responses
+from .warming import schedule_homepage_warm
+from .models import Car, CarImage
+
+
+@receiver(post_delete, sender=CarImage)
+def refresh_cover_after_image_delete(sender, instance, **kwargs):
+    """Pick a new cover image when the current one is deleted."""
+    # The primary_image FK is SET_NULL, so only cars that just lost their cover match
+    car = Car.objects.filter(pk=instance.car_id, primary_image__isnull=True).first()
+    if car is not None:
+        car.refresh_primary_image()
+
+
+@receiver(post_save, sender=Car)
+@receiver(post_delete, sender=Car)
+@receiver(post_save, sender=CarImage)
+@receiver(post_delete, sender=CarImage)
+def invalidate_cached_responses(sender, **kwargs):
+    """Retire cached car listings and details after a car or image changes, then re-render the homepage."""
+    invalidate_car_responses()
+    schedule_homepage_warm()
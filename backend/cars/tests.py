@@ -1,11 +1,62 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.core.exceptions import ValidationError
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.http import Http404
 from decimal import Decimal
+from io import BytesIO, StringIO
+from PIL import Image
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+from analytics.models import CarPopularity
+from .caching import ResponseCache, get_response_cache
 from .models import Car, CarImage
 
 
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+# Keeps throttle counters out of assertNumQueries
+LOCMEM_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tiered': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
+
+
+def make_image_file(name='photo.png', size=(400, 300), mode='RGB', fmt='PNG'):
+    """Build an in-memory uploaded image for tests."""
+    output = BytesIO()
+    Image.new(mode, size, 'red' if mode != 'P' else 1).save(output, format=fmt)
+    return SimpleUploadedFile(name, output.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+def make_car(**kwargs):
+    """Create a car with sensible defaults for tests."""
+    defaults = dict(
+        brand='Toyota',
+        model='Yaris',
+        year=2021,
+        price=15000.00,
+        mileage=20000,
+        transmission='manual',
+        fuel_type='petrol',
+        engine_size=1.5,
+        horsepower=110,
+        color='red',
+        doors=4,
+        seats=5,
+        condition='used',
+    )
+    defaults.update(kwargs)
+    return Car.objects.create(**defaults)
+
+
 class CarModelTest(TestCase):
     """Test cases for Car model."""
     
@@ -269,3 +320,447 @@ class CarAPITest(APITestCase):
         """Test getting latest cars."""
         response = self.client.get('/api/cars/latest/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_featured_list_is_cached_until_a_car_changes(self):
+        """Test the featured list is served from the cache and rebuilt once a car is saved."""
+        self.car1.is_featured = True
+        self.car1.save()
+        stats = get_response_cache().stats
+        response = self.client.get('/api/cars/featured/')
+        self.assertEqual([car['id'] for car in response.data], [self.car1.id])
+        hits = stats['hits']
+        self.assertEqual(self.client.get('/api/cars/featured/').data, response.data)
+        self.assertEqual(stats['hits'], hits + 1)
+        
+        self.car2.is_featured = True
+        self.car2.save()
+        response = self.client.get('/api/cars/featured/')
+        self.assertEqual({car['id'] for car in response.data}, {self.car1.id, self.car2.id})
+        self.assertEqual(stats['hits'], hits + 1)
+    
+    def test_cached_responses_are_keyed_by_query(self):
+        """Test differently filtered listings are cached separately, whatever the parameter order."""
+        honda = self.client.get('/api/cars/?brand=Honda&ordering=price')
+        toyota = self.client.get('/api/cars/?brand=Toyota&ordering=price')
+        self.assertEqual([car['brand'] for car in honda.data['results']], ['Honda'])
+        self.assertEqual([car['brand'] for car in toyota.data['results']], ['Toyota'])
+        self.assertEqual(self.client.get('/api/cars/?ordering=price&brand=Honda').data, honda.data)
+    
+    def test_ordering_by_popularity(self):
+        """Test cars can be sorted by recent views, unviewed cars last."""
+        CarPopularity.objects.create(car=self.car2, total_views=3, recent_views=3)
+        response = self.client.get('/api/cars/?ordering=-popularity')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([car['id'] for car in response.data['results']], [self.car2.id, self.car1.id])
+    
+    def test_popular_cars_endpoint(self):
+        """Test the popular action ranks viewed cars by the chosen window."""
+        CarPopularity.objects.create(car=self.car1, total_views=100, recent_views=1)
+        CarPopularity.objects.create(car=self.car2, total_views=10, recent_views=5)
+        response = self.client.get('/api/cars/popular/')
+        self.assertEqual([car['id'] for car in response.data], [self.car2.id, self.car1.id])
+        response = self.client.get('/api/cars/popular/?period=all&limit=1')
+        self.assertEqual([car['id'] for car in response.data], [self.car1.id])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class CarImagePlaceholderTest(APITestCase):
+    """Test cases for precomputed image placeholders."""
+    
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+    
+    def setUp(self):
+        self.car = make_car()
+    
+    def test_placeholder_generated_on_save(self):
+        """Test saving an image stores a tiny inline JPEG placeholder."""
+        car_image = CarImage.objects.create(car=self.car, image=make_image_file(mode='RGBA'))
+        self.assertTrue(car_image.placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(car_image.placeholder), 1500)
+    
+    def test_placeholder_in_list_response(self):
+        """Test listings return the placeholder inline with each image."""
+        CarImage.objects.create(car=self.car, image=make_image_file(), is_primary=True)
+        response = self.client.get('/api/cars/')
+        image_data = response.data['results'][0]['images'][0]
+        self.assertTrue(image_data['placeholder'].startswith('data:image/jpeg;base64,'))
+    
+    def test_backfill_command(self):
+        """Test backfill fills in placeholders missing from existing images."""
+        car_image = CarImage.objects.create(car=self.car, image=make_image_file())
+        CarImage.objects.filter(pk=car_image.pk).update(placeholder='')
+        
+        out = StringIO()
+        call_command('backfill_image_placeholders', stdout=out)
+        
+        car_image.refresh_from_db()
+        self.assertTrue(car_image.placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertIn('Generated 1 placeholder(s)', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class MediaDeliveryTest(APITestCase):
+    """Test cases for hashed image filenames and media delivery modes."""
+    
+    def setUp(self):
+        self.car = make_car()
+        self.car_image = CarImage.objects.create(car=self.car, image=make_image_file('front.png'))
+        self.path = self.car_image.image.name
+    
+    def test_filename_is_content_hashed(self):
+        """Test optimized uploads get a content-hashed JPEG filename."""
+        self.assertRegex(self.path, r'^cars/front\.[0-9a-f]{12}(_\w+)?\.jpg$')
+    
+    def test_resave_does_not_reencode(self):
+        """Test saving an existing image keeps the stored file untouched."""
+        self.car_image.caption = 'Front view'
+        self.car_image.save()
+        self.assertEqual(self.car_image.image.name, self.path)
+    
+    @override_settings(MEDIA_DELIVERY='x-accel')
+    def test_x_accel_redirect(self):
+        """Test x-accel mode hands the file off to nginx without streaming it."""
+        response = self.client.get(f'/media/{self.path}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.path}')
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response.content, b'')
+    
+    @override_settings(MEDIA_DELIVERY='x-accel')
+    def test_x_accel_missing_file(self):
+        """Test x-accel mode returns 404 for unknown files and traversal attempts."""
+        self.assertEqual(self.client.get('/media/cars/missing.jpg').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_django_delivery_sets_cache_headers(self):
+        """Test django mode streams the file with long-lived cache headers."""
+        response = self.client.get(f'/media/{self.path}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+    
+    def test_unhashed_files_are_not_immutable(self):
+        """Test files uploaded before content hashing get a short, revalidated lifetime."""
+        legacy = os.path.join(TEST_MEDIA_ROOT, 'cars', 'legacy.jpg')
+        with open(legacy, 'wb') as f:
+            f.write(b'jpeg')
+        self.addCleanup(os.remove, legacy)
+        for delivery in ['django', 'x-accel']:
+            with self.settings(MEDIA_DELIVERY=delivery):
+                response = self.client.get('/media/cars/legacy.jpg')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response['Cache-Control'], 'public, max-age=3600')
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class PrimaryImageTest(APITestCase):
+    """Test cases for the denormalized Car.primary_image cover."""
+    
+    def setUp(self):
+        self.car = make_car()
+    
+    def test_first_image_becomes_cover(self):
+        """Test a car's first image is its cover even if not flagged primary."""
+        first = CarImage.objects.create(car=self.car, image=make_image_file())
+        CarImage.objects.create(car=self.car, image=make_image_file(), order=1)
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.primary_image, first)
+    
+    def test_new_primary_demotes_previous(self):
+        """Test flagging a new primary demotes the old one and moves the cover."""
+        old = CarImage.objects.create(car=self.car, image=make_image_file(), is_primary=True)
+        new = CarImage.objects.create(car=self.car, image=make_image_file(), is_primary=True)
+        old.refresh_from_db()
+        self.car.refresh_from_db()
+        self.assertFalse(old.is_primary)
+        self.assertEqual(self.car.primary_image, new)
+        self.assertEqual(self.car.get_image_url, new.image.url)
+    
+    def test_deleting_cover_falls_back(self):
+        """Test deleting the cover image picks the next image."""
+        cover = CarImage.objects.create(car=self.car, image=make_image_file(), is_primary=True)
+        other = CarImage.objects.create(car=self.car, image=make_image_file(), order=1)
+        CarImage.objects.filter(pk=cover.pk).delete()
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.primary_image, other)
+    
+    def test_single_primary_enforced_by_database(self):
+        """Test the partial unique index rejects two primary images per car."""
+        from django.db import IntegrityError, transaction
+        image = CarImage.objects.create(car=self.car, image=make_image_file(), is_primary=True)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CarImage.objects.filter(pk=image.pk).update(is_primary=False)
+            CarImage.objects.bulk_create([
+                CarImage(car=self.car, image=image.image.name, is_primary=True),
+                CarImage(car=self.car, image=image.image.name, is_primary=True),
+            ])
+    
+    @override_settings(CACHES=LOCMEM_CACHE)
+    def test_list_query_count_independent_of_cars(self):
+        """Test listing cars does not issue queries per car for images."""
+        for _ in range(3):
+            car = make_car()
+            CarImage.objects.create(car=car, image=make_image_file(), is_primary=True)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/cars/')
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class ResponseCacheTest(TestCase):
+    """Test cases for stale-while-revalidate response caching."""
+    
+    def setUp(self):
+        self.responses = ResponseCache(soft_ttl=10, hard_ttl=100, wait_timeout=1, poll_interval=0.01)
+        self.builds = 0
+    
+    def build(self):
+        self.builds += 1
+        return {'build': self.builds}
+    
+    def test_fresh_entry_is_not_rebuilt(self):
+        """Test a response within SOFT_TTL is served without building it."""
+        self.assertEqual(self.responses.get_or_build('key', self.build), {'build': 1})
+        self.assertEqual(self.responses.get_or_build('key', self.build), {'build': 1})
+        self.assertEqual(self.responses.stats['misses'], 1)
+        self.assertEqual(self.responses.stats['hits'], 1)
+    
+    def test_stale_entry_is_rebuilt_by_one_request(self):
+        """Test a stale entry is rebuilt, or served stale while another request holds the lock."""
+        self.responses.get_or_build('key', self.build)
+        later = time.time() + 11
+        with mock.patch('cars.caching.time.time', return_value=later):
+            cache.add('key:lock', 'other request', 10)
+            self.assertEqual(self.responses.get_or_build('key', self.build), {'build': 1})
+            self.assertEqual(self.responses.stats['stale_hits'], 1)
+            cache.delete('key:lock')
+            self.assertEqual(self.responses.get_or_build('key', self.build), {'build': 2})
+            self.assertEqual(self.responses.stats['refreshes'], 1)
+        self.assertIsNone(cache.get('key:lock'))
+    
+    def test_missing_entry_waits_for_the_other_build(self):
+        """Test a request that finds another building the entry waits for its result."""
+        cache.add('key:lock', 'other request', 10)
+        
+        def finish_other_build(seconds):
+            caches['tiered'].set('key', {'data': 'theirs', 'fresh_until': time.time() + 10})
+        
+        with mock.patch('cars.caching.time.sleep', side_effect=finish_other_build):
+            self.assertEqual(self.responses.get_or_build('key', self.build), 'theirs')
+        self.assertEqual(self.builds, 0)
+        self.assertEqual(self.responses.stats['coalesced'], 1)
+    
+    def test_wait_timeout_builds_without_the_lock(self):
+        """Test a request stops waiting after WAIT_TIMEOUT and builds the response itself."""
+        cache.add('key:lock', 'other request', 10)
+        self.responses.wait_timeout = 0.05
+        self.assertEqual(self.responses.get_or_build('key', self.build), {'build': 1})
+        self.assertEqual(self.responses.stats['wait_timeouts'], 1)
+    
+    def test_failed_build_releases_the_lock(self):
+        """Test an exception in build() isn't cached and doesn't leave the lock held."""
+        def fail():
+            raise Http404
+        with self.assertRaises(Http404):
+            self.responses.get_or_build('key', fail)
+        self.assertIsNone(cache.get('key:lock'))
+        self.assertEqual(self.responses.get_or_build('key', self.build), {'build': 1})
+
+
+class ResponseCacheSingleFlightTest(TransactionTestCase):
+    """Test concurrent requests for a missing response build it once."""
+    
+    def test_concurrent_misses_build_once(self):
+        """Test requests arriving while the response is built wait for it instead of rebuilding."""
+        responses = ResponseCache(wait_timeout=5, poll_interval=0.01)
+        builds = []
+        results = []
+        barrier = threading.Barrier(6)
+        
+        def build():
+            builds.append(1)
+            time.sleep(0.2)
+            return ['cars']
+        
+        def request():
+            barrier.wait()
+            try:
+                results.append(responses.get_or_build('cars:herd', build))
+            finally:
+                connections.close_all()
+        
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        cache.delete('cars:herd')
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, [['cars']] * 6)
+        self.assertEqual(responses.stats['coalesced'], 5)
+
+
+@override_settings(CACHE_WARMING={'HOSTS': ['testserver'], 'WORKERS': 1, 'TOP_VALUES': 2})
+class CacheWarmingTest(APITestCase):
+    """Test cases for pre-rendering cached car responses."""
+    
+    def setUp(self):
+        self.featured = make_car(brand='Honda', is_featured=True)
+        self.other = make_car(brand='Toyota', fuel_type='diesel', body_type='suv')
+        self.stats = get_response_cache().stats
+    
+    def assert_cached(self, path):
+        hits = self.stats['hits']
+        self.assertEqual(self.client.get(path).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.stats['hits'], hits + 1, f'{path} was not cached')
+    
+    def test_command_warms_lists_searches_and_featured_details(self):
+        """Test warm_cache renders the homepage, facets, common searches and featured cars."""
+        out = StringIO()
+        call_command('warm_cache', '--workers=1', stdout=out)
+        self.assertIn('Warmed', out.getvalue())
+        for path in [
+            '/api/cars/featured/',
+            '/api/cars/latest/',
+            '/api/cars/',
+            '/api/cars/facets/',
+            '/api/cars/search/?brand=Honda',
+            '/api/cars/search/?fuel_type=diesel',
+            f'/api/cars/{self.featured.id}/',
+        ]:
+            self.assert_cached(path)
+    
+    def test_refresh_retires_cached_responses(self):
+        """Test --refresh rebuilds responses that were already cached."""
+        self.client.get('/api/cars/latest/')
+        misses = self.stats['misses']
+        call_command('warm_cache', '--homepage-only', '--refresh', stdout=StringIO())
+        self.assertGreater(self.stats['misses'], misses)
+    
+    def test_facets_count_available_cars(self):
+        """Test facet counts skip blank values and follow the list filters."""
+        make_car(brand='Honda', is_available=False)
+        response = self.client.get('/api/cars/facets/')
+        self.assertEqual(
+            response.data['brand'], [{'value': 'Honda', 'count': 1}, {'value': 'Toyota', 'count': 1}]
+        )
+        self.assertEqual(response.data['body_type'], [{'value': 'suv', 'count': 1}])
+        response = self.client.get('/api/cars/facets/?brand=Toyota')
+        self.assertEqual(response.data['fuel_type'], [{'value': 'diesel', 'count': 1}])
+        self.assertEqual(response.data['price'], {'min': '15000.00', 'max': '15000.00'})
+
+
+@override_settings(CACHE_WARMING={'HOSTS': ['testserver'], 'WORKERS': 1})
+class CacheWarmingOnCommitTest(TransactionTestCase):
+    """Test inventory changes re-render the homepage after they commit."""
+    
+    def tearDown(self):
+        # The cache table isn't flushed between transaction tests
+        cache.clear()
+    
+    def test_inventory_change_rewarms_homepage_once(self):
+        """Test a transaction saving several cars re-renders the homepage once, after commit, in the background."""
+        from . import warming
+        threads = []
+        
+        def record(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return original(*args, **kwargs)
+        
+        original = warming.warm
+        with mock.patch.object(warming, 'warm', side_effect=record) as warm:
+            with transaction.atomic():
+                car = make_car(is_featured=True)
+                make_car()
+                self.assertFalse(warm.called)
+            self.assertTrue(warming.get_homepage_warmer().wait(timeout=10))
+        warm.assert_called_once()
+        self.assertIsNot(threads[0], threading.current_thread())
+        stats = get_response_cache().stats
+        hits = stats['hits']
+        response = self.client.get('/api/cars/featured/')
+        self.assertEqual([item['id'] for item in response.data], [car.id])
+        self.assertEqual(stats['hits'], hits + 1)
+
+
+@tag('benchmark')
+class ImagePipelineBenchmarkTest(SimpleTestCase):
+    """
+    Performance regression checks for the image optimization pipeline.
+    
+    Only runs with: python manage.py test --tag=benchmark
+    """
+    
+    def test_percentile(self):
+        """Test nearest-rank percentile used for p95 latency."""
+        from .benchmarks import percentile
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([0.5], 95), 0.5)
+    
+    def test_pipeline_within_thresholds(self):
+        """Test every benchmark case stays within its latency and memory budget."""
+        from .benchmarks import run_benchmarks
+        # Extra tolerance for shared CI machines; the command uses strict thresholds
+        results = run_benchmarks(iterations=2, tolerance=2.0)
+        failures = [f"{r['name']}: {f}" for r in results for f in r['failures']]
+        self.assertEqual(failures, [])
+
+
+class OrphanedMediaCleanupTest(TestCase):
+    """Test cases for the orphaned media garbage collector."""
+    
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.car_image = CarImage.objects.create(car=make_car(), image=make_image_file())
+        self.orphans = []
+        for name in ('a_orphan.jpg', 'b_orphan.jpg'):
+            path = os.path.join(self.media_root, 'cars', name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 1024)
+            self.orphans.append(path)
+        # Age every file past the safety window
+        for name in os.listdir(os.path.join(self.media_root, 'cars')):
+            os.utime(os.path.join(self.media_root, 'cars', name), (0, 0))
+    
+    def run_cleanup(self, *args):
+        out = StringIO()
+        call_command('cleanup_orphaned_media', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_dry_run_reports_without_deleting(self):
+        """Test the default run only reports orphans."""
+        output = self.run_cleanup()
+        self.assertIn('Found 2 orphan(s)', output)
+        self.assertTrue(all(os.path.exists(path) for path in self.orphans))
+    
+    def test_delete_keeps_referenced_files(self):
+        """Test --delete removes orphans but keeps files still in use."""
+        self.run_cleanup('--delete')
+        self.assertFalse(any(os.path.exists(path) for path in self.orphans))
+        self.assertTrue(os.path.exists(self.car_image.image.path))
+    
+    def test_incremental_scan_resumes_from_cursor(self):
+        """Test a limited run resumes where the previous one stopped."""
+        first = self.run_cleanup('--delete', '--limit=1')
+        self.assertIn('Deleted 1 orphan(s)', first)
+        self.assertIn('2 file(s) left', first)
+        self.assertTrue(os.path.exists(self.orphans[1]))
+        
+        second = self.run_cleanup('--delete')
+        self.assertIn('Scanned 2 file(s). Deleted 1 orphan(s)', second)
+        self.assertFalse(os.path.exists(self.orphans[1]))
+        self.assertEqual(os.listdir(self.media_root), ['cars'])
+    
+    def test_recent_files_are_skipped(self):
+        """Test files newer than the safety window are never treated as orphans."""
+        os.utime(self.orphans[0], None)
+        output = self.run_cleanup('--delete')
+        self.assertIn('Deleted 1 orphan(s)', output)
+        self.assertTrue(os.path.exists(self.orphans[0]))
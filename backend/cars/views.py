@@ -2,7 +2,9 @@ from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.models import Count, Max, Min, Q
+from django.db.models.functions import Coalesce
+from .caching import get_response_cache, response_key
 from .models import Car
 from .serializers import CarSerializer, CarListSerializer
 from .filters import CarFilter
@@ -14,33 +16,105 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
     
     Provides list and detail views with filtering, searching, and ordering.
     """
-    queryset = Car.objects.filter(is_available=True)
+    # Cover image is joined in the main query; the image gallery is prefetched in one query
+    queryset = Car.objects.filter(is_available=True).select_related(
+        'primary_image'
+    ).prefetch_related('images')
     serializer_class = CarSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_class = CarFilter
     search_fields = ['brand', 'model', 'description', 'color']
-    ordering_fields = ['price', 'year', 'mileage', 'created_at']
+    ordering_fields = ['price', 'year', 'mileage', 'created_at', 'popularity']
     ordering = ['-created_at']
     
+    POPULAR_LIMIT = 10
+    MAX_POPULAR_LIMIT = 50
+    FACET_FIELDS = ['brand', 'fuel_type', 'body_type', 'transmission', 'condition']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if 'popularity' in self.request.query_params.get('ordering', ''):
+            # Counters are maintained by the analytics app; unviewed cars have no row
+            queryset = queryset.annotate(
+                popularity=Coalesce('popularity_stats__recent_views', 0)
+            )
+        return queryset
+    
     def get_serializer_class(self):
         """Use lightweight serializer for list view."""
         if self.action == 'list':
             return CarListSerializer
         return CarSerializer
     
+    def cached(self, build):
+        """Respond with build()'s data, cached per URL until the inventory changes (see caching.py)."""
+        return Response(get_response_cache().get_or_build(response_key(self.request), build))
+    
+    def list(self, request, *args, **kwargs):
+        return self.cached(lambda: super(CarViewSet, self).list(request, *args, **kwargs).data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(lambda: super(CarViewSet, self).retrieve(request, *args, **kwargs).data)
+    
     @action(detail=False, methods=['get'])
     def latest(self, request):
         """Get the 10 latest cars for the homepage."""
-        latest_cars = self.queryset.order_by('-created_at')[:10]
-        serializer = CarListSerializer(latest_cars, many=True)
-        return Response(serializer.data)
+        def build():
+            latest_cars = self.queryset.order_by('-created_at')[:10]
+            return CarListSerializer(latest_cars, many=True).data
+        return self.cached(build)
+    
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """
+        Get the most viewed cars.
+        
+        Ranks by views in the recent window, or all time with ?period=all.
+        Reads the indexed popularity counters, not the raw view events.
+        """
+        if request.query_params.get('period') == 'all':
+            field = 'popularity_stats__total_views'
+        else:
+            field = 'popularity_stats__recent_views'
+        try:
+            limit = int(request.query_params.get('limit', self.POPULAR_LIMIT))
+        except ValueError:
+            limit = self.POPULAR_LIMIT
+        limit = max(1, min(limit, self.MAX_POPULAR_LIMIT))
+        
+        popular_cars = self.queryset.filter(**{f'{field}__gt': 0}).order_by(f'-{field}', 'id')[:limit]
+        # View counters don't bump the cache generation; SOFT_TTL bounds how stale this gets
+        return self.cached(lambda: CarListSerializer(popular_cars, many=True).data)
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured cars."""
-        featured_cars = self.queryset.filter(is_featured=True)
-        serializer = CarListSerializer(featured_cars, many=True)
-        return Response(serializer.data)
+        def build():
+            featured_cars = self.queryset.filter(is_featured=True)
+            return CarListSerializer(featured_cars, many=True).data
+        return self.cached(build)
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Get the filter options for the search form.
+        
+        Counts of available cars per value of each facet field, most common
+        first, and the price range. Accepts the list filters to narrow them.
+        """
+        def build():
+            queryset = self.filter_queryset(self.get_queryset()).order_by()
+            data = {}
+            for field in self.FACET_FIELDS:
+                # Skips blank and NULL values
+                counts = queryset.filter(**{f'{field}__gt': ''}).values_list(field).annotate(
+                    count=Count('id')
+                ).order_by('-count', field)
+                data[field] = [{'value': value, 'count': count} for value, count in counts]
+            prices = queryset.aggregate(min=Min('price'), max=Max('price'))
+            data['price'] = {key: None if value is None else str(value) for key, value in prices.items()}
+            return data
+        return self.cached(build)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -49,6 +123,9 @@ class CarViewSet(viewsets.ReadOnlyModelViewSet):
         Query params: brand, model, year_min, year_max, price_min, price_max,
                      transmission, mileage_max, fuel_type, condition
         """
+        return self.cached(lambda: self._search(request).data)
+    
+    def _search(self, request):
         queryset = self.queryset
         
         # Apply filters from query params
@@ -0,0 +1,201 @@
+"""
+Pre-render cached car responses.
+
+After a deploy or an inventory change the response cache (see caching.py)
+is cold, and so are PostgreSQL's buffers, so the first visitors pay for
+both. Warming requests the URLs visitors hit most through the real views,
+in-process, so the cached responses match what requests would build:
+- the homepage lists and the first page of the listing;
+- facet counts;
+- the first search page for the most common values of each filter;
+- each featured car's detail page.
+
+Inventory changes re-warm the homepage on a background thread, so the
+request that made the change doesn't wait for the renders.
+
+Cache keys include the host and scheme (responses contain absolute URLs),
+so each URL is rendered once per host in CACHE_WARMING['HOSTS'], by
+default the non-wildcard ALLOWED_HOSTS. Throttles and middleware are
+bypassed, so warming neither uses up a client's rate limit nor records
+page views.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils.http import urlencode
+from .caching import on_commit_once
+from .models import Car
+
+logger = logging.getLogger(__name__)
+
+# Search filters warmed for their most common values
+SEARCH_FILTERS = ['brand', 'fuel_type', 'transmission', 'condition']
+
+
+def warming_setting(name, default):
+    return getattr(settings, 'CACHE_WARMING', {}).get(name, default)
+
+
+def default_hosts():
+    hosts = warming_setting('HOSTS', None)
+    if hosts:
+        return list(hosts)
+    return [host for host in settings.ALLOWED_HOSTS if host and '*' not in host and not host.startswith('.')]
+
+
+def default_scheme():
+    # Behind nginx requests only look secure if the proxy header is trusted
+    return warming_setting('SCHEME', None) or ('https' if settings.SECURE_PROXY_SSL_HEADER else 'http')
+
+
+def homepage_paths():
+    """The homepage lists and each featured car's detail page."""
+    paths = [reverse('car-featured'), reverse('car-latest')]
+    featured = Car.objects.filter(is_available=True, is_featured=True).values_list('pk', flat=True)
+    paths += [reverse('car-detail', args=[pk]) for pk in featured]
+    return paths
+
+
+def warm_paths(top_values=None):
+    """Every path worth warming after a deploy."""
+    top_values = top_values or warming_setting('TOP_VALUES', 5)
+    paths = homepage_paths() + [reverse('car-list'), reverse('car-popular'), reverse('car-facets')]
+    available = Car.objects.filter(is_available=True).order_by()
+    search = reverse('car-search')
+    for field in SEARCH_FILTERS:
+        values = (
+            available.filter(**{f'{field}__gt': ''}).values_list(field, flat=True)
+            .annotate(count=Count('id')).order_by('-count', field)[:top_values]
+        )
+        paths += [f'{search}?{urlencode({field: value})}' for value in values]
+    return paths
+
+
+def render(path, host, scheme):
+    """Run the view for path as a GET from host and return (status, milliseconds)."""
+    match = resolve(path.split('?')[0])
+    view = match.func
+    if hasattr(view, 'cls'):
+        # Same viewset and action, without throttling
+        view = view.cls.as_view(view.actions, **{**view.initkwargs, 'throttle_classes': []})
+    request = RequestFactory().get(path, HTTP_HOST=host, secure=scheme == 'https')
+    start = time.perf_counter()
+    response = view(request, *match.args, **match.kwargs)
+    return response.status_code, (time.perf_counter() - start) * 1000
+
+
+def _render_and_disconnect(path, host, scheme):
+    try:
+        return render(path, host, scheme)
+    finally:
+        connections.close_all()
+
+
+def warm(paths, hosts=None, scheme=None, workers=None):
+    """
+    Render each path for each host with at most workers concurrent requests.
+
+    Returns a list of {'path', 'host', 'status', 'ms'} dicts in input order.
+    With workers=1 everything runs in the calling thread on its connection.
+    """
+    hosts = hosts or default_hosts()
+    scheme = scheme or default_scheme()
+    workers = workers or warming_setting('WORKERS', 4)
+    jobs = [(path, host) for host in hosts for path in paths]
+    if workers <= 1:
+        outcomes = [render(path, host, scheme) for path, host in jobs]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(lambda job: _render_and_disconnect(*job, scheme), jobs))
+    return [
+        {'path': path, 'host': host, 'status': status, 'ms': ms}
+        for (path, host), (status, ms) in zip(jobs, outcomes)
+    ]
+
+
+def _warm_homepage():
+    # Runs after the change has committed; a failure must not fail the request that made it
+    try:
+        warm(homepage_paths(), workers=1)
+    except Exception:
+        logger.exception('Warming the homepage responses failed')
+
+
+class HomepageWarmer:
+    """
+    Re-renders the homepage responses on a background thread.
+
+    Requests made while a warm is running are merged into one more warm,
+    so a burst of inventory changes renders the homepage at most twice.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+
+    def request(self):
+        """Queue a warm and return immediately."""
+        with self._lock:
+            self._idle.clear()
+            self._wake.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='homepage-warmer', daemon=True
+                )
+                self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until no warm is queued or running. Returns False on timeout."""
+        return self._idle.wait(timeout)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                _warm_homepage()
+            finally:
+                # This thread owns its own connection; don't hold it between warms
+                connections.close_all()
+            with self._lock:
+                if not self._wake.is_set():
+                    self._idle.set()
+
+
+_homepage_warmer = None
+_homepage_warmer_lock = threading.Lock()
+
+
+def get_homepage_warmer():
+    """Return this process's homepage warmer."""
+    global _homepage_warmer
+    if _homepage_warmer is None:
+        with _homepage_warmer_lock:
+            if _homepage_warmer is None:
+                _homepage_warmer = HomepageWarmer()
+    return _homepage_warmer
+
+
+def _queue_homepage_warm():
+    get_homepage_warmer().request()
+
+
+def schedule_homepage_warm():
+    """
+    Queue a homepage re-render once the current transaction commits.
+
+    Called when the inventory changes; queues once per transaction however
+    many cars or images it touched.
+    """
+    if warming_setting('ON_INVENTORY_CHANGE', True):
+        on_commit_once(_queue_homepage_warm)
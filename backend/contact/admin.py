@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import ContactMessage
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.utils import timezone
+from .models import ContactMessage, OutboxEmail
+from .search import highlight, search_messages, search_rank
 
 
 @admin.register(ContactMessage)
@@ -20,12 +23,8 @@ class ContactMessageAdmin(admin.ModelAdmin):
         'created_at',
     ]
     
-    search_fields = [
-        'name',
-        'email',
-        'subject',
-        'message',
-    ]
+    # Shows the search box; matching is full-text (see get_search_results)
+    search_fields = ['subject']
     
     list_editable = ['status']
     
@@ -50,3 +49,59 @@ class ContactMessageAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         """Disable adding messages through admin (only via API)."""
         return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer('search_vector')
+    
+    def _is_searching(self, request):
+        return bool(request.GET.get(SEARCH_VAR, '').strip())
+    
+    def get_search_results(self, request, queryset, search_term):
+        """Search the GIN-indexed document instead of ILIKE over every column."""
+        if not search_term.strip():
+            return queryset, False
+        return search_messages(queryset, search_term), False
+    
+    def get_ordering(self, request):
+        """Best matches first while searching; a clicked column still takes over."""
+        search_term = request.GET.get(SEARCH_VAR, '').strip()
+        if search_term:
+            return [search_rank(search_term).desc()]
+        return super().get_ordering(request)
+    
+    def get_list_display(self, request):
+        if self._is_searching(request):
+            return list(self.list_display) + ['matched_text']
+        return self.list_display
+    
+    def matched_text(self, obj):
+        return highlight(getattr(obj, 'search_snippet', ''))
+    matched_text.short_description = 'Match'
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """Admin interface for queued and sent emails."""
+    
+    list_display = ['subject', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['recipient', 'subject']
+    list_select_related = ['contact_message']
+    readonly_fields = [
+        'contact_message', 'from_email', 'recipient', 'subject', 'body',
+        'status', 'attempts', 'next_attempt_at', 'last_error', 'created_at', 'sent_at',
+    ]
+    
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        """Queue the selected emails to be sent on the worker's next poll."""
+        count = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'Queued {count} email(s) to be sent again.')
+    retry_now.short_description = "Retry selected emails now"
+    
+    def has_add_permission(self, request):
+        """Emails are only queued by the application."""
+        return False
@@ -0,0 +1,43 @@
+from datetime import timedelta
+from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+from .models import ContactMessage
+from analytics.timeranges import day_start
+from .search import search_messages
+
+
+class StatusInFilter(filters.BaseInFilter, filters.ChoiceFilter):
+    """Comma-separated list of statuses, e.g. ?status=new,read"""
+
+
+class ContactMessageFilter(filters.FilterSet):
+    """Filter class for the staff inbox."""
+    
+    status = StatusInFilter(choices=ContactMessage.STATUS_CHOICES)
+    received_from = filters.DateFilter(method='filter_received_from')
+    received_to = filters.DateFilter(method='filter_received_to')
+    has_car = filters.BooleanFilter(field_name='car', lookup_expr='isnull', exclude=True)
+    
+    class Meta:
+        model = ContactMessage
+        fields = ['status', 'car']
+    
+    def filter_received_from(self, queryset, name, value):
+        # A range on created_at rather than __date keeps the index usable
+        return queryset.filter(created_at__gte=day_start(value))
+    
+    def filter_received_to(self, queryset, name, value):
+        # Inclusive of the whole day
+        return queryset.filter(created_at__lt=day_start(value + timedelta(days=1)))
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """?search= over the GIN-indexed search document, ranked best match first."""
+    
+    search_param = 'search'
+    
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return search_messages(queryset, text)
@@ -0,0 +1,56 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from contact import outbox
+
+
+class Command(BaseCommand):
+    """
+    Send queued contact form emails from the outbox.
+
+    Without --follow, sends everything that is due and exits (suitable for
+    cron); with --follow, keeps polling for new emails. Each batch is sent
+    over a single SMTP connection.
+    """
+
+    help = 'Deliver pending OutboxEmail rows, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--follow',
+            action='store_true',
+            help='Keep running and poll for newly queued emails',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=outbox.outbox_setting('BATCH_SIZE'),
+            help='Emails sent per SMTP connection',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds between checks for new emails with --follow (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            batch = outbox.claim_batch(options['batch_size'])
+            if batch:
+                sent, failed = outbox.deliver(batch)
+                total_sent += sent
+                total_failed += failed
+                if options['follow']:
+                    self.stdout.write(f'Sent {sent} email(s), {failed} failed.')
+                continue
+            if not options['follow']:
+                break
+            # Don't hold a database connection while idle
+            connection.close()
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent} email(s); {total_failed} attempt(s) failed.'
+        ))
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:48
+#
+# The search document is kept current by a trigger so every write path
+# (ORM, bulk_create, admin, raw SQL) indexes it. Keep the weights and text
+# search configuration in step with contact/search.py.
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+CREATE_TRIGGER = """
+CREATE FUNCTION contact_message_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.subject, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.name, '') || ' ' || coalesce(NEW.email, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.message, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER contact_message_search_vector_update
+BEFORE INSERT OR UPDATE OF name, email, subject, message ON contact_contactmessage
+FOR EACH ROW EXECUTE FUNCTION contact_message_search_vector();
+
+-- Index existing messages (fires the trigger)
+UPDATE contact_contactmessage SET subject = subject;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER contact_message_search_vector_update ON contact_contactmessage;
+DROP FUNCTION contact_message_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contact', '0003_outbox_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactmessage',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='contact_search_idx'),
+        ),
+    ]
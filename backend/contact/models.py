@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.core.validators import EmailValidator
 
 
@@ -33,6 +36,9 @@ class ContactMessage(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
+    # Full-text search document, maintained by a database trigger (see contact/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Contact Message'
@@ -41,6 +47,7 @@ class ContactMessage(models.Model):
             models.Index(fields=['-created_at'], name='contact_created_idx'),
             models.Index(fields=['status'], name='contact_status_idx'),
             models.Index(fields=['email'], name='contact_email_idx'),
+            GinIndex(fields=['search_vector'], name='contact_search_idx'),
         ]
     
     def __str__(self):
@@ -56,3 +63,67 @@ class ContactMessage(models.Model):
         """Mark message as replied."""
         self.status = 'replied'
         self.save()
+    
+    # Bulk actions: action -> (statuses it applies to, or None for any; new status)
+    BULK_TRANSITIONS = {
+        'mark_read': (['new'], 'read'),
+        'mark_replied': (None, 'replied'),
+        'archive': (None, 'archived'),
+    }
+    
+    @classmethod
+    def bulk_transition(cls, ids, action):
+        """Apply a status action to many messages in one UPDATE. Returns the number changed."""
+        from_statuses, new_status = cls.BULK_TRANSITIONS[action]
+        queryset = cls.objects.filter(id__in=ids).exclude(status=new_status)
+        if from_statuses is not None:
+            queryset = queryset.filter(status__in=from_statuses)
+        # update() bypasses auto_now
+        return queryset.update(status=new_status, updated_at=timezone.now())
+
+
+class OutboxEmail(models.Model):
+    """An email waiting to be sent, or the record of one that was."""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    contact_message = models.ForeignKey(
+        ContactMessage,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='outbox_emails'
+    )
+    from_email = models.CharField(max_length=254)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    
+    # Delivery state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest time the worker may (re)try; also pushed ahead while a worker holds it
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Outbox Email'
+        verbose_name_plural = 'Outbox Emails'
+        indexes = [
+            # The worker only ever scans pending emails that are due
+            models.Index(
+                fields=['next_attempt_at'],
+                name='outbox_pending_due_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
@@ -0,0 +1,175 @@
+"""
+Transactional outbox for contact form emails.
+
+Submitting the contact form only inserts OutboxEmail rows, in the same
+transaction as the ContactMessage, so the request never waits on SMTP and
+no email is queued for a message that wasn't saved. The send_outbox_emails
+worker claims due emails in batches and sends each batch over one SMTP
+connection. Failures are retried with exponential backoff until
+MAX_ATTEMPTS, after which the email is marked failed; a recipient address
+the server rejects outright is marked failed at once.
+
+A claimed batch is leased by pushing next_attempt_at past LEASE seconds, so
+the claim commits immediately instead of holding row locks during SMTP.
+If a worker dies mid-batch its emails become due again when the lease
+expires; delivery is therefore at least once.
+"""
+
+import logging
+import smtplib
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 6,
+    'RETRY_DELAY': 60,
+    'MAX_RETRY_DELAY': 3600,
+    'LEASE': 300,
+}
+
+
+def outbox_setting(name):
+    return getattr(settings, 'EMAIL_OUTBOX', {}).get(name, DEFAULTS[name])
+
+
+def contact_notifications(contact_message):
+    """Build the unsaved admin notification and customer confirmation emails."""
+    admin_subject = f'New Contact Form Submission - {contact_message.subject or "No Subject"}'
+    admin_message = f"""
+New contact form submission:
+
+Name: {contact_message.name}
+Email: {contact_message.email}
+Phone: {contact_message.phone or 'Not provided'}
+Subject: {contact_message.subject or 'Not provided'}
+
+Message:
+{contact_message.message}
+
+Car of Interest: {contact_message.car.full_name if contact_message.car else 'None'}
+Submitted at: {contact_message.created_at}
+IP Address: {contact_message.ip_address}
+"""
+
+    customer_subject = 'Thank you for contacting Car Dealership'
+    customer_message = f"""
+Dear {contact_message.name},
+
+Thank you for contacting us! We have received your message and will get back to you as soon as possible.
+
+Your message:
+{contact_message.message}
+
+Best regards,
+Car Dealership Team
+Phone: 99 022802
+Email: autodealercy@gmail.com
+"""
+
+    return [
+        OutboxEmail(
+            contact_message=contact_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient=settings.ADMIN_EMAIL,
+            subject=admin_subject,
+            body=admin_message,
+        ),
+        OutboxEmail(
+            contact_message=contact_message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient=contact_message.email,
+            subject=customer_subject,
+            body=customer_message,
+        ),
+    ]
+
+
+def queue_contact_notifications(contact_message):
+    """Queue the emails for a contact message; call inside its transaction."""
+    return OutboxEmail.objects.bulk_create(contact_notifications(contact_message))
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts."""
+    delay = outbox_setting('RETRY_DELAY') * 2 ** (attempts - 1)
+    return min(delay, outbox_setting('MAX_RETRY_DELAY'))
+
+
+def is_permanent_failure(error):
+    """Whether retrying can't help: every recipient was rejected with a 5xx reply."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return False
+
+
+def claim_batch(limit=None, now=None):
+    """
+    Lease up to limit due emails to this worker and return them.
+
+    SKIP LOCKED lets several workers claim disjoint batches concurrently.
+    """
+    now = now or timezone.now()
+    limit = limit or outbox_setting('BATCH_SIZE')
+    with transaction.atomic():
+        batch = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+        if batch:
+            OutboxEmail.objects.filter(pk__in=[email.pk for email in batch]).update(
+                next_attempt_at=now + timedelta(seconds=outbox_setting('LEASE'))
+            )
+    return batch
+
+
+def deliver(batch, connection=None):
+    """
+    Send a claimed batch over one SMTP connection and record each outcome.
+
+    A connection that breaks mid-batch is reopened for the next email.
+    Returns (sent, failed) counts.
+    """
+    connection = connection or get_connection(fail_silently=False)
+    max_attempts = outbox_setting('MAX_ATTEMPTS')
+    sent = failed = 0
+    try:
+        for email in batch:
+            message = EmailMessage(
+                subject=email.subject,
+                body=email.body,
+                from_email=email.from_email,
+                to=[email.recipient],
+                connection=connection,
+            )
+            email.attempts += 1
+            try:
+                connection.open()
+                connection.send_messages([message])
+            except Exception as e:
+                failed += 1
+                logger.warning('Failed to send outbox email %s (attempt %d): %s', email.pk, email.attempts, e)
+                email.last_error = str(e)[:1000]
+                if email.attempts >= max_attempts or is_permanent_failure(e):
+                    email.status = 'failed'
+                else:
+                    email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+                email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+                # The session may be unusable; start a fresh one for the next email
+                connection.close()
+                continue
+            sent += 1
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            email.save(update_fields=['attempts', 'last_error', 'status', 'sent_at'])
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,183 @@
+"""
+Ingest-time screening of contact form submissions.
+
+The per-IP throttle doesn't stop the same spam arriving from many IPs, and
+double-submits of one form each create a row and two emails. Each
+submission is fingerprinted before anything is written:
+
+- An exact key, hashing the sender's email, the car asked about and the
+  normalized subject and message. A repeat within WINDOW seconds is a
+  duplicate and is answered with the original message's id; the same
+  question about another car is a separate lead.
+- Near-duplicate keys for longer messages: a MinHash signature over word
+  3-shingles, split into LSH bands. Messages with mostly the same wording
+  share a band with high probability. Once MAX_COPIES submissions within
+  the window share a band, further ones are treated as spam whatever the
+  sender's address.
+
+Both checks are O(1) dictionary lookups in a bounded per-process LRU, so
+nothing is queried. With several workers a copy can still be accepted once
+per worker, which only under-suppresses.
+"""
+
+import hashlib
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+WORD_RE = re.compile(r'\w+')
+SHINGLE_SIZE = 3
+# Messages with fewer shingles are common phrasings ("Is this car still
+# available?"), so they only get the exact-duplicate check
+MIN_SHINGLES = 6
+BANDS = 4
+ROWS_PER_BAND = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611)
+_HASH_PARAMS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(BANDS * ROWS_PER_BAND)
+]
+
+DUPLICATE = 'duplicate'
+SPAM = 'spam'
+
+
+def normalize(text):
+    """Lowercase words of text with punctuation, spacing and Unicode variants ignored."""
+    return WORD_RE.findall(unicodedata.normalize('NFKC', text).casefold())
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+def band_keys(words):
+    """LSH band keys of the message's MinHash signature, or [] if it is too short."""
+    shingles = {
+        _hash64(' '.join(words[i:i + SHINGLE_SIZE]))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+    if len(shingles) < MIN_SHINGLES:
+        return []
+    signature = [min((a * x + b) % _MERSENNE_PRIME for x in shingles) for a, b in _HASH_PARAMS]
+    return [
+        ('band', band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+        for band in range(BANDS)
+    ]
+
+
+class Fingerprint:
+    """Exact and near-duplicate keys for one submission."""
+
+    def __init__(self, email, message, subject='', car_id=None):
+        words = normalize(message)
+        parts = [
+            email.strip().lower(), str(car_id or ''), ' '.join(normalize(subject or '')), ' '.join(words),
+        ]
+        digest = hashlib.sha1('\0'.join(parts).encode()).hexdigest()
+        self.exact_key = ('exact', digest)
+        self.band_keys = band_keys(words)
+
+
+class ContactScreen:
+    """Bounded LRU of recent fingerprints with suppression counters."""
+
+    def __init__(self, window=3600, max_tracked=10000, max_copies=3):
+        self.window = window
+        self.max_tracked = max_tracked
+        self.max_copies = max_copies
+        # key -> [first_seen, count, message_id]
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'duplicates': 0, 'spam': 0}
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[0] >= self.window:
+            del self._entries[key]
+            return None
+        return entry
+
+    def _touch(self, key, now):
+        entry = self._get(key, now)
+        if entry is None:
+            entry = self._entries[key] = [now, 0, None]
+        entry[1] += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def check(self, fingerprint, now=None):
+        """
+        Screen a submission and record it.
+
+        Returns (DUPLICATE, original_id), (SPAM, None), or (None, None) if
+        the submission should be saved.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._get(fingerprint.exact_key, now)
+            if entry is not None:
+                self.stats['duplicates'] += 1
+                return DUPLICATE, entry[2]
+
+            copies = [self._touch(key, now)[1] for key in fingerprint.band_keys]
+            if copies and max(copies) > self.max_copies:
+                verdict = SPAM
+                self.stats['spam'] += 1
+            else:
+                verdict = None
+                self._touch(fingerprint.exact_key, now)
+
+            while len(self._entries) > self.max_tracked:
+                self._entries.popitem(last=False)
+            return verdict, None
+
+    def remember(self, fingerprint, message_id):
+        """Attach the saved message's id to an accepted submission."""
+        with self._lock:
+            entry = self._entries.get(fingerprint.exact_key)
+            if entry is not None:
+                entry[2] = message_id
+
+    def forget(self, fingerprint):
+        """Drop an accepted submission that failed to save, so a retry isn't a duplicate."""
+        with self._lock:
+            self._entries.pop(fingerprint.exact_key, None)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, tracked=len(self._entries))
+
+
+_contact_screen = None
+_contact_screen_lock = threading.Lock()
+
+
+def get_contact_screen():
+    """Return this process's contact screen, created from settings on first use."""
+    global _contact_screen
+    if _contact_screen is None:
+        with _contact_screen_lock:
+            if _contact_screen is None:
+                config = getattr(settings, 'CONTACT_SCREENING', {})
+                _contact_screen = ContactScreen(
+                    window=config.get('WINDOW', 3600),
+                    max_tracked=config.get('MAX_TRACKED', 10000),
+                    max_copies=config.get('MAX_COPIES', 3),
+                )
+    return _contact_screen
+
+
+@receiver(setting_changed)
+def _reset_contact_screen(setting, **kwargs):
+    global _contact_screen
+    if setting == 'CONTACT_SCREENING':
+        _contact_screen = None
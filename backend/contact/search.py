@@ -0,0 +1,55 @@
+"""
+Full-text search over contact messages.
+
+Each message has a search_vector column that a trigger (migration 0004)
+fills from its subject (weight A), name and email (B) and message (C), and
+a GIN index over it. Queries use websearch syntax: plain words, "quoted
+phrases", OR and -excluded terms. Results are ranked, and each carries a
+short excerpt of the message with the matched words highlighted.
+"""
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+SEARCH_CONFIG = 'english'
+
+# ts_headline doesn't escape the message, so matches are marked with control
+# characters and turned into <mark> tags only after the text is escaped
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+
+
+def search_query(text):
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def search_rank(text):
+    """Relevance of a message to text, for ordering."""
+    return SearchRank(F('search_vector'), search_query(text))
+
+
+def search_messages(queryset, text):
+    """
+    Filter to messages matching text, best matches first.
+
+    Each result is annotated with search_rank and search_snippet.
+    """
+    query = search_query(text)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=search_rank(text),
+        search_snippet=SearchHeadline(
+            'message', query, config=SEARCH_CONFIG,
+            start_sel=MATCH_START, stop_sel=MATCH_END,
+            max_words=30, min_words=10, max_fragments=2, fragment_delimiter=' ... ',
+        ),
+    ).order_by('-search_rank', '-created_at')
+
+
+def highlight(snippet):
+    """HTML for a search snippet: escaped text with matches wrapped in <mark>."""
+    if not snippet:
+        return ''
+    html = escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+    return mark_safe(html)
@@ -1,12 +1,14 @@
 from rest_framework import serializers
 from django.core.validators import EmailValidator, RegexValidator
 from .models import ContactMessage
+from .search import highlight
 
 
 class ContactMessageSerializer(serializers.ModelSerializer):
     """Serializer for ContactMessage model."""
     
     car_details = serializers.SerializerMethodField()
+    snippet = serializers.SerializerMethodField()
     
     class Meta:
         model = ContactMessage
@@ -21,6 +23,7 @@ class ContactMessageSerializer(serializers.ModelSerializer):
             'car_details',
             'status',
             'created_at',
+            'snippet',
         ]
         read_only_fields = ['id', 'status', 'created_at']
     
@@ -73,6 +76,11 @@ class ContactMessageSerializer(serializers.ModelSerializer):
             }
         return None
     
+    def get_snippet(self, obj):
+        """Highlighted excerpt of the message, only for ?search= results."""
+        snippet = getattr(obj, 'search_snippet', None)
+        return highlight(snippet) if snippet is not None else None
+    
     def create(self, validated_data):
         """Create contact message and get IP from request."""
         request = self.context.get('request')
@@ -88,6 +96,20 @@ class ContactMessageSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class BulkStatusSerializer(serializers.Serializer):
+    """Validate a bulk status change for staff inbox triage."""
+    
+    ACTIONS = ['mark_read', 'mark_replied', 'archive']
+    MAX_IDS = 500
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_IDS,
+    )
+    action = serializers.ChoiceField(choices=ACTIONS)
+
+
 class ContactMessageCreateSerializer(serializers.ModelSerializer):
     """Simplified serializer for creating contact messages."""
     
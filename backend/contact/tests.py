@@ -1,11 +1,26 @@
+import socketserver
+import threading
+from datetime import timedelta
+from io import StringIO
+from django.core import mail
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.core.exceptions import ValidationError
-from .models import ContactMessage
+from .models import ContactMessage, OutboxEmail
+from .outbox import queue_contact_notifications
+from .search import search_messages
+from .screening import DUPLICATE, SPAM, ContactScreen, Fingerprint, get_contact_screen
 from cars.models import Car
 
 
+SCREENING = {'WINDOW': 3600, 'MAX_TRACKED': 100, 'MAX_COPIES': 2}
+
+
 class ContactMessageModelTest(TestCase):
     """Test cases for ContactMessage model."""
     
@@ -88,7 +103,8 @@ class ContactMessageModelTest(TestCase):
             'anon': '10000/day',
             'user': '10000/day'
         }
-    }
+    },
+    ADMIN_EMAIL='admin@example.com',
 )
 class ContactMessageAPITest(APITestCase):
     """Test cases for ContactMessage API endpoints."""
@@ -97,6 +113,10 @@ class ContactMessageAPITest(APITestCase):
         # Clear throttle cache before each test
         from django.core.cache import cache
         cache.clear()
+        # Start each test with no remembered submissions
+        screening = override_settings(CONTACT_SCREENING=SCREENING)
+        screening.enable()
+        self.addCleanup(screening.disable)
     
     def test_create_contact_message(self):
         """Test creating a contact message via API."""
@@ -110,6 +130,22 @@ class ContactMessageAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertIn('message', response.data)
     
+    def test_create_queues_emails_without_sending(self):
+        """Test submitting the form queues both emails instead of sending them."""
+        data = {
+            'name': 'Jane Smith',
+            'email': 'jane@example.com',
+            'message': 'What are your opening hours?',
+        }
+        response = self.client.post('/api/contact/', data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(mail.outbox), 0)
+        recipients = set(
+            OutboxEmail.objects.filter(contact_message_id=response.data['id'], status='pending')
+            .values_list('recipient', flat=True)
+        )
+        self.assertEqual(recipients, {'admin@example.com', 'jane@example.com'})
+    
     def test_create_contact_message_with_phone(self):
         """Test creating message with phone number."""
         data = {
@@ -150,3 +186,406 @@ class ContactMessageAPITest(APITestCase):
         }
         response = self.client.post('/api/contact/', data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ContactScreeningTest(APITestCase):
+    """Test cases for collapsing repeated and mass-sent submissions."""
+    
+    url = '/api/contact/'
+    spam = (
+        'Boost your dealership sales today! Our SEO agency guarantees first page '
+        'Google rankings within 30 days. Reply now for a free audit of your website.'
+    )
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        screening = override_settings(
+            CONTACT_SCREENING=SCREENING,
+            REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'anon': '10000/day', 'user': '10000/day'}},
+        )
+        screening.enable()
+        self.addCleanup(screening.disable)
+        self.screen = get_contact_screen()
+    
+    def submit(self, email, message, car=None, **extra):
+        data = {'name': 'Sender', 'email': email, 'message': message}
+        if car is not None:
+            data['car'] = car
+        return self.client.post(self.url, data, **extra)
+    
+    def test_resubmission_returns_original(self):
+        """Test a double submit is acknowledged with the first message's id."""
+        first = self.submit('jane@example.com', 'Is the blue Yaris still available?')
+        second = self.submit('Jane@Example.com', 'is the blue  Yaris still available!!')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(ContactMessage.objects.count(), 1)
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+        self.assertEqual(self.screen.snapshot()['duplicates'], 1)
+        
+        # The same short question from someone else is a separate lead
+        other = self.submit('maria@example.com', 'Is the blue Yaris still available?')
+        self.assertEqual(other.status_code, status.HTTP_201_CREATED)
+    
+    def test_same_question_about_another_car_is_saved(self):
+        """Test one sender asking the same thing about two cars creates two leads."""
+        cars = [
+            Car.objects.create(
+                brand='Toyota', model=model, year=2021, price=15000.00, mileage=20000,
+                transmission='manual', fuel_type='petrol', engine_size=1.5, horsepower=110,
+                color='red', doors=4, seats=5, condition='used',
+            )
+            for model in ['Yaris', 'Corolla']
+        ]
+        responses = [
+            self.submit('jane@example.com', 'Is this still available?', car=car.id)
+            for car in cars
+        ]
+        self.assertEqual([r.status_code for r in responses], [status.HTTP_201_CREATED] * 2)
+        self.assertEqual(
+            sorted(ContactMessage.objects.values_list('car_id', flat=True)), sorted(car.id for car in cars)
+        )
+    
+    def test_spam_from_rotating_senders_is_collapsed(self):
+        """Test identical messages from many senders stop being saved after MAX_COPIES."""
+        for i in range(5):
+            response = self.submit(
+                f'bot{i}@example.net', self.spam, REMOTE_ADDR=f'198.51.100.{i + 1}'
+            )
+            expected = status.HTTP_201_CREATED if i < 2 else status.HTTP_202_ACCEPTED
+            self.assertEqual(response.status_code, expected)
+        self.assertEqual(ContactMessage.objects.count(), 2)
+        self.assertEqual(OutboxEmail.objects.count(), 4)
+        self.assertEqual(self.screen.snapshot()['spam'], 3)
+    
+    def test_fingerprint_window_and_bounds(self):
+        """Test fingerprints expire after the window and the store stays bounded."""
+        screen = ContactScreen(window=60, max_tracked=10, max_copies=1)
+        fingerprint = Fingerprint('jane@example.com', self.spam)
+        self.assertEqual(screen.check(fingerprint, now=0), (None, None))
+        screen.remember(fingerprint, 7)
+        self.assertEqual(screen.check(fingerprint, now=30), (DUPLICATE, 7))
+        other = Fingerprint('maria@example.com', self.spam)
+        self.assertEqual(screen.check(other, now=30), (SPAM, None))
+        self.assertEqual(screen.check(fingerprint, now=61), (None, None))
+        
+        for i in range(50):
+            screen.check(Fingerprint(f'user{i}@example.com', f'Question number {i}'), now=100)
+        self.assertLessEqual(screen.snapshot()['tracked'], 10)
+    
+    def test_near_duplicates_share_band_keys(self):
+        """Test a lightly edited message collides with the original but unrelated ones don't."""
+        first = Fingerprint('a@example.com', self.spam)
+        edited = Fingerprint('c@example.com', self.spam.replace('30 days', '45 days'))
+        self.assertEqual(len(first.band_keys), 4)
+        self.assertTrue(set(first.band_keys) & set(edited.band_keys))
+        second = Fingerprint(
+            'b@example.com',
+            'I would like to book a test drive of the Mazda CX-5 this Saturday morning if possible.',
+        )
+        self.assertFalse(set(first.band_keys) & set(second.band_keys))
+
+
+class ContactInboxAPITest(APITestCase):
+    """Test cases for the staff inbox endpoints."""
+    
+    url = '/api/contact/'
+    
+    def setUp(self):
+        self.car = Car.objects.create(
+            brand='Toyota', model='Yaris', year=2021, price=15000.00, mileage=20000,
+            transmission='manual', fuel_type='petrol', engine_size=1.5, horsepower=110,
+            color='red', doors=4, seats=5, condition='used',
+        )
+        self.messages = [
+            ContactMessage.objects.create(
+                name=f'Customer {i}', email=f'customer{i}@example.com',
+                message='Is this car still available?', car=self.car if i % 2 else None,
+            )
+            for i in range(6)
+        ]
+        self.client.force_authenticate(User.objects.create_user('staff', password='pw', is_staff=True))
+    
+    def test_inbox_is_staff_only(self):
+        """Test anonymous users can submit messages but not read them."""
+        self.client.force_authenticate(None)
+        response = self.client.get(self.url)
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+        response = self.client.post(f'{self.url}bulk_status/', {'ids': [1], 'action': 'archive'}, format='json')
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+    
+    def test_list_is_one_query_with_cursor_pages(self):
+        """Test linked cars are joined and pages are cursor-based, newest first."""
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'page_size': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        names = [row['name'] for row in response.data['results']]
+        self.assertEqual(names, ['Customer 5', 'Customer 4', 'Customer 3', 'Customer 2'])
+        self.assertEqual(response.data['results'][0]['car_details']['id'], self.car.id)
+        
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['name'] for row in response.data['results']], ['Customer 1', 'Customer 0'])
+        self.assertIsNone(response.data['next'])
+    
+    def test_filters(self):
+        """Test filtering by status list, car, and received date."""
+        ContactMessage.objects.filter(pk=self.messages[0].pk).update(status='replied')
+        ContactMessage.objects.filter(pk=self.messages[1].pk).update(status='archived')
+        ContactMessage.objects.filter(pk=self.messages[2].pk).update(
+            created_at=timezone.now() - timedelta(days=3)
+        )
+        
+        response = self.client.get(self.url, {'status': 'replied,archived'})
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(self.url, {'car': self.car.id, 'status': 'new'})
+        self.assertEqual({row['name'] for row in response.data['results']}, {'Customer 3', 'Customer 5'})
+        response = self.client.get(self.url, {'has_car': 'false'})
+        self.assertEqual(len(response.data['results']), 3)
+        
+        today = timezone.localdate()
+        response = self.client.get(self.url, {'received_to': (today - timedelta(days=1)).isoformat()})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Customer 2'])
+        response = self.client.get(self.url, {'received_from': today.isoformat()})
+        self.assertEqual(len(response.data['results']), 5)
+        response = self.client.get(self.url, {'status': 'bogus'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_bulk_status_is_single_update(self):
+        """Test bulk actions run as one UPDATE and respect each transition."""
+        ids = [message.id for message in self.messages[:3]]
+        ContactMessage.objects.filter(pk=ids[0]).update(status='replied')
+        
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                f'{self.url}bulk_status/', {'ids': ids, 'action': 'mark_read'}, format='json'
+            )
+        self.assertEqual(response.data, {'updated': 2})
+        self.assertEqual(ContactMessage.objects.get(pk=ids[0]).status, 'replied')
+        
+        response = self.client.post(
+            f'{self.url}bulk_status/', {'ids': ids, 'action': 'archive'}, format='json'
+        )
+        self.assertEqual(response.data, {'updated': 3})
+        self.assertEqual(ContactMessage.objects.filter(status='archived').count(), 3)
+        
+        response = self.client.post(f'{self.url}bulk_status/', {'ids': [], 'action': 'archive'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(f'{self.url}bulk_status/', {'ids': ids, 'action': 'delete'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ContactSearchTest(APITestCase):
+    """Test cases for full-text search in the staff inbox and admin."""
+    
+    url = '/api/contact/'
+    
+    def setUp(self):
+        self.in_subject = ContactMessage.objects.create(
+            name='Maria Georgiou', email='maria@example.com', subject='Financing options',
+            message='Could I pay for the car in monthly instalments?',
+        )
+        self.in_message = ContactMessage.objects.create(
+            name='Andreas Ioannou', email='andreas@example.com', subject='Test drive',
+            message='Before buying I would like to ask about financing & a test drive.',
+        )
+        ContactMessage.objects.create(
+            name='Eleni Petrou', email='eleni@example.com', subject='Opening hours',
+            message='When are you open on Saturdays?',
+        )
+        self.staff = User.objects.create_user('staff', password='pw', is_staff=True, is_superuser=True)
+        self.client.force_authenticate(self.staff)
+    
+    def test_search_is_ranked_with_highlighted_snippets(self):
+        """Test subject matches rank first and snippets are escaped with marked matches."""
+        response = self.client.get(self.url, {'search': 'finance'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        results = response.data['results']
+        self.assertEqual([row['id'] for row in results], [self.in_subject.id, self.in_message.id])
+        self.assertIn('<mark>financing</mark> &amp; a test drive', results[1]['snippet'])
+        
+        response = self.client.get(self.url, {'search': 'maria@example.com'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.in_subject.id])
+        response = self.client.get(self.url, {'search': '"test drive" -financing'})
+        self.assertEqual(response.data['count'], 0)
+        self.assertIsNone(self.client.get(self.url).data['results'][0]['snippet'])
+    
+    def test_search_document_follows_edits(self):
+        """Test the trigger re-indexes a message when its text changes."""
+        self.in_message.message = 'Do you accept trade-ins of older vehicles?'
+        self.in_message.save()
+        matches = search_messages(ContactMessage.objects.all(), 'vehicle')
+        self.assertEqual([message.id for message in matches], [self.in_message.id])
+        self.assertFalse(search_messages(ContactMessage.objects.all(), 'drive financing').exists())
+    
+    def test_search_uses_gin_index(self):
+        """Test the search predicate is answered from contact_search_idx."""
+        queryset = search_messages(ContactMessage.objects.all(), 'financing')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+        self.assertIn('contact_search_idx', plan)
+    
+    def test_admin_search(self):
+        """Test the admin changelist searches full-text and shows the match."""
+        self.client.force_login(self.staff)
+        response = self.client.get('/secure-admin/contact/contactmessage/', {'q': 'financing'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = list(response.context['cl'].result_list)
+        self.assertEqual(results, [self.in_subject, self.in_message])
+        self.assertContains(response, '<mark>financing</mark>')
+        
+        response = self.client.get('/secure-admin/contact/contactmessage/', {'q': 'financing', 'o': '1'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.in_message, self.in_subject])
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib to deliver messages."""
+    
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+    
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply('220 localhost')
+        recipients = []
+        for line in self.rfile:
+            verb = line[:4].decode().upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = line.decode().split(':', 1)[1].strip().strip('<>')
+                if address in server.rejected:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                if server.fail_next_data:
+                    server.fail_next_data -= 1
+                    self.reply('451 Try again later')
+                else:
+                    server.delivered.extend(recipients)
+                    self.reply('250 OK')
+            elif verb == 'RSET':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Local SMTP server that records connections and delivered recipients."""
+    
+    daemon_threads = True
+    
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.connections = 0
+        self.delivered = []
+        self.rejected = set()
+        self.fail_next_data = 0
+
+
+@override_settings(ADMIN_EMAIL='admin@example.com')
+class OutboxDeliveryTest(TestCase):
+    """Test cases for the send_outbox_emails worker against a local SMTP server."""
+    
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        smtp_settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_OUTBOX={'BATCH_SIZE': 50, 'MAX_ATTEMPTS': 3, 'RETRY_DELAY': 60, 'MAX_RETRY_DELAY': 600, 'LEASE': 300},
+        )
+        smtp_settings.enable()
+        self.addCleanup(smtp_settings.disable)
+    
+    def queue(self, email):
+        contact_message = ContactMessage.objects.create(
+            name='Jane Smith', email=email, message='What are your opening hours?'
+        )
+        return queue_contact_notifications(contact_message)
+    
+    def send(self):
+        call_command('send_outbox_emails', stdout=StringIO())
+    
+    def test_batch_shares_one_connection(self):
+        """Test a batch of emails is delivered over a single SMTP connection."""
+        for i in range(3):
+            self.queue(f'customer{i}@example.com')
+        self.send()
+        self.assertEqual(self.smtp.connections, 1)
+        self.assertEqual(len(self.smtp.delivered), 6)
+        self.assertEqual(OutboxEmail.objects.filter(status='sent', attempts=1).count(), 6)
+        self.assertFalse(OutboxEmail.objects.filter(sent_at__isnull=True).exists())
+    
+    def test_transient_failure_is_retried_with_backoff(self):
+        """Test a temporary SMTP error schedules a later retry with a growing delay."""
+        admin_email, customer_email = self.queue('jane@example.com')
+        self.smtp.fail_next_data = 1
+        started = timezone.now()
+        self.send()
+        
+        admin_email.refresh_from_db()
+        self.assertEqual((admin_email.status, admin_email.attempts), ('pending', 1))
+        self.assertIn('Try again later', admin_email.last_error)
+        self.assertGreaterEqual(admin_email.next_attempt_at, started + timedelta(seconds=60))
+        self.assertEqual(self.smtp.delivered, ['jane@example.com'])
+        
+        # Not due yet, so a second run sends nothing
+        self.send()
+        self.assertEqual(len(self.smtp.delivered), 1)
+        
+        OutboxEmail.objects.filter(pk=admin_email.pk).update(next_attempt_at=timezone.now())
+        self.smtp.fail_next_data = 1
+        self.send()
+        admin_email.refresh_from_db()
+        self.assertEqual(admin_email.attempts, 2)
+        self.assertGreaterEqual(admin_email.next_attempt_at, timezone.now() + timedelta(seconds=110))
+        
+        OutboxEmail.objects.filter(pk=admin_email.pk).update(next_attempt_at=timezone.now())
+        self.send()
+        admin_email.refresh_from_db()
+        self.assertEqual((admin_email.status, admin_email.attempts, admin_email.last_error), ('sent', 3, ''))
+    
+    def test_gives_up_after_max_attempts(self):
+        """Test an email is marked failed once its attempts are used up."""
+        admin_email, customer_email = self.queue('jane@example.com')
+        OutboxEmail.objects.filter(pk=customer_email.pk).update(attempts=2)
+        self.smtp.fail_next_data = 2
+        self.send()
+        admin_email.refresh_from_db()
+        customer_email.refresh_from_db()
+        self.assertEqual((admin_email.status, admin_email.attempts), ('pending', 1))
+        self.assertEqual((customer_email.status, customer_email.attempts), ('failed', 3))
+    
+    def test_rejected_recipient_fails_immediately(self):
+        """Test a recipient the server refuses is not retried."""
+        self.smtp.rejected.add('nobody@example.com')
+        self.queue('nobody@example.com')
+        self.send()
+        self.assertEqual(
+            OutboxEmail.objects.get(recipient='nobody@example.com').status, 'failed'
+        )
+        self.assertEqual(self.smtp.delivered, ['admin@example.com'])
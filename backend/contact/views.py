@@ -1,20 +1,37 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from rest_framework.throttling import AnonRateThrottle
-from django.core.mail import send_mail
-from django.conf import settings
+from rest_framework.permissions import AllowAny, IsAdminUser
+from django_filters.rest_framework import DjangoFilterBackend
+from django.db import transaction
+from car_dealership.throttling import SharedAnonRateThrottle
+from .filters import ContactMessageFilter, FullTextSearchFilter
 from .models import ContactMessage
-from .serializers import ContactMessageSerializer, ContactMessageCreateSerializer
-import logging
+from .outbox import queue_contact_notifications
+from .screening import Fingerprint, get_contact_screen
+from .serializers import BulkStatusSerializer, ContactMessageSerializer, ContactMessageCreateSerializer
 
-logger = logging.getLogger(__name__)
 
+class ContactFormThrottle(SharedAnonRateThrottle):
+    """Custom throttle for contact form submissions (the 'contact' rate, 5/hour)."""
+    # Own scope, so browsing the site doesn't use up a visitor's submissions
+    scope = 'contact'
 
-class ContactFormThrottle(AnonRateThrottle):
-    """Custom throttle for contact form submissions."""
-    rate = '5/hour'
+
+class InboxPagination(CursorPagination):
+    """Newest-first cursor pages; walks contact_created_idx without OFFSET or COUNT."""
+    ordering = '-created_at'
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class InboxSearchPagination(PageNumberPagination):
+    """Search results are ordered by rank, which a cursor can't follow."""
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
 
 class ContactMessageViewSet(viewsets.ModelViewSet):
@@ -24,10 +41,31 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
     Allows anyone to create a contact message.
     Only staff can view messages (for admin purposes).
     """
-    queryset = ContactMessage.objects.all()
+    # car_details reads the linked car, so join it instead of a query per message;
+    # the search document is only used inside the database
+    queryset = ContactMessage.objects.select_related('car').defer('search_vector')
     serializer_class = ContactMessageSerializer
-    permission_classes = [AllowAny]
+    permission_classes = [IsAdminUser]
     throttle_classes = [ContactFormThrottle]
+    pagination_class = InboxPagination
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
+    filterset_class = ContactMessageFilter
+    
+    def get_permissions(self):
+        """Anyone may submit the form; everything else is the staff inbox."""
+        if self.action == 'create':
+            return [AllowAny()]
+        return super().get_permissions()
+    
+    @property
+    def paginator(self):
+        """Cursor pages for the inbox; numbered pages for ranked ?search= results."""
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get(FullTextSearchFilter.search_param, '').strip():
+                self._paginator = InboxSearchPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
     def get_serializer_class(self):
         """Use create serializer for POST requests."""
@@ -47,75 +85,33 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
         else:
             ip_address = request.META.get('REMOTE_ADDR')
         
-        # Save with IP address
-        contact_message = serializer.save(ip_address=ip_address)
-        
-        # Send email notification
-        try:
-            self._send_notification_email(contact_message)
-        except Exception as e:
-            logger.error(f"Failed to send email notification: {str(e)}")
-            # Don't fail the request if email fails
-        
-        return Response(
-            {
-                'message': 'Thank you for contacting us! We will get back to you soon.',
-                'id': contact_message.id
-            },
-            status=status.HTTP_201_CREATED
-        )
-    
-    def _send_notification_email(self, contact_message):
-        """Send email notification to admin and confirmation to customer."""
-        # Email to admin
-        admin_subject = f'New Contact Form Submission - {contact_message.subject or "No Subject"}'
-        admin_message = f"""
-New contact form submission:
-
-Name: {contact_message.name}
-Email: {contact_message.email}
-Phone: {contact_message.phone or 'Not provided'}
-Subject: {contact_message.subject or 'Not provided'}
-
-Message:
-{contact_message.message}
-
-Car of Interest: {contact_message.car.full_name if contact_message.car else 'None'}
-Submitted at: {contact_message.created_at}
-IP Address: {contact_message.ip_address}
-"""
-        
-        send_mail(
-            subject=admin_subject,
-            message=admin_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.ADMIN_EMAIL],
-            fail_silently=False,
+        # Repeats and mass-sent spam are acknowledged but never saved or emailed
+        car = serializer.validated_data.get('car')
+        fingerprint = Fingerprint(
+            serializer.validated_data['email'], serializer.validated_data['message'],
+            subject=serializer.validated_data.get('subject', ''), car_id=car.pk if car else None,
         )
+        screen = get_contact_screen()
+        verdict, original_id = screen.check(fingerprint)
+        if verdict is not None:
+            return Response(
+                {
+                    'message': 'Thank you for contacting us! We will get back to you soon.',
+                    'id': original_id,
+                    'status': 'ignored'
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
         
-        # Confirmation email to customer
-        customer_subject = 'Thank you for contacting Car Dealership'
-        customer_message = f"""
-Dear {contact_message.name},
-
-Thank you for contacting us! We have received your message and will get back to you as soon as possible.
-
-Your message:
-{contact_message.message}
-
-Best regards,
-Car Dealership Team
-Phone: 99 022802
-Email: autodealercy@gmail.com
-"""
-        
-        send_mail(
-            subject=customer_subject,
-            message=customer_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[contact_message.email],
-            fail_silently=False,
-        )
+        # Save the message and queue its emails together; the outbox worker sends them
+        try:
+            with transaction.atomic():
+                contact_message = serializer.save(ip_address=ip_address)
+                queue_contact_notifications(contact_message)
+        except Exception:
+            screen.forget(fingerprint)
+            raise
+        screen.remember(fingerprint, contact_message.id)
         
         return Response(
             {
@@ -138,3 +134,17 @@ Email: autodealercy@gmail.com
         message = self.get_object()
         message.mark_as_replied()
         return Response({'status': 'Message marked as replied'})
+    
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        """
+        Apply mark_read, mark_replied or archive to many messages at once.
+        
+        Expects {"ids": [...], "action": "..."}; runs as a single UPDATE.
+        """
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = ContactMessage.bulk_transition(
+            serializer.validated_data['ids'], serializer.validated_data['action']
+        )
+        return Response({'updated': updated})
@@ -1,18 +1,67 @@
 import axiosInstance from './axios';
 
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+const BATCH_PATH = '/analytics/track/batch/';
+const FLUSH_DELAY_MS = 2000;
+const MAX_BATCH_SIZE = 50;
+
+// Events waiting to be sent in the next batch
+let queue = [];
+let flushTimer = null;
+
+/**
+ * Send queued events in one request.
+ * Uses navigator.sendBeacon when the page is being hidden or closed so the
+ * batch survives navigation; the JSON is sent as text/plain to avoid a
+ * CORS preflight.
+ * @param {boolean} useBeacon - Send with sendBeacon instead of axios
+ */
+export const flushAnalytics = async (useBeacon = false) => {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  while (queue.length > 0) {
+    const events = queue.slice(0, MAX_BATCH_SIZE);
+    queue = queue.slice(MAX_BATCH_SIZE);
+    if (useBeacon && typeof navigator !== 'undefined' && navigator.sendBeacon) {
+      const body = new Blob([JSON.stringify({ events })], { type: 'text/plain' });
+      navigator.sendBeacon(`${API_URL}/api${BATCH_PATH}`, body);
+      continue;
+    }
+    try {
+      await axiosInstance.post(BATCH_PATH, { events });
+    } catch (error) {
+      // Silently fail - don't break user experience if analytics fails
+      console.debug('Analytics tracking failed:', error);
+    }
+  }
+};
+
+const enqueue = (event) => {
+  queue.push(event);
+  if (queue.length >= MAX_BATCH_SIZE) {
+    flushAnalytics();
+  } else if (!flushTimer) {
+    flushTimer = setTimeout(() => flushAnalytics(), FLUSH_DELAY_MS);
+  }
+};
+
+if (typeof document !== 'undefined') {
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') {
+      flushAnalytics(true);
+    }
+  });
+  window.addEventListener('pagehide', () => flushAnalytics(true));
+}
+
 /**
  * Track a page view
  * @param {string} pageType - Type of page: 'home', 'car_list', 'car_detail', 'contact'
  */
-export const trackPageView = async (pageType) => {
-  try {
-    await axiosInstance.post('/analytics/track/page/', {
-      page_type: pageType
-    });
-  } catch (error) {
-    // Silently fail - don't break user experience if analytics fails
-    console.debug('Analytics tracking failed:', error);
-  }
+export const trackPageView = (pageType) => {
+  enqueue({ type: 'page', page_type: pageType });
 };
 
 /**
@@ -20,14 +69,6 @@ export const trackPageView = async (pageType) => {
  * @param {number} carId - ID of the car
  * @param {string} viewType - Type of view: 'card_click' or 'detail_view'
  */
-export const trackCarView = async (carId, viewType = 'detail_view') => {
-  try {
-    await axiosInstance.post('/analytics/track/car/', {
-      car: carId,
-      view_type: viewType
-    });
-  } catch (error) {
-    // Silently fail - don't break user experience if analytics fails
-    console.debug('Analytics tracking failed:', error);
-  }
+export const trackCarView = (carId, viewType = 'detail_view') => {
+  enqueue({ type: 'car', car: carId, view_type: viewType });
 };
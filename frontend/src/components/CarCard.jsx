@@ -47,13 +47,29 @@ function CarCard({ car, horizontal = false }) {
     return getMediaUrl(car.get_image_url) || 'https://via.placeholder.com/400x300?text=No+Image';
   };
 
+  // Inline blurred preview painted behind the photo while it downloads
+  const getPlaceholderStyle = () => {
+    const placeholder = car.images?.[currentImageIndex]?.placeholder;
+    if (!placeholder) {
+      return undefined;
+    }
+    return {
+      backgroundImage: `url(${placeholder})`,
+      backgroundSize: 'cover',
+      backgroundPosition: 'center',
+    };
+  };
+
   // Horizontal layout for list view
   if (horizontal) {
     return (
       <Link to={`/cars/${car.id}`} className="block" onClick={handleCardClick}>
         <div className="card group flex flex-col md:flex-row overflow-hidden hover:shadow-xl">
           {/* Image */}
-          <div className="relative w-full md:w-80 h-56 bg-gray-200 flex-shrink-0 overflow-hidden">
+          <div
+            className="relative w-full md:w-80 h-56 bg-gray-200 flex-shrink-0 overflow-hidden"
+            style={getPlaceholderStyle()}
+          >
             <img
               src={getCurrentImageUrl()}
               alt={car.full_name}
@@ -207,7 +223,7 @@ function CarCard({ car, horizontal = false }) {
     <Link to={`/cars/${car.id}`} className="block scale-in" onClick={handleCardClick}>
       <div className="card group">
         {/* Image */}
-        <div className="relative h-48 bg-gray-200 overflow-hidden">
+        <div className="relative h-48 bg-gray-200 overflow-hidden" style={getPlaceholderStyle()}>
           <img
             src={getCurrentImageUrl()}
             alt={car.full_name}